@@ -1,12 +1,21 @@
 # agents/clinical_agent.py
 
 import os
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+from langchain.docstore.document import Document
 from langchain.chains import RetrievalQA
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from embedding_service import get_embedding_service, DEFAULT_EMBEDDING_MODEL
 from langchain.prompts.prompt import PromptTemplate
-from langchain_community.vectorstores import Chroma
+from agents.mmap_vectorstore import load_vectorstore
+import telemetry
+from single_flight import get_flight
+from answer_cache import index_fingerprint
+from agents.index_swap import HotSwapIndexMixin, IndexHandle
+from agents.hybrid_retriever import build_retriever, batch_retrieve
+from clinical_table import load_trial_table
+from agents.rag_utils import astream_answer, generate_answer, agenerate_answer
 
 CLINICAL_PROMPT_TEMPLATE = """You are an expert in clinical studies.
 You have access to structured study documents.
@@ -17,37 +26,33 @@ Given the data:
 
 Provide a clear, concise answer, referencing relevant studies if possible." """
 
-class ClinicalAgent:
-    def __init__(self, persist_directory: str = "clinical_index"):
-        """Initialize a Clinical Agent with a Chroma vectorstore using HuggingFace embeddings."""
-        self.persist_directory = persist_directory
-        print(f"ClinicalAgent initializing with directory: {self.persist_directory}")
+class ClinicalAgent(HotSwapIndexMixin):
+    def __init__(self, persist_directory: str = "clinical_index", retrieval_mode: Optional[str] = None,
+                 rerank: Optional[bool] = None):
+        """
+        Initialize a Clinical Agent with a Chroma vectorstore using HuggingFace embeddings.
+        retrieval_mode: "hybrid" (BM25 + vector) or "vector"; defaults to the RETRIEVAL_MODE env var.
+        rerank: over-fetch and rerank with a local cross-encoder; defaults to the RERANK env var.
+        The vectorstore, retriever and trials table live in an IndexHandle and can be replaced with swap_index.
+        """
+        print(f"ClinicalAgent initializing with directory: {persist_directory}")
+        self.retrieval_mode = retrieval_mode
+        self.rerank = rerank
 
         google_api_key = os.getenv("gemini_api")
         if not google_api_key:
             raise ValueError("GOOGLE_API_KEY environment variable not set for the LLM.")
 
         try:
-            hf_model_name = "sentence-transformers/all-mpnet-base-v2"
-            print(f"Initializing HuggingFace Embeddings model: {hf_model_name}")
-            self.embedding_function = HuggingFaceEmbeddings(model_name=hf_model_name)
+            hf_model_name = DEFAULT_EMBEDDING_MODEL
+            # Shared process-wide model; the food agent and router get the same instance
+            self.embedding_function = get_embedding_service(hf_model_name)
         except Exception as e:
              raise RuntimeError(f"Failed to initialize HuggingFaceEmbeddings model '{hf_model_name}'. "
                                 f"Ensure 'sentence-transformers' and 'torch'/'tensorflow' are installed. Error: {e}")
 
-        try:
-            print(f"Loading Chroma DB from: '{self.persist_directory}' using embeddings: '{hf_model_name}'")
-            self.vectorstore = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embedding_function
-            )
-            print("Chroma DB loaded successfully.")
-        except Exception as e:
-            raise RuntimeError(f"Failed to load Chroma vector store from '{self.persist_directory}'. "
-                               f"Ensure the directory exists and contains a valid Chroma database "
-                               f"created with the '{hf_model_name}' embeddings. Error: {e}")
-
-        self.retriever = self.vectorstore.as_retriever(search_kwargs={"k": 5})
+        # Vectorstore, retriever and trials table for the directory, swappable later without a restart
+        self._init_index(persist_directory)
 
         self.llm = ChatGoogleGenerativeAI(
             model="gemini-2.0-flash",
@@ -70,6 +75,33 @@ class ClinicalAgent:
             return_source_documents=False
         )
 
+    def _open_index(self, persist_directory: str) -> IndexHandle:
+        """
+        Load the vectorstore at persist_directory, build its retriever and load the trials table.
+        """
+        hf_model_name = self.embedding_function.model_name
+        try:
+            print(f"Loading vector store from: '{persist_directory}' using embeddings: '{hf_model_name}'")
+            # Chroma by default; a directory exported by agents.mmap_vectorstore opens as a memory-mapped index
+            vectorstore = load_vectorstore(persist_directory, self.embedding_function)
+            print(f"{type(vectorstore).__name__} loaded successfully.")
+        except Exception as e:
+            raise RuntimeError(f"Failed to load vector store from '{persist_directory}'. "
+                               f"Ensure the directory exists and contains a valid Chroma database or mmap "
+                               f"index export created with the '{hf_model_name}' embeddings. Error: {e}")
+
+        # Hybrid BM25 + vector retrieval helps exact NCT ids, drug names and "DRUG:" codes
+        retriever = build_retriever(vectorstore, persist_directory, k=5, mode=self.retrieval_mode, rerank=self.rerank)
+
+        # Structured rows written by ingest_data.py; None if the index predates the table
+        trial_table = load_trial_table(persist_directory)
+        return IndexHandle(persist_directory, vectorstore, retriever, index_fingerprint(persist_directory),
+                           extras={"trial_table": trial_table})
+
+    @property
+    def trial_table(self):
+        return self._index.extras.get("trial_table")
+
     def invoke(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Runs the RetrievalQA chain using the invoke method.
@@ -81,15 +113,137 @@ class ClinicalAgent:
             print("Warning: No 'input' key found in invoke data.")
             return {"output": "Error: Missing 'input' key in request."}
 
+        structured = self.answer_from_table(query)
+        if structured is not None:
+            return {"output": structured}
+
         try:
-            chain_input = {"query": query}
+            # Same steps as qa_chain.invoke, split so retrieval and generation are timed separately
             print(f"Invoking qa_chain with query: '{query[:50]}...'")
-            result = self.qa_chain.invoke(chain_input)
-            answer = result.get("result", "Agent did not return a result.")
+            docs = self.retrieve(query)
+            answer = generate_answer(self, query, docs)
             print(f"qa_chain returned answer: '{answer[:50]}...'")
             return {"output": answer}
         except Exception as e:
             print(f"Error during ClinicalAgent invoke: {e}")
             return {"output": f"An error occurred while processing your request: {e}"}
 
+    async def ainvoke(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async version of invoke with the same input/output contract.
+        The Chroma search is offloaded to the default executor by the retriever's
+        async path, and generation uses the async Gemini client.
+        """
+        query = input_data.get("input")
+        if not query:
+            print("Warning: No 'input' key found in ainvoke data.")
+            return {"output": "Error: Missing 'input' key in request."}
+
+        structured = self.answer_from_table(query)
+        if structured is not None:
+            return {"output": structured}
+
+        try:
+            print(f"Async invoking qa_chain with query: '{query[:50]}...'")
+            docs = await self.aretrieve(query)
+            answer = await agenerate_answer(self, query, docs)
+            print(f"qa_chain returned answer: '{answer[:50]}...'")
+            return {"output": answer}
+        except Exception as e:
+            print(f"Error during ClinicalAgent ainvoke: {e}")
+            return {"output": f"An error occurred while processing your request: {e}"}
+
+    def answer_from_table(self, query: str) -> Optional[str]:
+        """
+        Fast path: exact NCT lookups, counts and filters answered from the trials
+        table without retrieval or the LLM. None means use RetrievalQA.
+        """
+        if self.trial_table is None:
+            return None
+        with telemetry.span("structured_lookup", agent="clinical") as span_tags:
+            answer = self.trial_table.answer(query)
+            span_tags["outcome"] = "hit" if answer is not None else "miss"
+        if answer is not None:
+            print(f"Answered from clinical trials table: '{query[:50]}...'")
+        return answer
+
+    def retrieve(self, query: str) -> List[Document]:
+        """Retrieval half of the chain: top documents for the query."""
+        index = self.index  # one handle for the whole search, even if a swap happens meanwhile
+        telemetry.annotate("index_version:clinical", index.version)
+        with telemetry.span("retrieval", agent="clinical"):
+            # Identical concurrent queries share one search; each caller gets its own list
+            return list(get_flight("retrieval").do(("clinical", index.version, query), lambda: index.retriever.invoke(query)))
+
+    async def aretrieve(self, query: str) -> List[Document]:
+        """Async retrieval; the Chroma search runs in the default executor."""
+        index = self.index
+        telemetry.annotate("index_version:clinical", index.version)
+        with telemetry.span("retrieval", agent="clinical"):
+            return list(await get_flight("retrieval").ado(("clinical", index.version, query), lambda: index.retriever.ainvoke(query)))
+
+    def retrieve_batch(self, queries: List[str], vectors: List[List[float]]) -> List[List[Document]]:
+        """Top documents for many already-embedded queries, with one batched vector search."""
+        index = self.index
+        with telemetry.span("batch_retrieval", agent="clinical"):
+            return batch_retrieve(index.retriever, index.vectorstore, queries, vectors)
+
+    def retrieve_scored(self, query: str) -> List[Tuple[Document, float]]:
+        """Top documents with relevance (or fused RRF) scores, for merging across indexes."""
+        index = self.index
+        telemetry.annotate("index_version:clinical", index.version)
+        if hasattr(index.retriever, "search_with_scores"):
+            return index.retriever.search_with_scores(query)
+        return index.vectorstore.similarity_search_with_relevance_scores(query, **index.retriever.search_kwargs)
+
+    async def aretrieve_scored(self, query: str) -> List[Tuple[Document, float]]:
+        return await asyncio.to_thread(self.retrieve_scored, query)
+
+    def generate(self, query: str, docs: List[Document]) -> Dict[str, Any]:
+        """
+        Generation half of the chain over already-retrieved documents.
+        Returns output like {"output": "answer"}, same as invoke.
+        """
+        structured = self.answer_from_table(query)
+        if structured is not None:
+            return {"output": structured}
+        try:
+            return {"output": generate_answer(self, query, docs)}
+        except Exception as e:
+            print(f"Error during ClinicalAgent generate: {e}")
+            return {"output": f"An error occurred while processing your request: {e}"}
+
+    async def agenerate(self, query: str, docs: List[Document]) -> Dict[str, Any]:
+        """Async version of generate."""
+        structured = self.answer_from_table(query)
+        if structured is not None:
+            return {"output": structured}
+        try:
+            return {"output": await agenerate_answer(self, query, docs)}
+        except Exception as e:
+            print(f"Error during ClinicalAgent agenerate: {e}")
+            return {"output": f"An error occurred while processing your request: {e}"}
+
+    async def astream(self, input_data: Dict[str, Any],
+                      docs: Optional[List[Document]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming counterpart of ainvoke for the /chat/stream endpoint.
+        Yields the retrieved sources first, then answer tokens as Gemini produces them.
+        Already-retrieved `docs` (e.g. from speculative retrieval) skip the search.
+        """
+        query = input_data.get("input")
+        if not query:
+            yield {"event": "error", "data": "Error: Missing 'input' key in request."}
+            return
+
+        structured = self.answer_from_table(query)
+        if structured is not None:
+            yield {"event": "sources", "data": [{"metadata": {"source": "clinical_trials_table"}, "snippet": ""}]}
+            yield {"event": "token", "data": structured}
+            return
+
+        print(f"Streaming ClinicalAgent answer for query: '{query[:50]}...'")
+        async for event in astream_answer(self, query, docs):
+            yield event
+
     # Removed the 'run' method to maintain consistency with FoodSecurityAgent
\ No newline at end of file
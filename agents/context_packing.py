@@ -0,0 +1,169 @@
+# agents/context_packing.py
+
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+from langchain.docstore.document import Document
+
+import telemetry
+
+CONTEXT_PACKING_ENABLED = os.getenv("CONTEXT_PACKING", "1") != "0"
+# Splitter chunks are at most 1000 characters (ingest_data.py), about 250 tokens
+CHUNK_TOKENS = 250
+# The default budget holds the largest context the agents retrieve (MULTI_DOMAIN_MAX_DOCS = 8
+# chunks; single-domain retrieval returns 5), so packing only drops duplicate and overlapping
+# text unless CONTEXT_TOKEN_BUDGET is lowered on purpose
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", str(8 * CHUNK_TOKENS)))
+MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Shortest shared prefix/suffix treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 40
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini/SentencePiece token count (~4 characters per token), no API call."""
+    return max(1, len(text) // 4)
+
+
+def _overlap_merge(first: str, second: str) -> Optional[str]:
+    """Join two chunks if one contains the other or the end of `first` is the start of `second`."""
+    if second in first:
+        return first
+    if first in second:
+        return second
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return None
+    pos = first.find(probe)
+    while pos != -1:
+        tail = first[pos:]
+        if second.startswith(tail):
+            return first + second[len(tail):]
+        pos = first.find(probe, pos + 1)
+    return None
+
+
+def merge_overlapping(docs: List[Document]) -> List[Document]:
+    """
+    Merge chunks from the same source page whose text overlaps (the splitter's
+    chunk_overlap) or that duplicate each other. Keeps the rank of the best chunk.
+    """
+    merged: List[Document] = []
+    for doc in docs:
+        group = (doc.metadata.get("source"), doc.metadata.get("page"), doc.metadata.get("domain"))
+        for i, kept in enumerate(merged):
+            if (kept.metadata.get("source"), kept.metadata.get("page"), kept.metadata.get("domain")) != group:
+                continue
+            text = _overlap_merge(kept.page_content, doc.page_content) or _overlap_merge(doc.page_content, kept.page_content)
+            if text is not None:
+                metadata = {**kept.metadata, "merged_chunks": kept.metadata.get("merged_chunks", 1) + 1}
+                merged[i] = Document(page_content=text, metadata=metadata)
+                break
+        else:
+            merged.append(doc)
+    return merged
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def mmr_order(query: str, docs: List[Document], lambda_mult: float = MMR_LAMBDA) -> List[Document]:
+    """
+    Maximal-marginal-relevance ordering with lexical similarity. Relevance blends
+    the retrieval rank with query-term overlap; redundancy is the word-set Jaccard
+    similarity to the passages already picked.
+    """
+    if len(docs) < 2:
+        return list(docs)
+    query_terms = set(_WORD_RE.findall(query.lower()))
+    terms = [set(_WORD_RE.findall(doc.page_content.lower())) for doc in docs]
+    n = len(docs)
+    relevance = []
+    for rank, doc_terms in enumerate(terms):
+        coverage = len(query_terms & doc_terms) / len(query_terms) if query_terms else 0.0
+        relevance.append(0.5 * (1.0 - rank / n) + 0.5 * coverage)
+
+    remaining = list(range(n))
+    picked: List[int] = []
+    while remaining:
+        def score(i: int) -> float:
+            redundancy = max((_jaccard(terms[i], terms[j]) for j in picked), default=0.0)
+            return lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+        best = max(remaining, key=score)
+        picked.append(best)
+        remaining.remove(best)
+    return [docs[i] for i in picked]
+
+
+class PackingStats:
+    """Process-wide counters of prompt tokens before and after packing."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.docs_before = 0
+        self.docs_after = 0
+
+    def record(self, tokens_before: int, tokens_after: int, docs_before: int, docs_after: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.tokens_before += tokens_before
+            self.tokens_after += tokens_after
+            self.docs_before += docs_before
+            self.docs_after += docs_after
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            saved = self.tokens_before - self.tokens_after
+            return {
+                "requests": self.requests,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": saved,
+                "tokens_saved_per_request": saved / self.requests if self.requests else 0.0,
+                "docs_before": self.docs_before,
+                "docs_after": self.docs_after,
+            }
+
+
+packing_stats = PackingStats()
+
+
+def pack_context(query: str, docs: List[Document],
+                 token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 enabled: bool = CONTEXT_PACKING_ENABLED) -> Tuple[List[Document], Dict[str, int]]:
+    """
+    Merge overlapping chunks, order them by MMR and keep as many as fit in
+    `token_budget`. Returns the packed documents and this request's token counts.
+
+    The default budget (CONTEXT_TOKEN_BUDGET, 8 chunks of ~250 tokens) fits a full
+    retrieval, so by default nothing is trimmed: the savings come only from
+    dropping duplicate and overlapping text. Set CONTEXT_TOKEN_BUDGET lower to cut
+    prompts further; benchmarks/context_packing_benchmark.py --budget shows what a
+    given budget costs in answer similarity.
+    """
+    tokens_before = sum(estimate_tokens(doc.page_content) for doc in docs)
+    if not enabled or not docs:
+        return docs, {"tokens_before": tokens_before, "tokens_after": tokens_before}
+
+    with telemetry.span("context_packing"):
+        candidates = mmr_order(query, merge_overlapping(docs))
+        packed: List[Document] = []
+        used = 0
+        for doc in candidates:
+            cost = estimate_tokens(doc.page_content)
+            if used + cost > token_budget and packed:
+                continue
+            packed.append(doc)
+            used += cost
+
+    packing_stats.record(tokens_before, used, len(docs), len(packed))
+    telemetry.annotate("context_tokens", {"before": tokens_before, "after": used, "saved": tokens_before - used})
+    return packed, {"tokens_before": tokens_before, "tokens_after": used}
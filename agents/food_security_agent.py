@@ -1,18 +1,24 @@
 # agents/food_security_agent.py
 
 import os
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+from langchain.docstore.document import Document
 from langchain.chains import RetrievalQA
 from langchain_google_genai import ChatGoogleGenerativeAI # Still use Gemini for the generation step
-# === CHANGE 1: Import HuggingFaceEmbeddings ===
-# Use the community embeddings module
-from langchain_community.embeddings import HuggingFaceEmbeddings
-# If the above fails, try: from langchain.embeddings import HuggingFaceEmbeddings
+# Embeddings come from the process-wide service so all agents share one mpnet copy
+from embedding_service import get_embedding_service, DEFAULT_EMBEDDING_MODEL
 
 from langchain.prompts import PromptTemplate
 # Use the community vectorstores module
-from langchain_community.vectorstores import Chroma
-# If the above fails, try: from langchain.vectorstores import Chroma
+# Chroma or memory-mapped backend, picked from the persist directory's contents
+from agents.mmap_vectorstore import load_vectorstore
+import telemetry
+from single_flight import get_flight
+from answer_cache import index_fingerprint
+from agents.index_swap import HotSwapIndexMixin, IndexHandle
+from agents.hybrid_retriever import build_retriever, batch_retrieve
+from agents.rag_utils import astream_answer, generate_answer, agenerate_answer
 
 
 # Prompt remains the same
@@ -25,13 +31,20 @@ User's Question: {question}
 
 Based ONLY on the provided context, answer the user's question concisely and accurately. If the answer cannot be found within the context, state explicitly: 'Based on the provided documents, I cannot answer that question.' Do not add any information or interpretation not present in the context."""
 
-class FoodSecurityAgent:
+class FoodSecurityAgent(HotSwapIndexMixin):
     # === CHANGE 2: Update default persist_directory to match ingestion script ===
     # Although the orchestrator passes the directory, setting a matching default is good practice
-    def __init__(self, persist_directory: str = "un_food_index"):
-        """Initialize a Food Security Agent with a Chroma vectorstore, using HuggingFace embeddings."""
-        self.persist_directory = persist_directory
-        print(f"FoodSecurityAgent initializing with directory: {self.persist_directory}")
+    def __init__(self, persist_directory: str = "un_food_index", retrieval_mode: Optional[str] = None,
+                 rerank: Optional[bool] = None):
+        """
+        Initialize a Food Security Agent with a Chroma vectorstore, using HuggingFace embeddings.
+        retrieval_mode: "hybrid" (BM25 + vector) or "vector"; defaults to the RETRIEVAL_MODE env var.
+        rerank: over-fetch and rerank with a local cross-encoder; defaults to the RERANK env var.
+        The vectorstore and retriever live in an IndexHandle and can be replaced with swap_index.
+        """
+        print(f"FoodSecurityAgent initializing with directory: {persist_directory}")
+        self.retrieval_mode = retrieval_mode
+        self.rerank = rerank
 
         google_api_key = os.getenv("gemini_api")
         if not google_api_key:
@@ -41,38 +54,14 @@ class FoodSecurityAgent:
         # === CHANGE 3: Use the EXACT SAME HuggingFace embedding model as ingestion ===
         try:
             # Specify the model used in your ingestion script
-            hf_model_name = "sentence-transformers/all-mpnet-base-v2"
-            print(f"Initializing HuggingFace Embeddings model: {hf_model_name}")
-            # You might want to specify device ('cpu', 'cuda') if needed
-            # model_kwargs = {'device': 'cpu'} # Uncomment and adjust if necessary
-            self.embedding_function = HuggingFaceEmbeddings(
-                model_name=hf_model_name,
-                # model_kwargs=model_kwargs # Uncomment if using model_kwargs
-            )
+            hf_model_name = DEFAULT_EMBEDDING_MODEL
+            self.embedding_function = get_embedding_service(hf_model_name)
         except Exception as e:
              raise RuntimeError(f"Failed to initialize HuggingFaceEmbeddings model '{hf_model_name}'. "
                                 f"Ensure 'sentence-transformers' and 'torch'/'tensorflow' are installed. Error: {e}")
 
-        # Load the vectorstore, providing the CORRECT HuggingFace embedding function
-        try:
-            print(f"Loading Chroma DB from: '{self.persist_directory}' using embeddings: '{hf_model_name}'")
-            self.vectorstore = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embedding_function # Pass the initialized HF embedder
-            )
-            print("Chroma DB loaded successfully.")
-        except Exception as e:
-            raise RuntimeError(f"Failed to load Chroma vector store from '{self.persist_directory}'. "
-                               f"Ensure the directory exists and contains a valid Chroma database "
-                               f"created with the '{hf_model_name}' embeddings. Error: {e}")
-
-        # --- The rest of the agent remains the same as the previous corrected version ---
-
-        # Create a retriever
-        self.retriever = self.vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 5} # Retrieve top 3 documents
-        )
+        # Vectorstore + retriever for the directory, swappable later without a restart
+        self._init_index(persist_directory)
 
         # LLM for generation (still Google Gemini)
         self.llm = ChatGoogleGenerativeAI(
@@ -99,6 +88,32 @@ class FoodSecurityAgent:
             return_source_documents=False
         )
 
+    def _open_index(self, persist_directory: str) -> IndexHandle:
+        """
+        Load the vectorstore at persist_directory and build its retriever.
+        """
+        hf_model_name = self.embedding_function.model_name
+        # Load the vectorstore, providing the CORRECT HuggingFace embedding function
+        try:
+            print(f"Loading vector store from: '{persist_directory}' using embeddings: '{hf_model_name}'")
+            # Chroma by default; a directory exported by agents.mmap_vectorstore opens as a memory-mapped index
+            vectorstore = load_vectorstore(persist_directory, self.embedding_function)
+            print(f"{type(vectorstore).__name__} loaded successfully.")
+        except Exception as e:
+            raise RuntimeError(f"Failed to load vector store from '{persist_directory}'. "
+                               f"Ensure the directory exists and contains a valid Chroma database or mmap "
+                               f"index export created with the '{hf_model_name}' embeddings. Error: {e}")
+
+        # Create a retriever: BM25 + vector fusion by default, plain similarity with retrieval_mode="vector"
+        retriever = build_retriever(
+            vectorstore,
+            persist_directory,
+            k=5, # Retrieve top 5 documents
+            mode=self.retrieval_mode,
+            rerank=self.rerank,
+        )
+        return IndexHandle(persist_directory, vectorstore, retriever, index_fingerprint(persist_directory))
+
     # invoke method remains the same (handles dict input/output)
     def invoke(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -112,13 +127,10 @@ class FoodSecurityAgent:
             return {"output": "Error: Missing 'input' key in request."}
 
         try:
-            # RetrievalQA expects the query under the key "query"
-            chain_input = {"query": query}
+            # Same steps as qa_chain.invoke, split so retrieval and generation are timed separately
             print(f"Invoking qa_chain with query: '{query[:50]}...'") # Log query start
-            result = self.qa_chain.invoke(chain_input)
-
-            # Standard output key for RetrievalQA is "result"
-            answer = result.get("result", "Agent did not return a result.")
+            docs = self.retrieve(query)
+            answer = generate_answer(self, query, docs)
             print(f"qa_chain returned answer: '{answer[:50]}...'") # Log answer start
 
             # Return the answer under the key "output" to match orchestrator
@@ -126,4 +138,92 @@ class FoodSecurityAgent:
 
         except Exception as e:
             print(f"Error during FoodSecurityAgent invoke: {e}")
-            return {"output": f"An error occurred while processing your request: {e}"}
\ No newline at end of file
+            return {"output": f"An error occurred while processing your request: {e}"}
+
+    async def ainvoke(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async version of invoke with the same input/output contract.
+        The Chroma search is offloaded to the default executor by the retriever's
+        async path, and generation uses the async Gemini client.
+        """
+        query = input_data.get("input")
+        if not query:
+            print("Warning: No 'input' key found in ainvoke data.")
+            return {"output": "Error: Missing 'input' key in request."}
+
+        try:
+            print(f"Async invoking qa_chain with query: '{query[:50]}...'")
+            docs = await self.aretrieve(query)
+            answer = await agenerate_answer(self, query, docs)
+            print(f"qa_chain returned answer: '{answer[:50]}...'")
+            return {"output": answer}
+        except Exception as e:
+            print(f"Error during FoodSecurityAgent ainvoke: {e}")
+            return {"output": f"An error occurred while processing your request: {e}"}
+
+    def retrieve(self, query: str) -> List[Document]:
+        """Retrieval half of the chain: top documents for the query."""
+        index = self.index  # one handle for the whole search, even if a swap happens meanwhile
+        telemetry.annotate("index_version:food", index.version)
+        with telemetry.span("retrieval", agent="food"):
+            # Identical concurrent queries share one search; each caller gets its own list
+            return list(get_flight("retrieval").do(("food", index.version, query), lambda: index.retriever.invoke(query)))
+
+    async def aretrieve(self, query: str) -> List[Document]:
+        """Async retrieval; the Chroma search runs in the default executor."""
+        index = self.index
+        telemetry.annotate("index_version:food", index.version)
+        with telemetry.span("retrieval", agent="food"):
+            return list(await get_flight("retrieval").ado(("food", index.version, query), lambda: index.retriever.ainvoke(query)))
+
+    def retrieve_batch(self, queries: List[str], vectors: List[List[float]]) -> List[List[Document]]:
+        """Top documents for many already-embedded queries, with one batched vector search."""
+        index = self.index
+        with telemetry.span("batch_retrieval", agent="food"):
+            return batch_retrieve(index.retriever, index.vectorstore, queries, vectors)
+
+    def retrieve_scored(self, query: str) -> List[Tuple[Document, float]]:
+        """Top documents with relevance (or fused RRF) scores, for merging across indexes."""
+        index = self.index
+        telemetry.annotate("index_version:food", index.version)
+        if hasattr(index.retriever, "search_with_scores"):
+            return index.retriever.search_with_scores(query)
+        return index.vectorstore.similarity_search_with_relevance_scores(query, **index.retriever.search_kwargs)
+
+    async def aretrieve_scored(self, query: str) -> List[Tuple[Document, float]]:
+        return await asyncio.to_thread(self.retrieve_scored, query)
+
+    def generate(self, query: str, docs: List[Document]) -> Dict[str, Any]:
+        """
+        Generation half of the chain over already-retrieved documents.
+        Returns output like {"output": "answer"}, same as invoke.
+        """
+        try:
+            return {"output": generate_answer(self, query, docs)}
+        except Exception as e:
+            print(f"Error during FoodSecurityAgent generate: {e}")
+            return {"output": f"An error occurred while processing your request: {e}"}
+
+    async def agenerate(self, query: str, docs: List[Document]) -> Dict[str, Any]:
+        """Async version of generate."""
+        try:
+            return {"output": await agenerate_answer(self, query, docs)}
+        except Exception as e:
+            print(f"Error during FoodSecurityAgent agenerate: {e}")
+            return {"output": f"An error occurred while processing your request: {e}"}
+
+    async def astream(self, input_data: Dict[str, Any],
+                      docs: Optional[List[Document]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming counterpart of ainvoke for the /chat/stream endpoint.
+        Yields the retrieved sources first, then answer tokens as Gemini produces them.
+        Already-retrieved `docs` (e.g. from speculative retrieval) skip the search.
+        """
+        query = input_data.get("input")
+        if not query:
+            yield {"event": "error", "data": "Error: Missing 'input' key in request."}
+            return
+
+        print(f"Streaming FoodSecurityAgent answer for query: '{query[:50]}...'")
+        async for event in astream_answer(self, query, docs):
+            yield event
@@ -0,0 +1,234 @@
+# agents/hybrid_retriever.py
+
+import os
+import re
+import json
+import math
+import heapq
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+
+from answer_cache import index_fingerprint
+from agents.reranker import RerankingRetriever, get_reranker, RERANK_ENABLED, RERANK_FETCH_K
+from agents.mmap_vectorstore import batch_similarity_search
+
+# "vector" keeps plain Chroma similarity search; "hybrid" fuses it with BM25
+DEFAULT_RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# How many candidates each ranker contributes before fusion
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "20"))
+RRF_K = 60
+SIDECAR_VERSION = 1
+
+# Keeps identifiers such as "nct01234567" whole and intervention prefixes such as "drug:"
+_TOKEN_RE = re.compile(r"[a-z0-9]+:?")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _doc_key(text: str) -> str:
+    return " ".join(text.split())
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring over a fixed set of documents.
+    """
+
+    def __init__(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]],
+                 k1: float = 1.5, b: float = 0.75):
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_len: List[int] = []
+        for doc_idx, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((doc_idx, tf))
+        self._finalise()
+
+    def _finalise(self) -> None:
+        n_docs = len(self.doc_len)
+        self.avg_len = (sum(self.doc_len) / n_docs) if n_docs else 0.0
+        self.idf = {term: math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+                    for term, plist in self.postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Top-k (document index, BM25 score) pairs."""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for doc_idx, tf in plist:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_idx] / (self.avg_len or 1.0))
+                scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def document(self, doc_idx: int) -> Document:
+        return Document(page_content=self.texts[doc_idx], metadata=dict(self.metadatas[doc_idx] or {}))
+
+    @classmethod
+    def from_chroma(cls, vectorstore) -> "BM25Index":
+        data = vectorstore.get(include=["documents", "metadatas"])
+        return cls(data["ids"], data["documents"], data["metadatas"])
+
+    def save(self, path: str, fingerprint: str) -> None:
+        payload = {
+            "version": SIDECAR_VERSION,
+            "fingerprint": fingerprint,
+            "ids": self.ids,
+            "texts": self.texts,
+            "metadatas": self.metadatas,
+            "doc_len": self.doc_len,
+            "postings": self.postings,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, fingerprint: str) -> Optional["BM25Index"]:
+        """Load a sidecar, or None if it is missing or was built from another index version."""
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            payload = json.load(f)
+        if payload.get("version") != SIDECAR_VERSION or payload.get("fingerprint") != fingerprint:
+            return None
+        index = cls.__new__(cls)
+        index.ids = payload["ids"]
+        index.texts = payload["texts"]
+        index.metadatas = payload["metadatas"]
+        index.k1, index.b = 1.5, 0.75
+        index.doc_len = payload["doc_len"]
+        index.postings = {term: [tuple(p) for p in plist] for term, plist in payload["postings"].items()}
+        index._finalise()
+        return index
+
+
+def sidecar_path(persist_directory: str) -> str:
+    # Kept next to (not inside) the Chroma dir so writing it doesn't change the index fingerprint
+    return os.path.normpath(persist_directory) + ".bm25.json"
+
+
+def load_or_build_bm25(vectorstore, persist_directory: str) -> BM25Index:
+    """Load the persisted BM25 sidecar for this Chroma dir, rebuilding it when stale."""
+    fingerprint = index_fingerprint(persist_directory)
+    path = sidecar_path(persist_directory)
+    try:
+        index = BM25Index.load(path, fingerprint)
+        if index is not None:
+            print(f"Loaded BM25 sidecar '{path}' ({len(index)} docs).")
+            return index
+    except Exception as e:
+        print(f"Warning: could not read BM25 sidecar '{path}', rebuilding: {e}")
+
+    index = BM25Index.from_chroma(vectorstore)
+    print(f"Built BM25 index over {len(index)} docs from '{persist_directory}'.")
+    try:
+        index.save(path, fingerprint)
+    except OSError as e:
+        print(f"Warning: could not write BM25 sidecar '{path}': {e}")
+    return index
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever that fuses Chroma similarity search with BM25 keyword search using
+    reciprocal rank fusion, so exact identifiers (NCT numbers, drug names,
+    "DRUG:"-style codes) are found even when the embedding misses them.
+    """
+
+    vectorstore: Any
+    bm25: Any
+    k: int = 5
+    fetch_k: int = HYBRID_FETCH_K
+    rrf_k: int = RRF_K
+    vector_weight: float = 1.0
+    keyword_weight: float = 1.0
+    # Mirrors VectorStoreRetriever so callers can read the configured k
+    search_kwargs: Dict[str, Any] = {}
+
+    def search_with_scores(self, query: str, vector_docs: Optional[List[Document]] = None) -> List[Tuple[Document, float]]:
+        """Top-k fused documents with their RRF scores; `vector_docs` skips the vector search."""
+        fused: Dict[str, List[Any]] = {}
+        if vector_docs is None:
+            vector_docs = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        for rank, doc in enumerate(vector_docs):
+            entry = fused.setdefault(_doc_key(doc.page_content), [doc, 0.0])
+            entry[1] += self.vector_weight / (self.rrf_k + rank + 1)
+        for rank, (doc_idx, _score) in enumerate(self.bm25.search(query, self.fetch_k)):
+            key = _doc_key(self.bm25.texts[doc_idx])
+            entry = fused.setdefault(key, [None, 0.0])
+            if entry[0] is None:
+                entry[0] = self.bm25.document(doc_idx)
+            entry[1] += self.keyword_weight / (self.rrf_k + rank + 1)
+        ranked = sorted(fused.values(), key=lambda item: item[1], reverse=True)
+        return [(doc, score) for doc, score in ranked[:self.k]]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query)]
+
+
+def build_retriever(vectorstore, persist_directory: str, k: int = 5, mode: Optional[str] = None,
+                    rerank: Optional[bool] = None):
+    """
+    Retriever for an agent: plain vector similarity ("vector") or BM25 + vector
+    fusion ("hybrid"). Falls back to vector search if the BM25 index can't be built.
+    With rerank, the base retriever over-fetches RERANK_FETCH_K candidates and a
+    local cross-encoder keeps the best `k`.
+    """
+    mode = mode or DEFAULT_RETRIEVAL_MODE
+    if rerank is None:
+        rerank = RERANK_ENABLED
+    fetch_k = max(k, RERANK_FETCH_K) if rerank else k
+
+    base = None
+    if mode == "hybrid":
+        try:
+            bm25 = load_or_build_bm25(vectorstore, persist_directory)
+            base = HybridRetriever(vectorstore=vectorstore, bm25=bm25, k=fetch_k, search_kwargs={"k": fetch_k})
+        except Exception as e:
+            print(f"Warning: hybrid retrieval unavailable for '{persist_directory}', using vector search: {e}")
+    if base is None:
+        base = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": fetch_k})
+
+    if rerank:
+        try:
+            return RerankingRetriever(base_retriever=base, reranker=get_reranker(), k=k, search_kwargs={"k": k})
+        except Exception as e:
+            print(f"Warning: reranker unavailable, keeping top {k} from '{persist_directory}' unreranked: {e}")
+            return build_retriever(vectorstore, persist_directory, k=k, mode=mode, rerank=False)
+    return base
+
+
+def batch_retrieve(retriever, vectorstore, queries: List[str], vectors: List[List[float]]) -> List[List[Document]]:
+    """
+    Run a retriever from build_retriever over many already-embedded queries, with the
+    vector search done as one batched similarity search. BM25 fusion and reranking
+    still run per query on top of it.
+    """
+    if isinstance(retriever, RerankingRetriever):
+        candidates = batch_retrieve(retriever.base_retriever, vectorstore, queries, vectors)
+        return [[doc for doc, _ in retriever.reranker.rerank(query, docs, retriever.k, retriever.budget_ms)]
+                for query, docs in zip(queries, candidates)]
+    if isinstance(retriever, HybridRetriever):
+        vector_hits = batch_similarity_search(vectorstore, vectors, retriever.fetch_k)
+        return [[doc for doc, _ in retriever.search_with_scores(query, docs)]
+                for query, docs in zip(queries, vector_hits)]
+    return batch_similarity_search(vectorstore, vectors, retriever.search_kwargs.get("k", 4))
@@ -0,0 +1,92 @@
+# agents/index_swap.py
+
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+
+@dataclass(frozen=True)
+class IndexHandle:
+    """Everything an agent reads from one on-disk index, opened together."""
+    persist_directory: str
+    vectorstore: Any
+    retriever: Any
+    version: str
+    opened_at: float = field(default_factory=time.time)
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+    def close(self) -> None:
+        """
+        Release the store's client and open files. Only call once no request can
+        still be reading through this handle.
+        """
+        try:
+            closer = getattr(self.vectorstore, "close", None)
+            if callable(closer):
+                closer()
+                return
+            # langchain's Chroma has no close(); stop the chromadb client's system (sqlite, HNSW segments)
+            system = getattr(getattr(self.vectorstore, "_client", None), "_system", None)
+            if system is not None:
+                system.stop()
+        except Exception as e:
+            print(f"Failed to close index {self.persist_directory}: {e}")
+
+
+class HotSwapIndexMixin:
+    """
+    Keeps a retrieval agent's vectorstore, retriever and per-index extras in a single
+    IndexHandle, so a rebuilt index is swapped in with one reference assignment.
+    Requests that already picked up the old handle finish against it; new ones see
+    the new index. Agents implement _open_index and call _init_index in __init__.
+    """
+
+    _index: IndexHandle
+    index_swaps: int
+
+    def _init_index(self, persist_directory: str) -> None:
+        self._swap_lock = threading.Lock()
+        self.index_swaps = 0
+        self._index = self._open_index(persist_directory)
+
+    def _open_index(self, persist_directory: str) -> IndexHandle:
+        raise NotImplementedError
+
+    @property
+    def index(self) -> IndexHandle:
+        return self._index
+
+    @property
+    def persist_directory(self) -> str:
+        return self._index.persist_directory
+
+    @property
+    def vectorstore(self):
+        return self._index.vectorstore
+
+    @property
+    def retriever(self):
+        return self._index.retriever
+
+    @property
+    def index_version(self) -> str:
+        return self._index.version
+
+    def swap_index(self, persist_directory: str) -> IndexHandle:
+        """
+        Open the index at `persist_directory` (the slow part, done before the swap)
+        and make it live. Returns the previous handle, still open for the requests
+        using it; the caller closes it once they have drained.
+        """
+        handle = self._open_index(persist_directory)
+        with self._swap_lock:
+            previous = self._index
+            self._index = handle
+            # Keep the RetrievalQA chain's retriever in step for callers that still run it whole
+            if getattr(self, "qa_chain", None) is not None:
+                self.qa_chain.retriever = handle.retriever
+            self.index_swaps += 1
+        print(f"{type(self).__name__}: swapped index {previous.persist_directory} ({previous.version}) "
+              f"-> {handle.persist_directory} ({handle.version})")
+        return previous
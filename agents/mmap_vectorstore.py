@@ -0,0 +1,271 @@
+# agents/mmap_vectorstore.py
+"""
+Read-only vector store backed by memory-mapped NumPy files, as a fast-starting
+alternative to the Chroma/HNSW directories.
+
+Layout of an exported directory:
+    manifest.json   format, dtype, dimension, row count, IVF settings
+    vectors.npy     (n, dim) float16 or int8 matrix of unit-length embeddings
+    scales.npy      (n,) float32 per-row scales (int8 only)
+    meta.bin        concatenated UTF-8 JSON records {"id", "text", "metadata"}
+    meta_offsets.npy (n + 1,) uint64 byte offsets into meta.bin
+    ivf_centroids.npy / ivf_order.npy / ivf_offsets.npy   optional IVF lists
+
+Everything is opened with mmap, so startup does no parsing and worker processes
+share the same page-cache pages. Export from an existing Chroma store with:
+
+    python -m agents.mmap_vectorstore clinical_index clinical_index_mmap --dtype int8 --ivf-lists 64
+"""
+
+import os
+import json
+import argparse
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.vectorstores import VectorStore
+
+from vector_math import unit_rows
+
+MANIFEST_FORMAT = "mmap-vectors-v1"
+SEARCH_BLOCK_ROWS = 65536
+DEFAULT_NPROBE = int(os.getenv("MMAP_IVF_NPROBE", "8"))
+
+
+def is_mmap_index(directory: str) -> bool:
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        return json.load(f).get("format") == MANIFEST_FORMAT
+
+
+class MmapVectorStore(VectorStore):
+    """Exact (or IVF) cosine search over a memory-mapped quantized matrix."""
+
+    def __init__(self, directory: str, embedding_function, nprobe: int = DEFAULT_NPROBE):
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.nprobe = nprobe
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.scales = (np.load(os.path.join(directory, "scales.npy"), mmap_mode="r")
+                       if self.manifest["dtype"] == "int8" else None)
+        self.meta = np.memmap(os.path.join(directory, "meta.bin"), dtype=np.uint8, mode="r")
+        self.meta_offsets = np.load(os.path.join(directory, "meta_offsets.npy"), mmap_mode="r")
+        self.ivf = None
+        if self.manifest.get("ivf_lists"):
+            self.ivf = (
+                np.load(os.path.join(directory, "ivf_centroids.npy"), mmap_mode="r"),
+                np.load(os.path.join(directory, "ivf_order.npy"), mmap_mode="r"),
+                np.load(os.path.join(directory, "ivf_offsets.npy"), mmap_mode="r"),
+            )
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def __len__(self) -> int:
+        return int(self.manifest["count"])
+
+    # --- records -----------------------------------------------------------------
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        start, end = int(self.meta_offsets[row]), int(self.meta_offsets[row + 1])
+        return json.loads(self.meta[start:end].tobytes().decode("utf-8"))
+
+    def _document(self, row: int) -> Document:
+        record = self._record(row)
+        return Document(page_content=record["text"], metadata=record.get("metadata") or {})
+
+    def get(self, include: Optional[List[str]] = None, **_kwargs) -> Dict[str, List[Any]]:
+        """Chroma-compatible bulk read (used to build the BM25 index)."""
+        records = [self._record(row) for row in range(len(self))]
+        return {
+            "ids": [r["id"] for r in records],
+            "documents": [r["text"] for r in records],
+            "metadatas": [r.get("metadata") or {} for r in records],
+        }
+
+    # --- search ------------------------------------------------------------------
+
+    def _scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine scores of the query against all rows (or the given rows), block by block."""
+        if rows is not None:
+            block = self.vectors[rows].astype(np.float32) @ query
+            return block * self.scales[rows] if self.scales is not None else block
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, len(self))
+            block = self.vectors[start:end].astype(np.float32) @ query
+            scores[start:end] = block * self.scales[start:end] if self.scales is not None else block
+        return scores
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        if self.ivf is None:
+            return None
+        centroids, order, offsets = self.ivf
+        probes = np.argsort(-(np.asarray(centroids) @ query))[:self.nprobe]
+        return np.concatenate([order[offsets[p]:offsets[p + 1]] for p in probes])
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        query = unit_rows(np.asarray(embedding, dtype=np.float32))
+        rows = self._candidate_rows(query)
+        scores = self._scores(query, rows)
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        row_ids = rows[top] if rows is not None else top
+        return [(self._document(int(row)), float(scores[i])) for row, i in zip(row_ids, top)]
+
+    def similarity_search_by_vectors(self, embeddings: List[List[float]], k: int = 4) -> List[List[Document]]:
+        """
+        Top-k documents for many query vectors. Exact indexes score the whole batch
+        with one matrix product per block instead of one pass per query.
+        """
+        if self.ivf is not None:
+            return [self.similarity_search_by_vector(embedding, k) for embedding in embeddings]
+        queries = unit_rows(np.asarray(embeddings, dtype=np.float32))
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, len(self))
+            block = queries @ self.vectors[start:end].astype(np.float32).T
+            scores[:, start:end] = block * self.scales[start:end] if self.scales is not None else block
+        k = min(k, len(self))
+        if k == 0:
+            return [[] for _ in embeddings]
+        results = []
+        for row_scores in scores:
+            top = np.argpartition(-row_scores, k - 1)[:k]
+            results.append([self._document(int(row)) for row in top[np.argsort(-row_scores[top])]])
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Cosine similarity in [-1, 1] mapped to [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs) -> List[str]:
+        raise NotImplementedError("MmapVectorStore is read-only; re-export from Chroma to add documents.")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Build an MmapVectorStore with export_from_chroma().")
+
+
+# --- export ----------------------------------------------------------------------
+
+def _kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means; returns (centroids, assignment)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = vectors[assign == c]
+            if len(members):
+                centroids[c] = unit_rows(members.sum(axis=0))
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+def write_mmap_index(out_dir: str, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]],
+                     embeddings: np.ndarray, dtype: str = "float16", ivf_lists: int = 0) -> None:
+    os.makedirs(out_dir, exist_ok=True)
+    vectors = unit_rows(np.asarray(embeddings, dtype=np.float32))
+
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        np.save(os.path.join(out_dir, "vectors.npy"), np.round(vectors / scales[:, None]).astype(np.int8))
+        np.save(os.path.join(out_dir, "scales.npy"), scales.astype(np.float32))
+    elif dtype == "float16":
+        np.save(os.path.join(out_dir, "vectors.npy"), vectors.astype(np.float16))
+    else:
+        raise ValueError(f"Unsupported dtype '{dtype}' (use float16 or int8).")
+
+    offsets = [0]
+    with open(os.path.join(out_dir, "meta.bin"), "wb") as f:
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            payload = json.dumps({"id": doc_id, "text": text, "metadata": metadata or {}},
+                                 separators=(",", ":")).encode("utf-8")
+            f.write(payload)
+            offsets.append(offsets[-1] + len(payload))
+    np.save(os.path.join(out_dir, "meta_offsets.npy"), np.asarray(offsets, dtype=np.uint64))
+
+    ivf_lists = min(ivf_lists, len(vectors))
+    if ivf_lists:
+        centroids, assign = _kmeans(vectors, ivf_lists)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        counts = np.bincount(assign, minlength=ivf_lists)
+        np.save(os.path.join(out_dir, "ivf_centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(out_dir, "ivf_order.npy"), order)
+        np.save(os.path.join(out_dir, "ivf_offsets.npy"), np.concatenate([[0], np.cumsum(counts)]).astype(np.int64))
+
+    # Manifest last: a directory without one is never mistaken for a finished index
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump({"format": MANIFEST_FORMAT, "dtype": dtype, "dim": int(vectors.shape[1]),
+                   "count": int(len(vectors)), "ivf_lists": int(ivf_lists)}, f, indent=2)
+
+
+def export_from_chroma(persist_directory: str, out_dir: str, dtype: str = "float16", ivf_lists: int = 0) -> None:
+    """Copy the embeddings, texts and metadata of a persisted Chroma store into an mmap index."""
+    from langchain_community.vectorstores import Chroma
+    store = Chroma(persist_directory=persist_directory)
+    data = store.get(include=["embeddings", "documents", "metadatas"])
+    write_mmap_index(out_dir, data["ids"], data["documents"], data["metadatas"],
+                     np.asarray(data["embeddings"]), dtype=dtype, ivf_lists=ivf_lists)
+    print(f"Exported {len(data['ids'])} vectors from '{persist_directory}' to '{out_dir}' ({dtype}, {ivf_lists} IVF lists).")
+
+
+def batch_similarity_search(vectorstore, embeddings: List[List[float]], k: int) -> List[List[Document]]:
+    """
+    Top-k documents per query vector in one call to the store where it supports
+    that (mmap matrix product, Chroma's multi-query collection.query), otherwise one search each.
+    """
+    if not embeddings:
+        return []
+    if hasattr(vectorstore, "similarity_search_by_vectors"):
+        return vectorstore.similarity_search_by_vectors(embeddings, k)
+    collection = getattr(vectorstore, "_collection", None)
+    if collection is not None:
+        result = collection.query(query_embeddings=[list(map(float, e)) for e in embeddings], n_results=k,
+                                  include=["documents", "metadatas"])
+        return [
+            [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+            for texts, metadatas in zip(result["documents"], result["metadatas"])
+        ]
+    return [vectorstore.similarity_search_by_vector(embedding, k=k) for embedding in embeddings]
+
+
+def load_vectorstore(persist_directory: str, embedding_function):
+    """
+    Open the agent's vector store: an mmap index if the directory holds one,
+    otherwise the Chroma store, so the backend is chosen per agent by its path.
+    """
+    if is_mmap_index(persist_directory):
+        print(f"Opening memory-mapped vector index: '{persist_directory}'")
+        return MmapVectorStore(persist_directory, embedding_function)
+    from langchain_community.vectorstores import Chroma
+    return Chroma(persist_directory=persist_directory, embedding_function=embedding_function)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a Chroma store to a memory-mapped vector index.")
+    parser.add_argument("chroma_dir")
+    parser.add_argument("out_dir")
+    parser.add_argument("--dtype", choices=["float16", "int8"], default="float16")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="0 = exact search")
+    args = parser.parse_args()
+    export_from_chroma(args.chroma_dir, args.out_dir, dtype=args.dtype, ivf_lists=args.ivf_lists)
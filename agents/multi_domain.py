@@ -0,0 +1,78 @@
+# agents/multi_domain.py
+
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from langchain.docstore.document import Document
+
+import telemetry
+from agents.context_packing import pack_context
+
+MULTI_DOMAIN_MAX_DOCS = int(os.getenv("MULTI_DOMAIN_MAX_DOCS", "8"))
+
+MULTI_DOMAIN_PROMPT_TEMPLATE = """You are an expert assistant covering both United Nations food security reports and clinical study records. Each excerpt below is labelled with the collection it came from.
+
+Context:
+{context}
+
+User's Question: {question}
+
+Based ONLY on the provided context, answer the user's question concisely and accurately, drawing on both collections where relevant and saying which one supports each point. If the answer cannot be found within the context, state explicitly: 'Based on the provided documents, I cannot answer that question.'"""
+
+DOMAIN_LABELS = {"food": "UN food security report", "clinical": "Clinical study record"}
+
+
+def merge_scored_documents(results: Dict[str, List[Tuple[Document, float]]],
+                           max_docs: int = MULTI_DOMAIN_MAX_DOCS) -> List[Tuple[Document, float]]:
+    """
+    Merge per-domain (document, relevance) hits into one ranked list.
+    Scores are min-max normalised within each domain so the indexes are comparable,
+    duplicate passages (same whitespace-normalised text) keep their best score, and
+    every returned document carries a "domain" metadata field.
+    """
+    merged: Dict[str, Tuple[Document, float]] = {}
+    for domain, hits in results.items():
+        if not hits:
+            continue
+        scores = [score for _, score in hits]
+        lo, hi = min(scores), max(scores)
+        for doc, score in hits:
+            norm = (score - lo) / (hi - lo) if hi > lo else 1.0
+            key = " ".join(doc.page_content.split())
+            if key in merged and merged[key][1] >= norm:
+                continue
+            tagged = Document(page_content=doc.page_content, metadata={**doc.metadata, "domain": domain})
+            merged[key] = (tagged, norm)
+    ranked = sorted(merged.values(), key=lambda item: item[1], reverse=True)
+    return ranked[:max_docs]
+
+
+def format_multi_domain_context(docs: List[Document]) -> str:
+    return "\n\n".join(
+        f"[{DOMAIN_LABELS.get(doc.metadata.get('domain'), 'Document')}]\n{doc.page_content}" for doc in docs
+    )
+
+
+def build_multi_domain_prompt(question: str, docs: List[Document]) -> str:
+    docs, _ = pack_context(question, docs)
+    return MULTI_DOMAIN_PROMPT_TEMPLATE.format(context=format_multi_domain_context(docs), question=question)
+
+
+def retrieve_multi(agents: Dict[str, object], question: str,
+                   max_docs: int = MULTI_DOMAIN_MAX_DOCS) -> List[Document]:
+    """Query every agent's store in parallel threads and merge the hits."""
+    with telemetry.span("retrieval", agent="+".join(agents)):
+        with ThreadPoolExecutor(max_workers=len(agents)) as pool:
+            futures = {domain: pool.submit(agent.retrieve_scored, question) for domain, agent in agents.items()}
+            results = {domain: future.result() for domain, future in futures.items()}
+    return [doc for doc, _ in merge_scored_documents(results, max_docs)]
+
+
+async def aretrieve_multi(agents: Dict[str, object], question: str,
+                          max_docs: int = MULTI_DOMAIN_MAX_DOCS) -> List[Document]:
+    """Async version of retrieve_multi; the searches run concurrently."""
+    with telemetry.span("retrieval", agent="+".join(agents)):
+        domains = list(agents)
+        hits = await asyncio.gather(*(agents[domain].aretrieve_scored(question) for domain in domains))
+    return [doc for doc, _ in merge_scored_documents(dict(zip(domains, hits)), max_docs)]
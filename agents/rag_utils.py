@@ -0,0 +1,100 @@
+# agents/rag_utils.py
+
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional
+from langchain.docstore.document import Document
+
+import telemetry
+from agents.context_packing import pack_context
+from single_flight import get_flight
+
+# Identical generation prompts (same agent, question and packed context) in flight at once share one Gemini call
+_generation_flight = get_flight("llm")
+
+
+def _generation_key(agent, query: str, docs: List[Document]):
+    return ("generation", id(agent), query, tuple(doc.page_content for doc in docs))
+
+
+def format_context(docs: List[Document]) -> str:
+    """
+    Join retrieved documents the same way the "stuff" chain does.
+    """
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
+def doc_to_source(doc: Document) -> Dict[str, Any]:
+    """
+    Compact, JSON-serializable description of a retrieved document for clients.
+    """
+    return {
+        "metadata": dict(doc.metadata),
+        "snippet": doc.page_content[:200],
+    }
+
+
+def passages_answer(docs: List[Document], limit: int = 3) -> str:
+    """
+    Answer without generation: the top retrieved passages verbatim, used when the
+    request deadline leaves no time for the LLM.
+    """
+    if not docs:
+        return "No answer could be produced within the time limit."
+    parts = ["No answer could be generated within the time limit. The most relevant passages were:"]
+    for i, doc in enumerate(docs[:limit], start=1):
+        parts.append(f"[{i}] {doc.page_content.strip()}")
+    return "\n\n".join(parts)
+
+
+def generate_answer(agent, query: str, docs: List[Document]) -> str:
+    """
+    Run only the generation half of the agent's RetrievalQA chain over given documents,
+    after packing them into the context token budget.
+    """
+    docs, _ = pack_context(query, docs)
+    chain_input = {"input_documents": docs, "question": query}
+    with telemetry.span("generation"):
+        result = _generation_flight.do(_generation_key(agent, query, docs),
+                                       lambda: agent.qa_chain.combine_documents_chain.invoke(chain_input))
+    return result.get("output_text", "Agent did not return a result.")
+
+
+async def agenerate_answer(agent, query: str, docs: List[Document]) -> str:
+    """
+    Async version of generate_answer using the async Gemini client.
+    """
+    docs, _ = pack_context(query, docs)
+    chain_input = {"input_documents": docs, "question": query}
+    with telemetry.span("generation"):
+        result = await _generation_flight.ado(_generation_key(agent, query, docs),
+                                              lambda: agent.qa_chain.combine_documents_chain.ainvoke(chain_input))
+    return result.get("output_text", "Agent did not return a result.")
+
+
+async def astream_answer(agent, query: str, docs: Optional[List[Document]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream a retrieval-augmented answer for one of the retrieval agents.
+    Yields {"event": "sources", ...} once, then {"event": "token", ...} per LLM chunk.
+    Pass `docs` to skip retrieval when they were already fetched.
+    Closing the generator closes the upstream LLM stream, cancelling the Gemini call.
+    """
+    if docs is None:
+        docs = await agent.aretrieve(query)
+    yield {"event": "sources", "data": [doc_to_source(doc) for doc in docs]}
+
+    docs, _ = pack_context(query, docs)
+    prompt_text = agent.prompt.format(context=format_context(docs), question=query)
+    async with aclosing(astream_tokens(agent.llm, prompt_text)) as tokens:
+        async for event in tokens:
+            yield event
+
+
+async def astream_tokens(llm, prompt_text: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield {"event": "token", ...} for each non-empty chunk of an LLM stream.
+    """
+    with telemetry.span("generation", mode="stream"):
+        async with aclosing(llm.astream(prompt_text)) as chunks:
+            async for chunk in chunks:
+                if chunk.content:
+                    yield {"event": "token", "data": chunk.content}
@@ -0,0 +1,115 @@
+# agents/reranker.py
+
+import os
+import time
+import threading
+from typing import Any, Dict, List, Tuple
+
+from langchain.docstore.document import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+
+import telemetry
+
+RERANK_ENABLED = os.getenv("RERANK", "0") == "1"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "30"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+# Starting guess for CPU cost per (query, chunk) pair before any rerank has been timed
+INITIAL_MS_PER_PAIR = 3.0
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs with a small local cross-encoder in one batched
+    CPU forward pass. A running estimate of the per-pair cost caps how many
+    candidates are scored so the stage stays inside its latency budget; if not
+    even `top_n` fit, the vector order is kept.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL):
+        from sentence_transformers import CrossEncoder
+        print(f"Loading cross-encoder reranker: {model_name}")
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, device="cpu")
+        self._lock = threading.Lock()
+        self.ms_per_pair = INITIAL_MS_PER_PAIR
+        self._counts = {"reranks": 0, "pairs_scored": 0, "skipped_budget": 0, "over_budget": 0}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[key] += n
+
+    def rerank(self, query: str, docs: List[Document], top_n: int,
+               budget_ms: float = RERANK_BUDGET_MS) -> List[Tuple[Document, float]]:
+        """Best `top_n` documents with cross-encoder scores (or rank scores on fallback)."""
+        affordable = int(budget_ms / self.ms_per_pair) if self.ms_per_pair > 0 else len(docs)
+        n_pairs = min(len(docs), affordable)
+        if n_pairs < min(top_n, len(docs)):
+            self._count("skipped_budget")
+            return [(doc, 1.0 / (rank + 1)) for rank, doc in enumerate(docs[:top_n])]
+
+        candidates = docs[:n_pairs]
+        with telemetry.span("rerank", pairs=str(n_pairs)):
+            start = time.perf_counter()
+            scores = self.model.predict([(query, doc.page_content) for doc in candidates],
+                                        batch_size=n_pairs, show_progress_bar=False)
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+
+        with self._lock:
+            # Exponentially weighted so the estimate follows load on the box
+            self.ms_per_pair = 0.8 * self.ms_per_pair + 0.2 * (elapsed_ms / n_pairs)
+            self._counts["reranks"] += 1
+            self._counts["pairs_scored"] += n_pairs
+            if elapsed_ms > budget_ms:
+                self._counts["over_budget"] += 1
+
+        ranked = sorted(zip(candidates, (float(s) for s in scores)), key=lambda item: item[1], reverse=True)
+        return ranked[:top_n]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counts)
+            stats["ms_per_pair"] = round(self.ms_per_pair, 3)
+        return stats
+
+
+_rerankers: Dict[str, CrossEncoderReranker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_reranker(model_name: str = RERANK_MODEL) -> CrossEncoderReranker:
+    """Process-wide reranker per model, loaded on first use (shared by both agents)."""
+    reranker = _rerankers.get(model_name)
+    if reranker is None:
+        with _registry_lock:
+            reranker = _rerankers.get(model_name)
+            if reranker is None:
+                reranker = CrossEncoderReranker(model_name)
+                _rerankers[model_name] = reranker
+    return reranker
+
+
+def reranker_stats() -> Dict[str, Any]:
+    return {name: reranker.stats() for name, reranker in _rerankers.items()}
+
+
+class RerankingRetriever(BaseRetriever):
+    """
+    Wraps an over-fetching retriever (e.g. top-30) and keeps the `k` best
+    documents according to the cross-encoder.
+    """
+
+    base_retriever: Any
+    reranker: Any
+    k: int = 5
+    budget_ms: float = RERANK_BUDGET_MS
+    # Mirrors VectorStoreRetriever so callers can read the configured k
+    search_kwargs: Dict[str, Any] = {}
+
+    def search_with_scores(self, query: str) -> List[Tuple[Document, float]]:
+        candidates = self.base_retriever.invoke(query)
+        return self.reranker.rerank(query, candidates, self.k, self.budget_ms)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query)]
@@ -6,12 +6,60 @@ from langchain.agents import Tool, AgentExecutor, LLMSingleActionAgent, AgentOut
 from langchain.prompts import BaseChatPromptTemplate, StringPromptTemplate # Modified import
 from langchain.schema import AgentAction, AgentFinish, OutputParserException # Added import
 from langchain.chains import LLMChain # Added import
-from typing import List, Union # Added Union
+from typing import List, Union, Dict, Any, Optional # Added Union
 import re # Added import for regex parsing
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
-# Your web_search_tool remains the same
+import telemetry
+from agents.web_search import build_search_backend
+
+# Hard caps on the ReAct loop: every step is a sequential Gemini call
+WEB_AGENT_MAX_STEPS = int(os.getenv("WEB_AGENT_MAX_STEPS", "3"))
+WEB_AGENT_MAX_SECONDS = float(os.getenv("WEB_AGENT_MAX_SECONDS", "20"))
+# "auto" answers directly unless the question looks like it needs fresh information
+WEB_AGENT_MODE = os.getenv("WEB_AGENT_MODE", "auto")
+# Threads the sync path runs ReAct loops on, so it can stop waiting at max_seconds
+WEB_AGENT_SYNC_WORKERS = int(os.getenv("WEB_AGENT_SYNC_WORKERS", "8"))
+
+_react_pool = ThreadPoolExecutor(max_workers=WEB_AGENT_SYNC_WORKERS, thread_name_prefix="web-agent")
+
+# Questions mentioning these need the search tool; everything else is answered in one call
+_NEEDS_SEARCH_RE = re.compile(
+    r"\b(latest|current(ly)?|today|tonight|yesterday|tomorrow|this (week|month|year)|recent(ly)?|news|"
+    r"now|price|stock|weather|score|won|election|20\d\d)\b",
+    re.IGNORECASE,
+)
+
+DIRECT_ANSWER_TEMPLATE = """Answer the following question concisely and accurately from general knowledge. If it depends on information you cannot know, say so briefly.
+
+Question: {input}
+Answer:"""
+
+# What AgentExecutor returns with early_stopping_method="force" when the loop hits its caps
+_STOPPED_OUTPUT_PREFIX = "Agent stopped due to"
+# Reported instead; the "An error occurred" prefix keeps it out of the answer cache
+INCOMPLETE_ANSWER = ("An error occurred while processing your request: the web agent could not complete "
+                     "an answer within its step and time limits.")
+
+
+def _react_output(result: Dict[str, Any], span_tags: Dict[str, str]) -> str:
+    output = result.get("output", "No output found.")
+    if output.startswith(_STOPPED_OUTPUT_PREFIX):
+        span_tags["outcome"] = "incomplete"
+        return INCOMPLETE_ANSWER
+    return output
+
+
+_default_search = None
+
+# Kept for callers that use the tool function directly; backed by the configured, cached search
 def web_search_tool(query: str) -> str:
-    return f"Mock search result for '{query}'. (Implement real web search here)"
+    global _default_search
+    if _default_search is None:
+        _default_search = build_search_backend()
+    return _default_search.search(query)
 
 # ****** MODIFIED PROMPT TEMPLATE (Example for ReAct style) ******
 # NOTE: This is a basic ReAct prompt template. You might need to refine it.
@@ -91,12 +139,28 @@ class CustomOutputParser(AgentOutputParser):
 
 
 class WebAgent:
-    def __init__(self):
+    def __init__(self,
+                 search_backend=None,
+                 mode: Optional[str] = None,
+                 max_steps: int = WEB_AGENT_MAX_STEPS,
+                 max_seconds: float = WEB_AGENT_MAX_SECONDS):
+        """
+        search_backend: object with search(query) -> str; defaults to the cached
+        WEB_SEARCH_BACKEND ("mock" or "local" corpus).
+        mode: "auto", "react" (always use tools) or "direct" (single LLM call).
+        max_steps / max_seconds: hard caps on the ReAct loop.
+        """
+        self.mode = mode or WEB_AGENT_MODE
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.search = search_backend or build_search_backend()
+
         self.llm = ChatGoogleGenerativeAI(
             # Use gemini-1.5-flash or another capable model for complex reasoning
             model="gemini-2.0-flash", # Changed model
             temperature=0.0,
             google_api_key=os.getenv("gemini_api"),
+            timeout=max_seconds,
             # Optional: Convert usage to single turn if needed, depending on model/task
             # convert_system_message_to_human=True
         )
@@ -104,7 +168,7 @@ class WebAgent:
         self.tools = [
             Tool(
                 name="web_search",
-                func=web_search_tool,
+                func=self.search.search,
                 description="Useful for when you need to answer questions about current events or general knowledge." # Improved description
             )
         ]
@@ -135,15 +199,86 @@ class WebAgent:
         self.agent_executor = AgentExecutor.from_agent_and_tools(
             agent=single_action_agent,
             tools=self.tools,
-            verbose=True,
+            verbose=os.getenv("WEB_AGENT_VERBOSE", "0") == "1",
             # Add handle_parsing_errors=True for robustness
-            handle_parsing_errors="Check your output and make sure it conforms to the format."
+            handle_parsing_errors="Check your output and make sure it conforms to the format.",
+            # Bounded loop: stop after max_steps LLM calls or max_seconds (reported as INCOMPLETE_ANSWER)
+            max_iterations=max_steps,
+            max_execution_time=max_seconds,
+            early_stopping_method="force",
         )
 
+    def needs_tools(self, query: str) -> bool:
+        """Whether the question goes through the ReAct loop rather than a single direct call."""
+        if self.mode == "react":
+            return True
+        if self.mode == "direct":
+            return False
+        return bool(_NEEDS_SEARCH_RE.search(query))
+
+    def invoke(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Expects {"input": "user question"} and returns {"output": "answer"},
+        the same contract as the retrieval agents.
+        """
+        query = input_data.get("input")
+        if not query:
+            return {"output": "Error: Missing 'input' key in request."}
+
+        try:
+            if not self.needs_tools(query):
+                with telemetry.span("generation", agent="web", mode="direct"):
+                    response = self.llm.invoke(DIRECT_ANSWER_TEMPLATE.format(input=query))
+                return {"output": response.content}
+            # max_execution_time is only checked between steps; waiting on a future enforces the
+            # wall-clock cap, as wait_for does in ainvoke. An abandoned loop finishes in the background.
+            with telemetry.span("generation", agent="web", mode="react") as span_tags:
+                future = _react_pool.submit(contextvars.copy_context().run, self.agent_executor.invoke,
+                                            {"input": query})
+                try:
+                    result = future.result(timeout=self.max_seconds + 1.0)
+                except FutureTimeoutError:
+                    future.cancel()
+                    raise
+                output = _react_output(result, span_tags)
+            return {"output": output}
+        except FutureTimeoutError:
+            print(f"WebAgent hit its {self.max_seconds}s limit for: '{query[:50]}...'")
+            return {"output": "An error occurred while processing your request: the web agent timed out."}
+        except Exception as e:
+            print(f"Error during WebAgent invoke: {e}")
+            return {"output": f"An error occurred while processing your request: {e}"}
+
     def run(self, query: str) -> str:
         """
         Runs the web agent on a general question.
         """
-        # Use invoke for newer Langchain versions
-        result = self.agent_executor.invoke({"input": query})
-        return result.get("output", "No output found.") # Extract output correctly
\ No newline at end of file
+        return self.invoke({"input": query})["output"]
+
+    async def ainvoke(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async entry point used by Orchestrator.arun.
+        Expects {"input": "user question"} and returns {"output": "answer"}.
+        """
+        query = input_data.get("input")
+        if not query:
+            return {"output": "Error: Missing 'input' key in request."}
+
+        try:
+            if not self.needs_tools(query):
+                with telemetry.span("generation", agent="web", mode="direct"):
+                    response = await self.llm.ainvoke(DIRECT_ANSWER_TEMPLATE.format(input=query))
+                return {"output": response.content}
+            # The executor's async path awaits the LLM chain; the sync tool is run in the default executor.
+            # max_execution_time is only checked between steps, so wait_for enforces the wall-clock cap.
+            with telemetry.span("generation", agent="web", mode="react") as span_tags:
+                result = await asyncio.wait_for(self.agent_executor.ainvoke({"input": query}),
+                                                timeout=self.max_seconds + 1.0)
+                output = _react_output(result, span_tags)
+            return {"output": output}
+        except asyncio.TimeoutError:
+            print(f"WebAgent hit its {self.max_seconds}s limit for: '{query[:50]}...'")
+            return {"output": "An error occurred while processing your request: the web agent timed out."}
+        except Exception as e:
+            print(f"Error during WebAgent ainvoke: {e}")
+            return {"output": f"An error occurred while processing your request: {e}"}
@@ -0,0 +1,126 @@
+# agents/web_search.py
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from agents.hybrid_retriever import BM25Index
+
+WEB_SEARCH_BACKEND = os.getenv("WEB_SEARCH_BACKEND", "mock")
+WEB_SEARCH_CORPUS_DIR = os.getenv("WEB_SEARCH_CORPUS_DIR", "data/web_corpus")
+WEB_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("WEB_SEARCH_CACHE_TTL_SECONDS", "900"))
+WEB_SEARCH_CACHE_SIZE = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "512"))
+# Paragraph-sized passages keep search results short enough for the ReAct prompt
+PASSAGE_CHARS = 800
+
+
+class MockSearchBackend:
+    """Placeholder backend kept for development without a corpus or network."""
+
+    name = "mock"
+
+    def search(self, query: str) -> str:
+        return f"Mock search result for '{query}'. (Implement real web search here)"
+
+
+class LocalCorpusSearchBackend:
+    """
+    Offline search over .txt/.md files in a directory, split into passages and
+    ranked with BM25. Useful for demos, tests and air-gapped deployments.
+    """
+
+    name = "local"
+
+    def __init__(self, corpus_dir: str = WEB_SEARCH_CORPUS_DIR, top_n: int = 3):
+        self.corpus_dir = corpus_dir
+        self.top_n = top_n
+        ids, texts, metadatas = [], [], []
+        if os.path.isdir(corpus_dir):
+            for name in sorted(os.listdir(corpus_dir)):
+                if not name.endswith((".txt", ".md")):
+                    continue
+                with open(os.path.join(corpus_dir, name), encoding="utf-8") as f:
+                    for i, passage in enumerate(self._passages(f.read())):
+                        ids.append(f"{name}#{i}")
+                        texts.append(passage)
+                        metadatas.append({"source": name})
+        else:
+            print(f"Warning: web search corpus '{corpus_dir}' not found; local search will return nothing.")
+        self.index = BM25Index(ids, texts, metadatas)
+        print(f"Local web search corpus loaded: {len(texts)} passages from '{corpus_dir}'.")
+
+    @staticmethod
+    def _passages(text: str) -> List[str]:
+        passages, current = [], ""
+        for paragraph in (p.strip() for p in text.split("\n\n")):
+            if not paragraph:
+                continue
+            if current and len(current) + len(paragraph) > PASSAGE_CHARS:
+                passages.append(current)
+                current = ""
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            passages.append(current)
+        return passages
+
+    def search(self, query: str) -> str:
+        hits = self.index.search(query, self.top_n)
+        if not hits:
+            return f"No results found for '{query}'."
+        return "\n\n".join(
+            f"[{self.index.metadatas[idx]['source']}] {self.index.texts[idx]}" for idx, _ in hits
+        )
+
+
+class CachedSearch:
+    """TTL + LRU result cache in front of any backend with a search(query) method."""
+
+    def __init__(self, backend, ttl_seconds: float = WEB_SEARCH_CACHE_TTL_SECONDS,
+                 max_entries: int = WEB_SEARCH_CACHE_SIZE):
+        self.backend = backend
+        self.name = getattr(backend, "name", type(backend).__name__)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def search(self, query: str) -> str:
+        key = " ".join(query.lower().split())
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        result = self.backend.search(query)
+        with self._lock:
+            self._entries[key] = (now, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": size,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def build_search_backend(name: Optional[str] = None) -> CachedSearch:
+    """Cached search backend selected by name or the WEB_SEARCH_BACKEND env var."""
+    name = name or WEB_SEARCH_BACKEND
+    if name == "local":
+        backend = LocalCorpusSearchBackend()
+    elif name == "mock":
+        backend = MockSearchBackend()
+    else:
+        raise ValueError(f"Unknown web search backend '{name}' (expected 'mock' or 'local').")
+    return CachedSearch(backend)
@@ -0,0 +1,192 @@
+# answer_cache.py
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from vector_math import unit_rows
+
+DEFAULT_SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "256"))
+DEFAULT_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+# The web scope has no index version to invalidate it, so its answers age out sooner
+WEB_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_WEB_TTL_SECONDS", "300"))
+
+
+def index_fingerprint(persist_directory: Optional[str]) -> str:
+    """
+    Cheap version string for a persisted Chroma directory, built from the size and
+    mtime of every file in it. Any upsert/delete/re-ingest changes the fingerprint.
+    """
+    if not persist_directory or not os.path.isdir(persist_directory):
+        return "static"
+    parts = []
+    for root, _dirs, files in os.walk(persist_directory):
+        for name in sorted(files):
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            parts.append(f"{name}:{st.st_size}:{st.st_mtime_ns}")
+    return hashlib.sha1("|".join(sorted(parts)).encode()).hexdigest()[:12]
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    vector: np.ndarray
+    created_at: float
+    index_version: str
+
+
+@dataclass
+class CacheHit:
+    scope: str
+    question: str
+    answer: str
+    similarity: float
+
+
+class _Scope:
+    """LRU-ordered entries for one agent plus a lazily rebuilt similarity matrix."""
+
+    def __init__(self):
+        self.entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self.version: Optional[str] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[int] = []
+
+    def invalidate_matrix(self):
+        self._matrix = None
+
+    def matrix(self):
+        if self._matrix is None:
+            self._keys = list(self.entries.keys())
+            self._matrix = (np.stack([self.entries[k].vector for k in self._keys])
+                            if self._keys else np.empty((0, 0), dtype=np.float32))
+        return self._keys, self._matrix
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed on the question embedding.
+
+    A lookup hits when a cached question in any agent scope has cosine similarity
+    >= `threshold`. Each scope is an LRU bounded by `max_entries` with a TTL
+    (`ttl_seconds`, or `scope_ttls[scope]` where given), and is cleared whenever its
+    `version_fns[scope]()` value changes (e.g. the agent's Chroma collection was re-ingested).
+    """
+
+    def __init__(self,
+                 version_fns: Dict[str, Callable[[], str]],
+                 threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 scope_ttls: Optional[Dict[str, float]] = None):
+        self.version_fns = version_fns
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.scope_ttls = dict(scope_ttls or {})
+        self._scopes: Dict[str, _Scope] = {scope: _Scope() for scope in version_fns}
+        self._lock = threading.Lock()
+        self._next_key = 0
+        self._counters = {"hits": 0, "misses": 0, "stores": 0,
+                          "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @staticmethod
+    def _normalise(vector) -> np.ndarray:
+        return unit_rows(np.asarray(vector, dtype=np.float32))
+
+    def _sync_version(self, scope_name: str, scope: _Scope) -> str:
+        """Drop the scope's entries if its index version changed since they were stored."""
+        version = self.version_fns[scope_name]()
+        if scope.version is not None and version != scope.version and scope.entries:
+            print(f"Answer cache: index for '{scope_name}' changed, dropping {len(scope.entries)} entries.")
+            self._counters["invalidations"] += len(scope.entries)
+            scope.entries.clear()
+            scope.invalidate_matrix()
+        scope.version = version
+        return version
+
+    def _expire(self, scope_name: str, scope: _Scope, now: float) -> None:
+        ttl = self.scope_ttls.get(scope_name, self.ttl_seconds)
+        expired = [k for k, e in scope.entries.items() if now - e.created_at > ttl]
+        for k in expired:
+            del scope.entries[k]
+        if expired:
+            self._counters["expirations"] += len(expired)
+            scope.invalidate_matrix()
+
+    def lookup(self, vector) -> Optional[CacheHit]:
+        """Return the most similar cached answer above the threshold, across all scopes."""
+        query = self._normalise(vector)
+        now = time.time()
+        best = None
+        with self._lock:
+            for scope_name, scope in self._scopes.items():
+                self._sync_version(scope_name, scope)
+                self._expire(scope_name, scope, now)
+                keys, matrix = scope.matrix()
+                if not keys:
+                    continue
+                sims = matrix @ query
+                idx = int(np.argmax(sims))
+                if sims[idx] >= self.threshold and (best is None or sims[idx] > best[2]):
+                    best = (scope_name, keys[idx], float(sims[idx]))
+
+            if best is None:
+                self._counters["misses"] += 1
+                return None
+
+            scope_name, key, similarity = best
+            scope = self._scopes[scope_name]
+            scope.entries.move_to_end(key)
+            entry = scope.entries[key]
+            self._counters["hits"] += 1
+        return CacheHit(scope=scope_name, question=entry.question, answer=entry.answer, similarity=similarity)
+
+    def store(self, scope_name: str, question: str, vector, answer: str) -> None:
+        """Cache an answer under the agent scope that produced it."""
+        if scope_name not in self._scopes:
+            return
+        with self._lock:
+            scope = self._scopes[scope_name]
+            version = self._sync_version(scope_name, scope)
+            self._next_key += 1
+            scope.entries[self._next_key] = CachedAnswer(
+                question=question,
+                answer=answer,
+                vector=self._normalise(vector),
+                created_at=time.time(),
+                index_version=version,
+            )
+            while len(scope.entries) > self.max_entries:
+                scope.entries.popitem(last=False)
+                self._counters["evictions"] += 1
+            scope.invalidate_matrix()
+            self._counters["stores"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for scope in self._scopes.values():
+                scope.entries.clear()
+                scope.invalidate_matrix()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss and eviction counters, the hit rate and per-scope sizes."""
+        with self._lock:
+            stats: Dict[str, float] = dict(self._counters)
+            for scope_name, scope in self._scopes.items():
+                stats[f"size_{scope_name}"] = len(scope.entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["threshold"] = self.threshold
+        return stats
@@ -0,0 +1,271 @@
+# batch_chat.py
+
+import os
+import re
+import time
+import asyncio
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import telemetry
+from question_router import RouteDecision
+
+# Largest list of questions one /chat/batch request may carry
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))
+# Generation calls in flight at once per batch
+BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "8"))
+# Low-confidence questions listed in one classifier prompt
+BATCH_CLASSIFIER_CHUNK = int(os.getenv("BATCH_CLASSIFIER_CHUNK", "40"))
+
+_CLASSIFIER_LINE_RE = re.compile(r"^\W*(\d+)\W+(food|clinical|web)\b", re.IGNORECASE | re.MULTILINE)
+
+
+@dataclass
+class BatchItem:
+    """One question of a batch as it moves through embedding, routing, retrieval and generation."""
+    index: int
+    question: str
+    vector: Any = None
+    decision: Optional[RouteDecision] = None
+    docs: Optional[List[Any]] = None
+    done: bool = False
+
+
+class BatchRunner:
+    """
+    Answers many questions together, sharing work across them where the single
+    /chat path cannot:
+
+    - one embedding pass for every question (cache lookup and routing reuse it),
+    - one classifier prompt per BATCH_CLASSIFIER_CHUNK low-confidence questions,
+    - one batched similarity search per retrieval agent for the questions routed to it,
+    - generation for up to `concurrency` questions at a time.
+
+    Results are yielded as each question finishes. A question that fails is
+    reported with status "error" and does not affect the others.
+    """
+
+    def __init__(self, orchestrator, concurrency: int = BATCH_GENERATION_CONCURRENCY,
+                 classifier_chunk: int = BATCH_CLASSIFIER_CHUNK):
+        self.orchestrator = orchestrator
+        self.concurrency = max(1, concurrency)
+        self.classifier_chunk = max(1, classifier_chunk)
+        self._lock = threading.Lock()
+        self._counts = {"batches": 0, "questions": 0, "cached": 0, "errors": 0,
+                        "classifier_prompts": 0, "batched_retrievals": 0}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[key] += n
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    async def run(self, questions: List[str], include_timings: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield one result dict per question, in completion order:
+        {"index", "question", "answer", "route", "path", "cached", "status", "elapsed_ms"}
+        plus "error" for failed items and "timings" when include_timings is set.
+        Closing the generator cancels whatever is still running.
+        """
+        self._count("batches")
+        self._count("questions", len(questions))
+        items = [BatchItem(index=i, question=question) for i, question in enumerate(questions)]
+        results: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        started = time.perf_counter()
+        pipeline = asyncio.ensure_future(self._pipeline(items, results, started, include_timings))
+        try:
+            for _ in range(len(items)):
+                yield await results.get()
+            await pipeline
+        finally:
+            if not pipeline.done():
+                pipeline.cancel()
+
+    def _finish(self, item: BatchItem, results: asyncio.Queue, started: float, answer: Optional[str],
+                route: str, path: str, status: str = "ok", error: Optional[str] = None,
+                cached: bool = False, timings: Optional[Dict[str, Any]] = None) -> None:
+        result = {"index": item.index, "question": item.question, "answer": answer, "route": route,
+                  "path": path, "cached": cached, "status": status,
+                  "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 2)}
+        if error is not None:
+            result["error"] = error
+        if timings is not None:
+            result["timings"] = timings
+        if status != "ok":
+            self._count("errors")
+        item.done = True
+        results.put_nowait(result)
+
+    async def _pipeline(self, items: List[BatchItem], results: asyncio.Queue, started: float,
+                        include_timings: bool) -> None:
+        try:
+            await self._run_stages(items, results, started, include_timings)
+        finally:
+            # Whatever went wrong, every question gets exactly one result so the stream ends
+            for item in items:
+                if not item.done:
+                    self._finish(item, results, started, None, "unknown", "unknown", status="error",
+                                 error="The question could not be answered.")
+
+    async def _run_stages(self, items: List[BatchItem], results: asyncio.Queue, started: float,
+                          include_timings: bool) -> None:
+        orchestrator = self.orchestrator
+        try:
+            await self._embed(items)
+
+            # Cached answers go out straight away
+            pending = []
+            for item in items:
+                hit = (orchestrator.answer_cache.lookup(item.vector)
+                       if orchestrator.answer_cache is not None and item.vector is not None else None)
+                if hit is not None:
+                    self._count("cached")
+                    self._finish(item, results, started, hit.answer, hit.scope, "cache", cached=True)
+                else:
+                    pending.append(item)
+
+            await self._route(pending)
+            await self._retrieve(pending)
+        except Exception as e:
+            # A failed shared stage leaves the remaining items to be answered one by one
+            print(f"Batch stage failed, answering the remaining questions individually: {e}")
+            pending = [item for item in items if not item.done]
+            for item in pending:
+                if item.decision is not None and not item.decision.categories:
+                    item.decision = None  # routing did not finish; route it on its own
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [asyncio.ensure_future(self._answer(item, semaphore, results, started, include_timings))
+                 for item in pending]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _embed(self, items: List[BatchItem]) -> None:
+        """One embedding pass over the whole batch; items keep vector None if it fails."""
+        embedding_function = self.orchestrator.router.embedding_function
+        try:
+            with telemetry.span("batch_embedding", route="batch"):
+                vectors = await asyncio.to_thread(embedding_function.embed_documents,
+                                                  [item.question for item in items])
+        except Exception as e:
+            print(f"Error embedding batch of {len(items)} questions: {e}")
+            return
+        for item, vector in zip(items, vectors):
+            item.vector = vector
+
+    async def _route(self, items: List[BatchItem]) -> None:
+        """Route locally, then classify every low-confidence question through shared LLM prompts."""
+        orchestrator = self.orchestrator
+
+        def route_all():
+            return [orchestrator.route_local(item.question, item.vector) for item in items]
+
+        with telemetry.span("batch_classification", route="batch"):
+            for item, decision in zip(items, await asyncio.to_thread(route_all)):
+                item.decision = decision
+            fallback = [item for item in items if item.decision.path == "llm_fallback"]
+            chunks = [fallback[i:i + self.classifier_chunk] for i in range(0, len(fallback), self.classifier_chunk)]
+            await asyncio.gather(*(self._classify_chunk(chunk) for chunk in chunks))
+
+        for item in items:
+            decision = item.decision
+            if not decision.categories or decision.path == "llm_fallback":
+                decision.categories = [decision.category]
+            orchestrator.router.record(decision.path)
+
+    @staticmethod
+    def _classification_prompt(questions: List[str]) -> str:
+        listed = "\n".join(f'{n}. "{" ".join(question.split())}"' for n, question in enumerate(questions, 1))
+        return f"""Classify each of the following user questions into one of three categories:
+        1. 'food': Related to UN Food Security, agriculture, food aid, malnutrition statistics.
+        2. 'clinical': Related to medical data, clinical trials, healthcare procedures, diseases.
+        3. 'web': General knowledge, current events, or topics not covered by 'food' or 'clinical'.
+
+        User Questions:
+{listed}
+
+        Respond with one line per question in the form "<number>: <category>", where category is food, clinical, or web."""
+
+    async def _classify_chunk(self, items: List[BatchItem]) -> None:
+        orchestrator = self.orchestrator
+        prompt = self._classification_prompt([item.question for item in items])
+        self._count("classifier_prompts")
+        try:
+            with telemetry.span("llm_classification", route="batch"):
+                response = await orchestrator.llm_flight.ado(
+                    ("classifier_batch", prompt), lambda: orchestrator.classifier_llm.ainvoke(prompt))
+            labels = {int(n): category.lower() for n, category in _CLASSIFIER_LINE_RE.findall(response.content)}
+        except Exception as e:
+            print(f"Error during batch classification LLM call for {len(items)} questions: {e}")
+            labels = {}
+        for n, item in enumerate(items, 1):
+            if n not in labels:
+                print(f"Warning: batch classifier gave no category for question {item.index}. Defaulting to 'web'.")
+            item.decision.category = labels.get(n, "web")
+
+    async def _retrieve(self, items: List[BatchItem]) -> None:
+        """
+        One batched search per retrieval agent over the single-domain questions routed
+        to it. Questions the clinical trials table answers are left out; their agent
+        answers them from the table without a search.
+        """
+        groups: Dict[str, List[BatchItem]] = defaultdict(list)
+        for item in items:
+            agent = self.orchestrator.agent_for(item.decision.category)
+            if item.decision.is_multi or item.vector is None or not hasattr(agent, "retrieve_batch"):
+                continue
+            if hasattr(agent, "answer_from_table") and agent.answer_from_table(item.question) is not None:
+                continue
+            groups[item.decision.category].append(item)
+
+        async def retrieve_group(category: str, group: List[BatchItem]) -> None:
+            agent = self.orchestrator.agent_for(category)
+            try:
+                hits = await asyncio.to_thread(agent.retrieve_batch, [item.question for item in group],
+                                               [item.vector for item in group])
+            except Exception as e:
+                # The items keep docs None and retrieve individually when answered
+                print(f"Batched retrieval for {len(group)} '{category}' questions failed: {e}")
+                return
+            self._count("batched_retrievals")
+            for item, docs in zip(group, hits):
+                item.docs = docs
+
+        await asyncio.gather(*(retrieve_group(category, group) for category, group in groups.items()))
+
+    async def _answer(self, item: BatchItem, semaphore: asyncio.Semaphore, results: asyncio.Queue,
+                      started: float, include_timings: bool) -> None:
+        orchestrator = self.orchestrator
+        async with semaphore:
+            # Each question gets its own trace, so its timings and route are reported separately
+            with telemetry.trace() as request_trace:
+                decision = item.decision
+                route = "+".join(decision.categories) if decision is not None else "unknown"
+                path = decision.path if decision is not None else "unknown"
+                answer, status, error = None, "ok", None
+                try:
+                    with telemetry.span("request") as span_tags:
+                        if decision is None:
+                            decision = await orchestrator.aroute_question(item.question, item.vector)
+                            route, path = "+".join(decision.categories), decision.path
+                        telemetry.set_route(route)
+                        span_tags["route"] = route
+                        with telemetry.span("agent"):
+                            answer = await orchestrator.aanswer(decision, item.question, item.docs)
+                        span_tags["outcome"] = orchestrator.answer_outcome(answer)
+                    if span_tags["outcome"] == "ok":
+                        orchestrator.store_answer(decision.category, item.question, item.vector, answer)
+                    else:
+                        status, error = "error", answer
+                except Exception as e:
+                    print(f"Error answering batch question {item.index}: {e}")
+                    status, error = "error", str(e)
+            timings = request_trace.breakdown() if include_timings else None
+            self._finish(item, results, started, answer, route, path, status=status, error=error, timings=timings)
@@ -0,0 +1,117 @@
+# benchmarks/context_packing_benchmark.py
+"""
+Compare full "stuff" prompts against packed prompts (overlap merge + MMR + token
+budget) on the real agents: prompt tokens, generation latency and how similar
+the two answers are (cosine of their mpnet embeddings).
+
+Needs the persisted indexes and the gemini_api key, like the app itself:
+
+    python -m benchmarks.context_packing_benchmark --budget 800 --out benchmarks/results/context_packing.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+import numpy as np
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.food_security_agent import FoodSecurityAgent
+from agents.clinical_agent import ClinicalAgent
+from agents.context_packing import CONTEXT_TOKEN_BUDGET, pack_context, estimate_tokens
+from embedding_service import get_embedding_service
+
+DEFAULT_QUESTIONS = {
+    "food": [
+        "What is the prevalence of undernourishment worldwide?",
+        "How many people could not afford a healthy diet?",
+        "Which regions saw hunger increase the most?",
+        "What are the main drivers of food insecurity in the report?",
+        "How has child stunting changed over the last decade?",
+    ],
+    "clinical": [
+        "Which trials study drug interventions for type 2 diabetes?",
+        "What behavioral interventions are being tested for obesity?",
+        "Summarise the device trials for heart failure.",
+        "Which studies investigate dietary supplements?",
+        "What conditions are covered by the biological intervention trials?",
+    ],
+}
+
+
+def _generate(agent, question, docs):
+    start = time.perf_counter()
+    result = agent.qa_chain.combine_documents_chain.invoke({"input_documents": docs, "question": question})
+    return result.get("output_text", ""), time.perf_counter() - start
+
+
+def _cosine(a, b):
+    a, b = np.asarray(a), np.asarray(b)
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=int, default=CONTEXT_TOKEN_BUDGET, help="context token budget for the packed prompt")
+    parser.add_argument("--k", type=int, default=8, help="documents retrieved per question")
+    parser.add_argument("--questions", help="JSON file of {agent: [questions]} (defaults to a built-in set)")
+    parser.add_argument("--out", default="benchmarks/results/context_packing.json")
+    args = parser.parse_args()
+
+    load_dotenv()
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions) as f:
+            questions = json.load(f)
+
+    agents = {"food": FoodSecurityAgent("un_food_index"), "clinical": ClinicalAgent("clinical_index")}
+    embedder = get_embedding_service()
+    rows = []
+    for name, agent_questions in questions.items():
+        agent = agents[name]
+        for question in agent_questions:
+            docs = agent.vectorstore.similarity_search(question, k=args.k)
+            packed, counts = pack_context(question, docs, token_budget=args.budget, enabled=True)
+            full_answer, full_s = _generate(agent, question, docs)
+            packed_answer, packed_s = _generate(agent, question, packed)
+            full_vec, packed_vec = embedder.embed_documents([full_answer, packed_answer])
+            rows.append({
+                "agent": name,
+                "question": question,
+                "docs_full": len(docs),
+                "docs_packed": len(packed),
+                "tokens_full": sum(estimate_tokens(d.page_content) for d in docs),
+                "tokens_packed": counts["tokens_after"],
+                "latency_full_s": round(full_s, 3),
+                "latency_packed_s": round(packed_s, 3),
+                "answer_similarity": round(_cosine(full_vec, packed_vec), 4),
+            })
+            print(f"[{name}] {question[:50]:50s} tokens {rows[-1]['tokens_full']:5d} -> {rows[-1]['tokens_packed']:5d} "
+                  f"sim {rows[-1]['answer_similarity']:.3f}")
+
+    summary = {
+        "budget": args.budget,
+        "k": args.k,
+        "questions": len(rows),
+        "mean_tokens_full": statistics.mean(r["tokens_full"] for r in rows),
+        "mean_tokens_packed": statistics.mean(r["tokens_packed"] for r in rows),
+        "mean_latency_full_s": statistics.mean(r["latency_full_s"] for r in rows),
+        "mean_latency_packed_s": statistics.mean(r["latency_packed_s"] for r in rows),
+        "mean_answer_similarity": statistics.mean(r["answer_similarity"] for r in rows),
+        "min_answer_similarity": min(r["answer_similarity"] for r in rows),
+    }
+    print(json.dumps(summary, indent=2))
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"summary": summary, "rows": rows}, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# benchmarks/e2e_benchmark.py
+"""
+Offline end-to-end benchmark of POST /chat. Gemini is replaced by a fake chat model
+with configurable latency and mpnet by a deterministic hash embedder
+(benchmarks/fakes.py). Synthetic indexes are built in a temp directory and the
+FastAPI app is driven in-process over ASGI at several concurrency levels.
+
+Reports p50/p95/p99 latency and requests/s overall and per route, and writes JSON
+that can be compared against an earlier run:
+
+    python -m benchmarks.e2e_benchmark --concurrency 1 8 32 --requests 200 --out benchmarks/results/e2e.json
+    python -m benchmarks.e2e_benchmark --compare benchmarks/results/e2e.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import install_fakes, build_offline_indexes, synthetic_questions
+
+
+def latency_summary(latencies_s: List[float]) -> Dict[str, float]:
+    values = np.asarray(latencies_s) * 1000.0
+    if not len(values):
+        return {}
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "mean_ms": round(float(values.mean()), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run_level(client, questions: List[str], concurrency: int) -> Dict[str, Any]:
+    """Send every question with at most `concurrency` in flight; collect latency per route."""
+    pending = iter(questions)
+    results = []
+
+    async def worker():
+        for question in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/chat", json={"question": question, "include_timings": True})
+                ok = response.status_code == 200
+                body = response.json() if ok else {}
+            except Exception as e:
+                print(f"Request failed: {e}")
+                ok, body = False, {}
+            elapsed = time.perf_counter() - start
+            route = (body.get("timings") or {}).get("route", "error" if not ok else "unknown")
+            results.append((route, elapsed, ok, body.get("degradation", "none")))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    by_route: Dict[str, List[float]] = defaultdict(list)
+    for route, elapsed, ok, _ in results:
+        by_route[route].append(elapsed)
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": sum(1 for _, _, ok, _ in results if not ok),
+        "degraded": sum(1 for *_, degradation in results if degradation != "none"),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 2) if wall else None,
+        "latency": latency_summary([elapsed for _, elapsed, _, _ in results]),
+        "by_route": {
+            route: {"requests": len(values), "throughput_rps": round(len(values) / wall, 2), **latency_summary(values)}
+            for route, values in sorted(by_route.items())
+        },
+    }
+
+
+def compare(current: Dict[str, Any], baseline_path: str) -> None:
+    """Print p50/p95/p99 and req/s changes per concurrency level against a saved run."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit', '?')}):")
+    for level in current["levels"]:
+        old = previous.get(level["concurrency"])
+        if old is None:
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            before, after = old["latency"].get(key), level["latency"].get(key)
+            if before:
+                deltas.append(f"{key} {before:.0f}->{after:.0f} ({(after - before) / before:+.0%})")
+        before, after = old.get("throughput_rps"), level.get("throughput_rps")
+        if before:
+            deltas.append(f"req/s {before:.1f}->{after:.1f} ({(after - before) / before:+.0%})")
+        print(f"  c={level['concurrency']:<4d} " + ", ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="fake Gemini latency per call")
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0, help="extra uniform random latency per call")
+    parser.add_argument("--backend", choices=["chroma", "mmap"], default="chroma")
+    parser.add_argument("--repeat-questions", action="store_true",
+                        help="reuse questions across requests (exercises the answer cache and coalescing)")
+    parser.add_argument("--cache", action="store_true", help="keep the semantic answer cache enabled")
+    parser.add_argument("--out", default="benchmarks/results/e2e.json")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    args = parser.parse_args()
+
+    try:
+        import httpx
+    except ImportError:
+        sys.exit("This benchmark needs httpx (pip install httpx) to drive the app over ASGI.")
+
+    if not args.cache:
+        os.environ["SEMANTIC_CACHE_ENABLED"] = "0"
+    install_fakes(args.llm_latency_ms / 1000.0, args.llm_jitter_ms / 1000.0)
+
+    with tempfile.TemporaryDirectory(prefix="e2e-bench-") as root:
+        food_dir, clinical_dir = build_offline_indexes(root, backend=args.backend)
+        os.environ["UN_VECTORSTORE_DIR"] = food_dir
+        os.environ["CLINICAL_VECTORSTORE_DIR"] = clinical_dir
+        import main as app_module  # builds the orchestrator on the synthetic indexes
+
+        async def run_all():
+            transport = httpx.ASGITransport(app=app_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                # One warm-up request so lazy model/BM25 loading is not timed
+                await client.post("/chat", json={"question": "warm-up question about hunger"})
+                levels = []
+                for concurrency in args.concurrency:
+                    questions = synthetic_questions(args.requests, seed=concurrency,
+                                                    unique=not args.repeat_questions)
+                    level = await run_level(client, questions, concurrency)
+                    levels.append(level)
+                    lat = level["latency"]
+                    print(f"c={concurrency:<4d} {level['throughput_rps']:8.2f} req/s  p50 {lat['p50_ms']:8.1f} ms  "
+                          f"p95 {lat['p95_ms']:8.1f} ms  p99 {lat['p99_ms']:8.1f} ms  errors {level['errors']}")
+                    for route, stats in level["by_route"].items():
+                        print(f"    {route:16s} n={stats['requests']:<5d} p50 {stats['p50_ms']:8.1f} ms  "
+                              f"p95 {stats['p95_ms']:8.1f} ms  p99 {stats['p99_ms']:8.1f} ms")
+                return levels
+
+        levels = asyncio.run(run_all())
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "requests_per_level": args.requests,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter_ms": args.llm_jitter_ms,
+            "backend": args.backend,
+            "repeat_questions": args.repeat_questions,
+            "answer_cache": args.cache,
+        },
+        "levels": levels,
+    }
+    if args.compare:
+        compare(results, args.compare)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
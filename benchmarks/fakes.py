@@ -0,0 +1,259 @@
+# benchmarks/fakes.py
+"""
+Offline stand-ins for the benchmarks: a fake Gemini chat model with configurable
+latency, a cheap deterministic embedder in place of the mpnet HuggingFaceEmbeddings,
+and a synthetic food/clinical corpus to build indexes from. install_fakes() must run
+before main/orchestrator build any agent.
+"""
+
+import os
+import re
+import time
+import random
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+EMBEDDING_DIM = 768
+_WORD_RE = re.compile(r"\w+")
+
+FOOD_WORDS = ("hunger", "undernourishment", "stunting", "wasting", "food", "diet", "harvest", "famine", "crop",
+              "agricultural", "insecurity", "nutrition", "prices", "aid")
+CLINICAL_WORDS = ("trial", "trials", "study", "studies", "nct", "drug", "device", "recruiting", "intervention",
+                  "patients", "diabetes", "cancer", "hypertension", "vaccine")
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embedder: each token is hashed to a few signed
+    dimensions. Texts sharing words land close together, which is enough for
+    routing and retrieval to behave plausibly at a fraction of mpnet's cost.
+    """
+
+    def __init__(self, model_name: str = "hash", dim: int = EMBEDDING_DIM, **_kwargs):
+        self.model_name = model_name
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in _WORD_RE.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=12).digest()
+            for i in range(0, 12, 4):
+                index = int.from_bytes(digest[i:i + 3], "little") % self.dim
+                vector[index] += 1.0 if digest[i + 3] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Gemini stand-in. Sleeps latency_s (+ uniform jitter) per call, or per token
+    when streaming, and answers the classifier prompt with a keyword guess.
+    """
+
+    latency_s: float = 0.2
+    jitter_s: float = 0.0
+    stream_tokens: int = 20
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    def _delay(self) -> float:
+        return self.latency_s + (random.uniform(0, self.jitter_s) if self.jitter_s else 0.0)
+
+    @staticmethod
+    def _keyword_category(question: str) -> str:
+        if any(word in question for word in CLINICAL_WORDS):
+            return "clinical"
+        if any(word in question for word in FOOD_WORDS):
+            return "food"
+        return "web"
+
+    @staticmethod
+    def _respond(messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        if "Respond with only the single category word" in prompt:
+            return FakeChatModel._keyword_category(prompt.rsplit("User Question:", 1)[-1].lower())
+        if "one line per question" in prompt:
+            # Batched classifier (batch_chat.py): one '<n>: <category>' line per listed question
+            questions = re.findall(r'^(\d+)\. "(.*)"$', prompt, re.MULTILINE)
+            return "\n".join(f"{n}: {FakeChatModel._keyword_category(question.lower())}" for n, question in questions)
+        if "Thought:" in prompt or "Action:" in prompt:
+            return "Final Answer: This is a fake web answer."
+        return f"Fake answer grounded in {len(prompt)} characters of prompt."
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        words = self._respond(messages).split(" ")
+        per_token = self._delay() / max(len(words), 1)
+        for i, word in enumerate(words):
+            time.sleep(per_token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        words = self._respond(messages).split(" ")
+        per_token = self._delay() / max(len(words), 1)
+        for i, word in enumerate(words):
+            await asyncio.sleep(per_token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+
+def fake_chat_model_factory(latency_s: float, jitter_s: float = 0.0):
+    """Drop-in for the ChatGoogleGenerativeAI constructor (its kwargs are ignored)."""
+    def factory(**_kwargs):
+        return FakeChatModel(latency_s=latency_s, jitter_s=jitter_s)
+    return factory
+
+
+def install_fakes(llm_latency_s: float = 0.2, llm_jitter_s: float = 0.0) -> None:
+    """
+    Replace ChatGoogleGenerativeAI and HuggingFaceEmbeddings everywhere the app
+    imported them. Call before importing main (which builds the orchestrator).
+    """
+    os.environ.setdefault("gemini_api", "offline-benchmark")
+    import embedding_service
+    import orchestrator
+    import agents.food_security_agent
+    import agents.clinical_agent
+    import agents.web_agent
+
+    embedding_service.HuggingFaceEmbeddings = HashEmbeddings
+    factory = fake_chat_model_factory(llm_latency_s, llm_jitter_s)
+    for module in (orchestrator, agents.food_security_agent, agents.clinical_agent, agents.web_agent):
+        if hasattr(module, "ChatGoogleGenerativeAI"):
+            module.ChatGoogleGenerativeAI = factory
+
+
+# --- Synthetic corpus ---------------------------------------------------------------
+
+REGIONS = ["Sub-Saharan Africa", "Southern Asia", "Latin America", "the Caribbean", "Western Asia",
+           "Eastern Africa", "Oceania", "Central Asia", "Northern Africa", "South-eastern Asia"]
+INDICATORS = ["prevalence of undernourishment", "child stunting", "child wasting", "severe food insecurity",
+              "the cost of a healthy diet", "anaemia in women", "low birthweight", "adult obesity"]
+CONDITIONS = ["Type 2 Diabetes", "Breast Cancer", "Hypertension", "Asthma", "Alzheimer Disease", "Obesity",
+              "Depression", "Heart Failure", "HIV Infections", "Malnutrition"]
+INTERVENTIONS = ["DRUG:Metformin", "DRUG:Placebo", "DEVICE:Glucose Monitor", "BEHAVIORAL:Diet Counselling",
+                 "BIOLOGICAL:Vaccine", "DIETARY_SUPPLEMENT:Vitamin D", "PROCEDURE:Surgery", "OTHER:Education"]
+STATUSES = ["RECRUITING", "COMPLETED", "ACTIVE_NOT_RECRUITING", "TERMINATED", "WITHDRAWN", "NOT_YET_RECRUITING"]
+
+
+def synthetic_food_documents(n: int = 400, seed: int = 7) -> List[Tuple[str, Dict[str, Any]]]:
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n):
+        region, indicator = rng.choice(REGIONS), rng.choice(INDICATORS)
+        year = rng.randint(2005, 2023)
+        value = round(rng.uniform(2, 45), 1)
+        other = rng.choice(REGIONS)
+        text = (f"In {year}, {indicator} in {region} was estimated at {value} percent, "
+                f"compared with {round(value * rng.uniform(0.6, 1.4), 1)} percent in {other}. "
+                f"Conflict, climate extremes and economic slowdowns remain the main drivers of food insecurity, "
+                f"and food prices rose by {rng.randint(2, 30)} percent over the period.")
+        docs.append((text, {"source": "un_food_security", "page": i // 4}))
+    return docs
+
+
+def synthetic_trial_rows(n: int = 600, seed: int = 11) -> List[Dict[str, str]]:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        nct = f"NCT{10000000 + i * 7919 % 90000000:08d}"
+        condition = rng.choice(CONDITIONS)
+        interventions = " ".join(sorted(set(rng.sample(INTERVENTIONS, rng.randint(1, 2)))))
+        rows.append({
+            "nct": nct,
+            "title": f"A Study of {interventions.split(':')[1].split()[0]} in {condition} (Phase {rng.randint(1, 4)})",
+            "url": f"https://clinicaltrials.gov/study/{nct}",
+            "status": rng.choice(STATUSES),
+            "conditions": condition,
+            "interventions": interventions,
+            "other": f"Enrollment {rng.randint(20, 2000)}",
+        })
+    return rows
+
+
+def trial_row_text(row: Dict[str, str]) -> str:
+    """Same document layout ingest_data.py produces for a clinical row."""
+    return (
+        f"NCT Number: {row['nct']}\n"
+        f"Study Title: {row['title']}\n"
+        f"Study URL: {row['url']}\n"
+        f"Study Status: {row['status']}\n"
+        f"Conditions: {row['conditions']}\n"
+        f"Interventions: {row['interventions']}\n"
+        f"Other Info: {row['other']}"
+    )
+
+
+def build_offline_indexes(root: str, backend: str = "chroma", food_docs: int = 400,
+                          trial_rows: int = 600) -> Tuple[str, str]:
+    """
+    Write a synthetic food index and clinical index (plus trials table) under root
+    with the installed embedder. backend is "chroma" or "mmap". Returns both directories.
+    """
+    from clinical_table import TrialTable, trials_table_path
+    from embedding_service import get_embedding_service
+
+    embeddings = get_embedding_service()
+    rows = synthetic_trial_rows(trial_rows)
+    corpora = {
+        "un_food_index": synthetic_food_documents(food_docs),
+        "clinical_index": [(trial_row_text(row), {"source": "clinical_study_pdf"}) for row in rows],
+    }
+    dirs = {}
+    for name, docs in corpora.items():
+        out_dir = os.path.join(root, name)
+        texts = [text for text, _ in docs]
+        metadatas = [metadata for _, metadata in docs]
+        if backend == "mmap":
+            from agents.mmap_vectorstore import write_mmap_index
+            ids = [f"{name}-{i}" for i in range(len(texts))]
+            write_mmap_index(out_dir, ids, texts, metadatas, np.asarray(embeddings.embed_documents(texts)))
+        else:
+            from langchain.vectorstores import Chroma
+            Chroma.from_texts(texts, embeddings, metadatas=metadatas, persist_directory=out_dir).persist()
+        dirs[name] = out_dir
+    TrialTable.from_rows(rows).save(trials_table_path(dirs["clinical_index"]))
+    return dirs["un_food_index"], dirs["clinical_index"]
+
+
+def synthetic_questions(n: int, seed: int = 3, unique: bool = True) -> List[str]:
+    """A mix of food, clinical (including exact NCT lookups) and web questions."""
+    rng = random.Random(seed)
+    rows = synthetic_trial_rows()
+    templates = [
+        lambda: f"What was the {rng.choice(INDICATORS)} in {rng.choice(REGIONS)}?",
+        lambda: f"How did food prices affect hunger in {rng.choice(REGIONS)}?",
+        lambda: f"Which trials study {rng.choice(CONDITIONS)} with a drug intervention?",
+        lambda: f"What is the status of study {rng.choice(rows)['nct']}?",
+        lambda: f"How many trials are recruiting for {rng.choice(CONDITIONS)}?",
+        lambda: f"Explain how {rng.choice(['a blockchain', 'a rainbow', 'a jet engine', 'compound interest'])} works.",
+    ]
+    questions = []
+    for i in range(n):
+        question = rng.choice(templates)()
+        questions.append(f"{question[:-1]} (case {i})?" if unique else question)
+    return questions
@@ -0,0 +1,108 @@
+# benchmarks/ingest_embedding_benchmark.py
+"""
+Compare ingestion embedding paths on the chunks already stored in the indexes:
+throughput (chunks/s) and drift (cosine similarity of each chunk's vector to the
+one the original path produced).
+
+  baseline          HuggingFaceEmbeddings.embed_documents over all chunks at once (old ingest)
+  baseline_batched  the same model fed in writer-sized batches (streaming pipeline, no front end)
+  frontend_fp32     IngestEmbedder: hash dedup + length-bucketed batches
+  frontend_int8     IngestEmbedder with the int8-quantized CPU model
+
+    python -m benchmarks.ingest_embedding_benchmark --limit 2000 --out benchmarks/results/ingest_embeddings.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_service import get_embedding_service
+from ingest_embeddings import IngestEmbedder
+from agents.mmap_vectorstore import load_vectorstore
+
+
+def _load_texts(index_dirs, limit):
+    embeddings = get_embedding_service()
+    texts = []
+    for index_dir in index_dirs:
+        store = load_vectorstore(index_dir, embeddings)
+        texts.extend(store.get(include=["documents"])["documents"])
+    return texts[:limit] if limit else texts
+
+
+def _run(embed, texts, batch_size):
+    start = time.perf_counter()
+    vectors = []
+    if batch_size:
+        for i in range(0, len(texts), batch_size):
+            vectors.extend(embed(texts[i:i + batch_size]))
+    else:
+        vectors = embed(texts)
+    elapsed = time.perf_counter() - start
+    return np.asarray(vectors, dtype=np.float32), elapsed
+
+
+def _drift(reference, vectors):
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    cosine = np.sum(reference * vectors, axis=1)
+    return {
+        "mean_cosine": round(float(cosine.mean()), 6),
+        "p1_cosine": round(float(np.percentile(cosine, 1)), 6),
+        "min_cosine": round(float(cosine.min()), 6),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--indexes", nargs="+", default=["un_food_index", "clinical_index"])
+    parser.add_argument("--limit", type=int, default=0, help="only embed the first N chunks (0 = all)")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per writer batch")
+    parser.add_argument("--skip-int8", action="store_true", help="skip the quantized model (no torch quantization)")
+    parser.add_argument("--out", default="benchmarks/results/ingest_embeddings.json")
+    args = parser.parse_args()
+
+    texts = _load_texts(args.indexes, args.limit)
+    print(f"Embedding {len(texts)} chunks ({len(set(texts))} distinct)")
+
+    service = get_embedding_service()
+    runs = {
+        "baseline": (service.embed_documents, 0),
+        "baseline_batched": (service.embed_documents, args.batch_size),
+        "frontend_fp32": (IngestEmbedder(quantize=False).embed_documents, args.batch_size),
+    }
+    if not args.skip_int8:
+        runs["frontend_int8"] = (IngestEmbedder(quantize=True).embed_documents, args.batch_size)
+
+    reference = None
+    results = {}
+    for name, (embed, batch_size) in runs.items():
+        vectors, elapsed = _run(embed, texts, batch_size)
+        if reference is None:
+            reference = vectors
+        results[name] = {
+            "seconds": round(elapsed, 3),
+            "chunks_per_s": round(len(texts) / elapsed, 1) if elapsed else None,
+            **_drift(reference, vectors),
+        }
+        embedder = getattr(embed, "__self__", None)
+        if isinstance(embedder, IngestEmbedder):
+            results[name]["embedder"] = embedder.stats()
+        print(f"{name:17s} {results[name]['chunks_per_s']:8.1f} chunks/s  "
+              f"mean cosine {results[name]['mean_cosine']:.5f}  min {results[name]['min_cosine']:.5f}")
+
+    summary = {"chunks": len(texts), "distinct_chunks": len(set(texts)), "batch_size": args.batch_size, "runs": results}
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
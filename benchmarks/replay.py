@@ -0,0 +1,238 @@
+# benchmarks/replay.py
+"""
+Replay a query log (QUERY_LOG_PATH, see query_log.py) with the original
+inter-arrival times, or compressed by --speedup, and compare the replayed latency
+distribution with the recorded one, overall, per route and per stage.
+
+Requests are dispatched open-loop on the recorded schedule, so a slow server
+builds up a queue just as it did in production instead of slowing the replay down.
+Targets:
+  app           the FastAPI app in-process over ASGI (needs httpx)
+  orchestrator  Orchestrator.arun in-process, without the HTTP layer
+  url           a running server, e.g. --url http://localhost:8000 (needs httpx)
+
+    python -m benchmarks.replay logs/queries.jsonl --target app --speedup 4 --out benchmarks/results/replay.json
+    python -m benchmarks.replay logs/queries.jsonl --target orchestrator --fakes --llm-latency-ms 300
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_log import read_query_log
+from benchmarks.e2e_benchmark import latency_summary, git_commit
+
+
+def load_entries(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Replayable entries sorted by arrival time; hash-only entries carry no question to send."""
+    entries = [entry for entry in read_query_log(path) if entry.get("question") and "ts" in entry]
+    entries.sort(key=lambda entry: entry["ts"])
+    return entries[:limit] if limit else entries
+
+
+def summarise(latencies_ms: List[float], routes: List[str], stages: List[Dict[str, float]]) -> Dict[str, Any]:
+    by_route: Dict[str, List[float]] = defaultdict(list)
+    for route, latency in zip(routes, latencies_ms):
+        by_route[route].append(latency)
+    by_stage: Dict[str, List[float]] = defaultdict(list)
+    for stage_ms in stages:
+        for name, ms in stage_ms.items():
+            by_stage[name].append(ms)
+    # latency_summary takes seconds
+    return {
+        "requests": len(latencies_ms),
+        "latency": latency_summary([ms / 1000.0 for ms in latencies_ms]),
+        "by_route": {route: {"requests": len(values), **latency_summary([ms / 1000.0 for ms in values])}
+                     for route, values in sorted(by_route.items())},
+        "by_stage": {name: latency_summary([ms / 1000.0 for ms in values]) for name, values in sorted(by_stage.items())},
+    }
+
+
+def recorded_summary(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return summarise([entry["latency_ms"] for entry in entries],
+                     [entry.get("route", "unknown") for entry in entries],
+                     [entry.get("stages_ms") or {} for entry in entries])
+
+
+def http_sender(client, deadline_seconds: Optional[float]):
+    async def send(question: str):
+        payload = {"question": question, "include_timings": True}
+        if deadline_seconds is not None:
+            payload["deadline_seconds"] = deadline_seconds
+        response = await client.post("/chat", json=payload)
+        response.raise_for_status()
+        timings = response.json().get("timings") or {}
+        return timings.get("route", "unknown"), timings.get("stages_ms", {})
+    return send
+
+
+def orchestrator_sender(orchestrator, deadline_seconds: Optional[float]):
+    import telemetry
+    import deadline
+
+    async def send(question: str):
+        with telemetry.trace() as request_trace, deadline.scope(deadline_seconds):
+            await orchestrator.arun(question)
+        breakdown = request_trace.breakdown()
+        return breakdown["route"], breakdown["stages_ms"]
+    return send
+
+
+async def replay(entries: List[Dict[str, Any]], send, speedup: float) -> Dict[str, Any]:
+    """Fire each entry at its recorded offset / speedup and time it until the answer is back."""
+    results: List[Optional[tuple]] = [None] * len(entries)
+    lags: List[float] = []
+    origin = entries[0]["ts"]
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+
+    async def one(i: int, question: str):
+        start = time.perf_counter()
+        try:
+            route, stages_ms = await send(question)
+            ok = True
+        except Exception as e:
+            print(f"Replay request {i} failed: {e}")
+            route, stages_ms, ok = "error", {}, False
+        results[i] = ((time.perf_counter() - start) * 1000.0, route, stages_ms, ok)
+
+    tasks = []
+    for i, entry in enumerate(entries):
+        due = t0 + (entry["ts"] - origin) / speedup
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lags.append(max(0.0, loop.time() - due))
+        tasks.append(asyncio.ensure_future(one(i, entry["question"])))
+    await asyncio.gather(*tasks)
+    wall = loop.time() - t0
+
+    done = [result for result in results if result is not None]
+    ok = [result for result in done if result[3]]
+    summary = summarise([r[0] for r in ok], [r[1] for r in ok], [r[2] for r in ok])
+    summary.update({
+        "errors": len(done) - len(ok),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(done) / wall, 2) if wall else None,
+        # How late requests left relative to the schedule; large values mean the replayer itself fell behind
+        "dispatch_lag_ms": latency_summary(lags),
+    })
+    return summary
+
+
+def diff(recorded: Dict[str, Any], replayed: Dict[str, Any]) -> Dict[str, Any]:
+    """Replayed minus recorded percentiles, with the relative change."""
+    def delta(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, Any]:
+        out = {}
+        for key in ("p50_ms", "p95_ms", "p99_ms", "mean_ms"):
+            if before.get(key) and key in after:
+                out[key] = {"recorded": before[key], "replayed": after[key],
+                            "change": round((after[key] - before[key]) / before[key], 4)}
+        return out
+
+    return {
+        "latency": delta(recorded["latency"], replayed["latency"]),
+        "by_route": {route: delta(recorded["by_route"][route], stats)
+                     for route, stats in replayed["by_route"].items() if route in recorded["by_route"]},
+        "by_stage": {name: delta(recorded["by_stage"][name], stats)
+                     for name, stats in replayed["by_stage"].items() if name in recorded["by_stage"]},
+    }
+
+
+def print_diff(comparison: Dict[str, Any]) -> None:
+    def line(label: str, stats: Dict[str, Any]) -> str:
+        parts = [f"{key} {v['recorded']:.0f}->{v['replayed']:.0f} ({v['change']:+.0%})" for key, v in stats.items()
+                 if key != "mean_ms"]
+        return f"  {label:24s} " + ", ".join(parts)
+
+    print("\nReplayed vs recorded:")
+    print(line("all", comparison["latency"]))
+    for route, stats in comparison["by_route"].items():
+        print(line(f"route {route}", stats))
+    for name, stats in comparison["by_stage"].items():
+        print(line(f"stage {name}", stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="query log written with QUERY_LOG_PATH")
+    parser.add_argument("--target", choices=["app", "orchestrator", "url"], default="app")
+    parser.add_argument("--url", help="base URL of a running server (--target url)")
+    parser.add_argument("--speedup", type=float, default=1.0, help="divide recorded inter-arrival gaps by this")
+    parser.add_argument("--limit", type=int, help="replay only the first N entries")
+    parser.add_argument("--deadline-seconds", type=float, help="deadline_seconds sent with every request")
+    parser.add_argument("--fakes", action="store_true",
+                        help="in-process targets only: fake Gemini and embedder on synthetic indexes")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="fake Gemini latency per call")
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--out", default="benchmarks/results/replay.json")
+    args = parser.parse_args()
+
+    if args.speedup <= 0:
+        sys.exit("--speedup must be positive.")
+    if args.target == "url" and not args.url:
+        sys.exit("--target url needs --url.")
+    entries = load_entries(args.log, args.limit)
+    if not entries:
+        sys.exit(f"No replayable entries in {args.log} (was it written with QUERY_LOG_MODE=hash?).")
+    span_s = entries[-1]["ts"] - entries[0]["ts"]
+    print(f"Replaying {len(entries)} requests recorded over {span_s:.1f}s in ~{span_s / args.speedup:.1f}s "
+          f"against {args.target}")
+
+    with tempfile.TemporaryDirectory(prefix="replay-") as root:
+        if args.fakes and args.target != "url":
+            from benchmarks.fakes import install_fakes, build_offline_indexes
+            install_fakes(args.llm_latency_ms / 1000.0, args.llm_jitter_ms / 1000.0)
+            os.environ["UN_VECTORSTORE_DIR"], os.environ["CLINICAL_VECTORSTORE_DIR"] = build_offline_indexes(root)
+
+        async def run():
+            if args.target == "orchestrator":
+                from main import orchestrator
+                return await replay(entries, orchestrator_sender(orchestrator, args.deadline_seconds), args.speedup)
+            try:
+                import httpx
+            except ImportError:
+                sys.exit("--target app/url needs httpx (pip install httpx).")
+            if args.target == "app":
+                from main import app
+                client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://replay", timeout=None)
+            else:
+                client = httpx.AsyncClient(base_url=args.url, timeout=None)
+            async with client:
+                return await replay(entries, http_sender(client, args.deadline_seconds), args.speedup)
+
+        replayed = asyncio.run(run())
+
+    recorded = recorded_summary(entries)
+    comparison = diff(recorded, replayed)
+    lat = replayed["latency"]
+    print(f"replayed: {replayed['throughput_rps']} req/s  p50 {lat.get('p50_ms')} ms  p95 {lat.get('p95_ms')} ms  "
+          f"p99 {lat.get('p99_ms')} ms  errors {replayed['errors']}  "
+          f"dispatch lag p95 {replayed['dispatch_lag_ms'].get('p95_ms')} ms")
+    print_diff(comparison)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"log": args.log, "target": args.target, "speedup": args.speedup, "requests": len(entries),
+                   "fakes": args.fakes, "deadline_seconds": args.deadline_seconds},
+        "recorded": recorded,
+        "replayed": replayed,
+        "comparison": comparison,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+# benchmarks/retrieval_benchmark.py
+"""
+Retrieval benchmark: for each chunking configuration, backend and retrieval mode,
+measure index build time, on-disk size and memory growth, query latency,
+recall@k against an exact brute-force search, and hit@k on a labelled query set.
+
+Chunks come from the ingest_data.py splitters, applied to the real PDFs
+(--source pdf) or to the synthetic corpus in benchmarks/fakes.py (--source synthetic).
+Labelled queries are generated: exact NCT-id lookups and trial titles whose row is
+known, plus known-item food queries taken from a sentence of a page. A JSON file
+of {"query": ..., "relevant": "<substring of the right chunk>"} can be added with --queries.
+
+    python -m benchmarks.retrieval_benchmark --source synthetic --embedder hash --out benchmarks/results/retrieval.json
+    python -m benchmarks.retrieval_benchmark --source pdf --embedder mpnet --chunking 1000:200 500:100
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import HashEmbeddings, synthetic_food_documents, synthetic_trial_rows, trial_row_text
+
+# (name, backend, mode, options); recall@k is measured against the exact search for the backend's metric
+CONFIGS = [
+    ("chroma-vector", "chroma", "vector", {}),
+    ("chroma-hybrid", "chroma", "hybrid", {}),
+    ("mmap-f16-vector", "mmap", "vector", {"dtype": "float16"}),
+    ("mmap-int8-vector", "mmap", "vector", {"dtype": "int8"}),
+    ("mmap-int8-ivf-vector", "mmap", "vector", {"dtype": "int8", "ivf": True}),
+    ("mmap-f16-hybrid", "mmap", "hybrid", {"dtype": "float16"}),
+]
+
+
+class PrecomputedEmbeddings:
+    """Serves document vectors computed once up front, so build times exclude the model."""
+
+    def __init__(self, model, vectors_by_text: Dict[str, List[float]]):
+        self.model = model
+        self.vectors_by_text = vectors_by_text
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors_by_text[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.embed_query(text)
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / 1e6
+
+
+def _dir_mb(path: str) -> float:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    sidecar = os.path.normpath(path) + ".bm25.json"
+    if os.path.exists(sidecar):
+        total += os.path.getsize(sidecar)
+    return total / 1e6
+
+
+# --- Corpus and labelled queries ------------------------------------------------------
+
+def load_pages(source: str) -> Tuple[List[Tuple[int, str]], List[Dict[str, str]]]:
+    """UN pages as (page_idx, text) and clinical rows, from the PDFs or the synthetic corpus."""
+    if source == "pdf":
+        from ingest_data import iter_pages, parse_clinical_line
+        food_pages = [(i, text) for i, text in iter_pages("data/un_food_security.pdf") if text]
+        rows = []
+        for _, text in iter_pages("data/clinical_studies.pdf"):
+            for line in (text or "").split("\n"):
+                try:
+                    parsed = parse_clinical_line(line)
+                except Exception:
+                    continue
+                if parsed is not None:
+                    rows.append(parsed[1])
+        return food_pages, rows
+    by_page: Dict[int, List[str]] = {}
+    for text, metadata in synthetic_food_documents():
+        by_page.setdefault(metadata["page"], []).append(text)
+    return [(page, "\n\n".join(texts)) for page, texts in sorted(by_page.items())], synthetic_trial_rows()
+
+
+def chunk_corpus(food_pages, rows, chunk_size: int, chunk_overlap: int) -> List[Tuple[str, str]]:
+    """(chunk_id, text) for both corpora, using the same splitters as ingest_data.py."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain.docstore.document import Document
+
+    food_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    # Clinical rows keep ingest_data.py's own 1000/100 splitter; they are rarely long enough to split
+    clinical_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    chunks = []
+    seen: Dict[str, int] = {}
+    for page_idx, text in food_pages:
+        for n, chunk in enumerate(food_splitter.split_documents([Document(page_content=text)])):
+            chunks.append((f"page:{page_idx}:{n}", chunk.page_content))
+    for row in rows:
+        # Repeated NCT numbers get a suffix, as in ingest_data.py, so chunk ids stay unique
+        seen[row["nct"]] = seen.get(row["nct"], 0) + 1
+        key = row["nct"] if seen[row["nct"]] == 1 else f"{row['nct']}#{seen[row['nct']]}"
+        for n, chunk in enumerate(clinical_splitter.split_documents([Document(page_content=trial_row_text(row))])):
+            chunks.append((f"{key}:{n}", chunk.page_content))
+    return chunks
+
+
+def labelled_queries(food_pages, rows, n: int, seed: int = 5) -> List[Dict[str, str]]:
+    """Queries with a substring that only the right chunk(s) contain."""
+    rng = random.Random(seed)
+    queries = []
+    for row in rng.sample(rows, min(len(rows), n // 2)):
+        queries.append({"kind": "nct", "query": f"What is the status of study {row['nct']}?", "relevant": row["nct"]})
+    for row in rng.sample(rows, min(len(rows), n // 4)):
+        queries.append({"kind": "title", "query": row["title"], "relevant": row["nct"]})
+    for _, text in rng.sample(food_pages, min(len(food_pages), n - len(queries))):
+        sentences = [s.strip() for s in text.replace("\n", " ").split(". ") if len(s.strip()) > 60]
+        if sentences:
+            sentence = rng.choice(sentences)
+            queries.append({"kind": "food", "query": sentence, "relevant": sentence[:60]})
+    return queries
+
+
+# --- Backends -----------------------------------------------------------------------------
+
+def build_store(backend: str, options: Dict[str, Any], out_dir: str, chunks, vectors: np.ndarray, embeddings):
+    if backend == "mmap":
+        from agents.mmap_vectorstore import write_mmap_index, MmapVectorStore
+        ivf_lists = int(np.sqrt(len(chunks))) if options.get("ivf") else 0
+        write_mmap_index(out_dir, [cid for cid, _ in chunks], [text for _, text in chunks],
+                         [{"chunk_id": cid} for cid, _ in chunks], vectors,
+                         dtype=options.get("dtype", "float16"), ivf_lists=ivf_lists)
+        return MmapVectorStore(out_dir, embeddings)
+    from langchain_community.vectorstores import Chroma
+    store = Chroma(persist_directory=out_dir, embedding_function=embeddings)
+    for start in range(0, len(chunks), 512):
+        batch = chunks[start:start + 512]
+        store.add_texts([text for _, text in batch], metadatas=[{"chunk_id": cid} for cid, _ in batch],
+                        ids=[cid for cid, _ in batch])
+    return store
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int, metric: str) -> List[int]:
+    if metric == "cosine":
+        scores = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)) @ (query / np.linalg.norm(query))
+    else:  # Chroma's default l2 space; smaller distance is better
+        scores = -np.sum((vectors - query) ** 2, axis=1)
+    return list(np.argsort(-scores)[:k])
+
+
+def evaluate(name, backend, mode, options, chunks, vectors, embeddings, queries, ks, root) -> Dict[str, Any]:
+    from agents.hybrid_retriever import build_retriever
+
+    out_dir = os.path.join(root, name)
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    store = build_store(backend, options, out_dir, chunks, vectors, embeddings)
+    retriever = build_retriever(store, out_dir, k=max(ks), mode=mode, rerank=False)
+    build_s = time.perf_counter() - start
+    rss_after = _rss_mb()
+
+    id_by_text = {}
+    for idx, (_, text) in enumerate(chunks):
+        id_by_text.setdefault(text, idx)
+    texts = [text for _, text in chunks]
+    metric = "cosine" if backend == "mmap" else "l2"
+
+    latencies, recall, hits = [], {k: [] for k in ks}, {k: [] for k in ks}
+    for item in queries:
+        query_vector = np.asarray(embeddings.embed_query(item["query"]), dtype=np.float32)
+        start = time.perf_counter()
+        docs = retriever.invoke(item["query"])
+        latencies.append(time.perf_counter() - start)
+        found = [id_by_text.get(doc.page_content, -1) for doc in docs]
+        truth = exact_top_k(vectors, query_vector, max(ks), metric)
+        for k in ks:
+            recall[k].append(len(set(found[:k]) & set(truth[:k])) / k)
+            hits[k].append(any(item["relevant"] in texts[i] for i in found[:k] if i >= 0))
+
+    lat_ms = np.asarray(latencies) * 1000.0
+    result = {
+        "config": name,
+        "backend": backend,
+        "mode": mode,
+        "options": options,
+        "build_s": round(build_s, 3),
+        "disk_mb": round(_dir_mb(out_dir), 2),
+        "rss_delta_mb": round(rss_after - rss_before, 1) if rss_before is not None else None,
+        "latency_p50_ms": round(float(np.percentile(lat_ms, 50)), 3),
+        "latency_p95_ms": round(float(np.percentile(lat_ms, 95)), 3),
+        # Overlap with exact search over the same vectors; for hybrid, how much BM25 fusion reorders it
+        "recall_at_k": {str(k): round(float(np.mean(recall[k])), 4) for k in ks},
+        "hit_at_k": {str(k): round(float(np.mean(hits[k])), 4) for k in ks},
+        "hit_at_k_by_kind": {
+            kind: {str(k): round(float(np.mean([h for h, q in zip(hits[k], queries) if q["kind"] == kind])), 4)
+                   for k in ks}
+            for kind in sorted({q["kind"] for q in queries})
+        },
+    }
+    shutil.rmtree(out_dir, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=["synthetic", "pdf"], default="synthetic")
+    parser.add_argument("--embedder", choices=["hash", "mpnet"], default="hash")
+    parser.add_argument("--chunking", nargs="+", default=["1000:200", "500:100", "1500:300"],
+                        help="UN splitter chunk_size:chunk_overlap settings to compare")
+    parser.add_argument("--configs", nargs="+", default=[name for name, *_ in CONFIGS],
+                        help="subset of: " + ", ".join(name for name, *_ in CONFIGS))
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--queries", type=int, default=200, help="generated labelled queries")
+    parser.add_argument("--query-file", help="extra JSON list of {query, relevant} items")
+    parser.add_argument("--out", default="benchmarks/results/retrieval.json")
+    args = parser.parse_args()
+
+    if args.embedder == "hash":
+        model = HashEmbeddings()
+    else:
+        from embedding_service import get_embedding_service
+        model = get_embedding_service()
+
+    food_pages, rows = load_pages(args.source)
+    queries = labelled_queries(food_pages, rows, args.queries)
+    if args.query_file:
+        with open(args.query_file) as f:
+            queries += [{"kind": "custom", **item} for item in json.load(f)]
+    print(f"{len(food_pages)} UN pages, {len(rows)} trial rows, {len(queries)} labelled queries")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="retrieval-bench-") as root:
+        for chunking in args.chunking:
+            chunk_size, chunk_overlap = (int(v) for v in chunking.split(":"))
+            chunks = chunk_corpus(food_pages, rows, chunk_size, chunk_overlap)
+            start = time.perf_counter()
+            vectors = np.asarray(model.embed_documents([text for _, text in chunks]), dtype=np.float32)
+            embed_s = time.perf_counter() - start
+            embeddings = PrecomputedEmbeddings(model, {text: vec for (_, text), vec in zip(chunks, vectors.tolist())})
+            print(f"\nchunking {chunking}: {len(chunks)} chunks embedded in {embed_s:.1f}s")
+            for name, backend, mode, options in CONFIGS:
+                if name not in args.configs:
+                    continue
+                try:
+                    result = evaluate(f"{name}-{chunk_size}", backend, mode, options, chunks, vectors,
+                                      embeddings, queries, args.k, root)
+                except ImportError as e:
+                    print(f"  {name:22s} skipped ({e})")
+                    continue
+                result.update({"config": name, "chunking": chunking, "chunks": len(chunks),
+                               "embed_s": round(embed_s, 2)})
+                results.append(result)
+                kmax = str(max(args.k))
+                print(f"  {name:22s} build {result['build_s']:7.2f}s  disk {result['disk_mb']:7.1f}MB  "
+                      f"p50 {result['latency_p50_ms']:7.2f}ms  p95 {result['latency_p95_ms']:7.2f}ms  "
+                      f"recall@{kmax} {result['recall_at_k'][kmax]:.3f}  hit@{kmax} {result['hit_at_k'][kmax]:.3f}")
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"source": args.source, "embedder": args.embedder, "queries": len(queries),
+                   "k": args.k, "results": results}, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# clinical_table.py
+
+import os
+import re
+import json
+from typing import Dict, List, Optional, Set, Tuple
+
+# Column order of the persisted table; one list per column
+COLUMNS = ["nct", "title", "url", "status", "conditions", "interventions", "other"]
+TABLE_VERSION = 1
+
+INTERVENTION_TYPES = [
+    "DRUG", "DEVICE", "OTHER", "GENETIC", "BEHAVIORAL", "PROCEDURE",
+    "COMBINATION_PRODUCT", "BIOLOGICAL", "DIAGNOSTIC_TEST", "DIETARY_SUPPLEMENT",
+]
+# "other" is too common in ordinary questions to be read as a filter
+_QUERYABLE_TYPES = [t for t in INTERVENTION_TYPES if t != "OTHER"]
+
+_NCT_RE = re.compile(r"\bNCT\d{8}\b", re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+_COUNT_RE = re.compile(r"\b(how many|count|number of)\b")
+_LIST_RE = re.compile(r"^\s*(list|show|which|what are the|find)\b")
+_TRIAL_WORD_RE = re.compile(r"\b(trials?|studies|study)\b")
+# Words a count/list question may contain besides its status, intervention type and condition.
+# Anything else ("participants", "outcomes", "best", ...) means the question asks for more than
+# the table holds, so it is left to retrieval.
+_FILLER_WORDS = frozenset("""
+    a all an and any are be by clinical count currently do does find for have has how in intervention
+    interventions involving is list listed many me number of on registered show status studies study
+    studying table targeting that the there total treating trial trials type use uses using was were
+    what which with
+""".split())
+# Words an NCT lookup may contain besides the ids: asking for the row (or the fields it holds)
+# and nothing more. "Why was NCT… terminated?" or "…adverse events" is left to retrieval.
+_LOOKUP_WORDS = frozenset("""
+    a about and are both conditions describe detail details for give id ids info information
+    interventions is it look lookup me of on show status summarise summarize summary tell the their
+    them these this those title trial trials up url what what's whats which study studies
+""".split())
+# Longest condition phrase (in words) looked for in a question
+_MAX_CONDITION_WORDS = 6
+MAX_LISTED_ROWS = 20
+
+
+def trials_table_path(persist_directory: str) -> str:
+    # Next to the Chroma dir, like the BM25 sidecar, so it doesn't alter the index fingerprint
+    return os.path.normpath(persist_directory) + ".trials.json"
+
+
+def _phrase(token: str) -> str:
+    return token.lower().replace("_", " ")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+class TrialTable:
+    """
+    Columnar table of parsed clinical-trial rows with indexes on NCT id, status
+    and intervention type, answering exact lookups, counts and filters directly.
+    """
+
+    def __init__(self, columns: Dict[str, List[str]]):
+        self.columns = columns
+        self.n_rows = len(columns["nct"])
+        self.by_nct: Dict[str, int] = {}
+        self.by_status: Dict[str, Set[int]] = {}
+        self.by_type: Dict[str, Set[int]] = {}
+        for row, nct in enumerate(columns["nct"]):
+            self.by_nct.setdefault(nct.upper(), row)
+            self.by_status.setdefault(columns["status"][row], set()).add(row)
+            for token in columns["interventions"][row].split():
+                kind = token.split(":", 1)[0]
+                if kind in INTERVENTION_TYPES:
+                    self.by_type.setdefault(kind, set()).add(row)
+        self._search_text = [f"{c} {t}".lower() for c, t in zip(columns["conditions"], columns["title"])]
+        # Longest first so "not yet recruiting" wins over "recruiting"
+        self._statuses = sorted((s for s in self.by_status if s), key=len, reverse=True)
+        self._conditions = self._condition_vocabulary(columns["conditions"])
+
+    @staticmethod
+    def _condition_vocabulary(conditions: List[str]) -> Set[Tuple[str, ...]]:
+        """Every condition phrase in the table, plus its distinctive single words ("diabetes")."""
+        vocabulary: Set[Tuple[str, ...]] = set()
+        for text in conditions:
+            for phrase in re.split(r"[|,;]", text):
+                words = _words(phrase)
+                if 0 < len(words) <= _MAX_CONDITION_WORDS:
+                    vocabulary.add(tuple(words))
+                vocabulary.update((word,) for word in words if len(word) >= 3 and word not in _FILLER_WORDS)
+        return vocabulary
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, str]]) -> "TrialTable":
+        return cls({col: [row.get(col, "") for row in rows] for col in COLUMNS})
+
+    def save(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": TABLE_VERSION, "columns": self.columns}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["TrialTable"]:
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            payload = json.load(f)
+        if payload.get("version") != TABLE_VERSION:
+            return None
+        return cls(payload["columns"])
+
+    def row(self, idx: int) -> Dict[str, str]:
+        return {col: self.columns[col][idx] for col in COLUMNS}
+
+    def format_row(self, idx: int) -> str:
+        r = self.row(idx)
+        return (f"{r['nct']}: {r['title']} — status {r['status'] or 'unknown'}; "
+                f"conditions: {r['conditions'] or 'n/a'}; interventions: {r['interventions'] or 'n/a'}; {r['url']}")
+
+    def filter(self, status: Optional[str] = None, intervention_type: Optional[str] = None,
+               condition: Optional[str] = None) -> List[int]:
+        rows: Optional[Set[int]] = None
+        if status:
+            rows = set(self.by_status.get(status, set()))
+        if intervention_type:
+            typed = self.by_type.get(intervention_type, set())
+            rows = typed if rows is None else rows & typed
+        candidates = sorted(rows) if rows is not None else range(self.n_rows)
+        if condition:
+            needle = condition.lower()
+            return [r for r in candidates if needle in self._search_text[r]]
+        return list(candidates)
+
+    def _parse_filters(self, question: str) -> Optional[Dict[str, Optional[str]]]:
+        """
+        Status, intervention type and condition named in the question, or None when
+        words are left over that are none of those and not filler either.
+        """
+        text = " " + " ".join(_words(_phrase(question))) + " "
+        status = None
+        for candidate in self._statuses:
+            pattern = re.compile(rf"\b{re.escape(_phrase(candidate))}\b")
+            if pattern.search(text):
+                status = candidate
+                text = pattern.sub(" ", text)
+                break
+        intervention_type = None
+        for candidate in _QUERYABLE_TYPES:
+            pattern = re.compile(rf"\b{re.escape(_phrase(candidate))}s?\b")
+            if pattern.search(text):
+                intervention_type = candidate
+                text = pattern.sub(" ", text)
+                break
+
+        words = text.split()
+        condition = None
+        for size in range(min(_MAX_CONDITION_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                phrase = tuple(words[start:start + size])
+                if phrase in self._conditions:
+                    condition = " ".join(phrase)
+                    del words[start:start + size]
+                    break
+            if condition is not None:
+                break
+
+        if any(word not in _FILLER_WORDS for word in words):
+            return None
+        return {"status": status, "intervention_type": intervention_type, "condition": condition}
+
+    def answer(self, question: str) -> Optional[str]:
+        """
+        Answer exact NCT lookups, counts and filtered listings straight from the
+        table. Returns None when the question isn't entirely one of those shapes,
+        names a condition the table doesn't have or an NCT id it doesn't hold, so
+        the caller can fall back to retrieval + generation.
+        """
+        ids = [m.upper() for m in _NCT_RE.findall(question)]
+        if ids:
+            # Only plain lookups, and only when every requested id is in the table
+            if any(word not in _LOOKUP_WORDS for word in _words(_NCT_RE.sub(" ", question))):
+                return None
+            if any(i not in self.by_nct for i in ids):
+                return None
+            return "\n".join(self.format_row(self.by_nct[i]) for i in dict.fromkeys(ids))
+
+        lowered = question.lower()
+        wants_count = bool(_COUNT_RE.search(lowered))
+        wants_list = bool(_LIST_RE.search(lowered)) and bool(_TRIAL_WORD_RE.search(lowered))
+        if not (wants_count or wants_list):
+            return None
+
+        filters = self._parse_filters(question)
+        if filters is None:
+            return None
+        if not any(filters.values()) and not (wants_count and _TRIAL_WORD_RE.search(lowered)):
+            return None
+        rows = self.filter(**filters)
+
+        described = []
+        if filters["status"]:
+            described.append(f"status {filters['status']}")
+        if filters["intervention_type"]:
+            described.append(f"{filters['intervention_type']} interventions")
+        if filters["condition"]:
+            described.append(f"matching '{filters['condition']}'")
+        scope = f" with {', '.join(described)}" if described else ""
+
+        noun = "trial" if len(rows) == 1 else "trials"
+        if wants_count:
+            return f"{len(rows)} {noun}{scope} in the clinical studies table."
+        if not rows:
+            return f"No trials{scope} were found in the clinical studies table."
+        lines = [self.format_row(idx) for idx in rows[:MAX_LISTED_ROWS]]
+        more = f"\n… and {len(rows) - MAX_LISTED_ROWS} more." if len(rows) > MAX_LISTED_ROWS else ""
+        return f"{len(rows)} {noun}{scope}:\n" + "\n".join(lines) + more
+
+
+def load_trial_table(persist_directory: str) -> Optional[TrialTable]:
+    """Load the table written by ingest_data.py for this index, if there is one."""
+    path = trials_table_path(persist_directory)
+    try:
+        table = TrialTable.load(path)
+    except Exception as e:
+        print(f"Warning: could not load clinical trials table '{path}': {e}")
+        return None
+    if table is not None:
+        print(f"Loaded clinical trials table '{path}' ({table.n_rows} rows).")
+    return table
@@ -0,0 +1,110 @@
+# deadline.py
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, Tuple
+
+import telemetry
+
+# Ordered from untouched to most drastic; a request reports the furthest level it reached.
+# timed_out means nothing useful was ready (e.g. the web agent) when the budget ran out.
+DEGRADATION_LEVELS = ("none", "heuristic_route", "reduced_k", "passages_only", "timed_out")
+
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "30"))
+# Budget needed to still ask the classifier LLM when the embedding router is unsure
+CLASSIFIER_MIN_SECONDS = float(os.getenv("DEADLINE_CLASSIFIER_MIN_SECONDS", "8"))
+# Below this, generation only gets the top REDUCED_K documents
+FULL_CONTEXT_MIN_SECONDS = float(os.getenv("DEADLINE_FULL_CONTEXT_MIN_SECONDS", "6"))
+REDUCED_K = int(os.getenv("DEADLINE_REDUCED_K", "2"))
+# Below this, no generation call is made and the top passages are returned as they are
+GENERATION_MIN_SECONDS = float(os.getenv("DEADLINE_GENERATION_MIN_SECONDS", "2"))
+# The request as a whole is cut off this long after its deadline, leaving in-flight fallbacks time to return
+GRACE_SECONDS = float(os.getenv("DEADLINE_GRACE_SECONDS", "0.5"))
+# Width of the remaining-budget buckets within which requests may share one in-flight answer
+FLIGHT_BUCKET_SECONDS = float(os.getenv("DEADLINE_FLIGHT_BUCKET_SECONDS", "2"))
+
+
+class Deadline:
+    """
+    Absolute time budget for one request, plus the furthest degradation level
+    the orchestrator had to use to stay within it.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.level = "none"
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def degrade(self, level: str) -> None:
+        if DEGRADATION_LEVELS.index(level) > DEGRADATION_LEVELS.index(self.level):
+            self.level = level
+            telemetry.annotate("degradation", level)
+            print(f"Deadline: degrading to '{level}' with {self.remaining():.2f}s left")
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the active request, or None when it has no deadline."""
+    request_deadline = _current_deadline.get()
+    return request_deadline.remaining() if request_deadline is not None else None
+
+
+def allows(min_seconds: float) -> bool:
+    """True when there is no deadline or at least `min_seconds` of it are left."""
+    left = remaining()
+    return left is None or left >= min_seconds
+
+
+def budget_bucket() -> Optional[Tuple[int, int]]:
+    """
+    Coarse key for the remaining budget, or None when there is no deadline. Work is
+    only shared between requests in the same bucket: they cross the same degradation
+    thresholds and time out at roughly the same moment.
+    """
+    left = remaining()
+    if left is None:
+        return None
+    thresholds = (GENERATION_MIN_SECONDS, FULL_CONTEXT_MIN_SECONDS, CLASSIFIER_MIN_SECONDS)
+    return sum(left >= t for t in thresholds), int(left // FLIGHT_BUCKET_SECONDS)
+
+
+def degrade(level: str) -> None:
+    """Record a degradation step on the active request (no-op without a deadline)."""
+    request_deadline = _current_deadline.get()
+    if request_deadline is not None:
+        request_deadline.degrade(level)
+
+
+def level() -> str:
+    request_deadline = _current_deadline.get()
+    return request_deadline.level if request_deadline is not None else "none"
+
+
+@contextmanager
+def scope(seconds: Optional[float] = None) -> Iterator[Deadline]:
+    """
+    Give the enclosed request a deadline (CHAT_DEADLINE_SECONDS when `seconds` is None).
+    Tasks started inside inherit it through the context.
+    """
+    request_deadline = Deadline(DEFAULT_DEADLINE_SECONDS if seconds is None else seconds)
+    token = _current_deadline.set(request_deadline)
+    try:
+        yield request_deadline
+    finally:
+        try:
+            _current_deadline.reset(token)
+        except ValueError:
+            # A streaming response the client abandoned is closed from another context,
+            # which never had this value set; there is nothing to restore there
+            pass
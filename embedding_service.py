@@ -0,0 +1,182 @@
+# embedding_service.py
+
+import os
+import time
+import queue
+import threading
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+import telemetry
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", "2048"))
+MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+# Extra time the batcher waits for more queries after the first one arrives (0 = only
+# batch queries that queued up while the previous forward pass was running)
+BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "0"))
+
+
+class _QueryBatcher:
+    """
+    Background thread that embeds concurrently submitted queries in one forward pass.
+    """
+
+    def __init__(self, embed_batch, max_batch_size: int, wait_ms: float):
+        self._embed_batch = embed_batch
+        self._max_batch_size = max_batch_size
+        self._wait_s = wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.batched_queries = 0
+
+    def submit(self, text: str) -> Future:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._wait_s
+        while len(batch) < self._max_batch_size:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        # Nothing may escape this loop: a dead thread would leave every later query waiting forever
+        while True:
+            try:
+                self._run_batch(self._collect())
+            except Exception as e:
+                print(f"Embedding batcher error (continuing): {e}")
+
+    def _run_batch(self, batch) -> None:
+        # Callers that gave up (e.g. a cancelled aembed_query) cancelled their future; skip them
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # Identical concurrent queries share one slot in the forward pass
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            by_text = dict(zip(unique_texts, self._embed_batch(unique_texts)))
+            for text, future in batch:
+                future.set_result(by_text[text])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_queries += len(batch)
+
+
+class EmbeddingService(Embeddings):
+    """
+    Process-wide wrapper around one HuggingFace embedding model.
+
+    Document embeddings go straight to the model. Query embeddings are served from
+    a bounded LRU cache, and misses are micro-batched with other in-flight queries.
+    Use get_embedding_service() rather than constructing this directly.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL,
+                 cache_size: int = QUERY_CACHE_SIZE,
+                 max_batch_size: int = MAX_BATCH_SIZE,
+                 batch_wait_ms: float = BATCH_WAIT_MS):
+        print(f"Loading shared HuggingFace Embeddings model: {model_name}")
+        self.model_name = model_name
+        self.model = HuggingFaceEmbeddings(model_name=model_name)
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+        self._batcher = _QueryBatcher(self.model.embed_documents, max_batch_size, batch_wait_ms)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def _cached(self, text: str) -> Optional[List[float]]:
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is None:
+                self.cache_misses += 1
+                return None
+            self._cache.move_to_end(text)
+            self.cache_hits += 1
+            return vector
+
+    def _remember(self, text: str, vector: List[float]) -> List[float]:
+        with self._cache_lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return vector
+
+    def embed_query(self, text: str) -> List[float]:
+        with telemetry.span("query_embedding") as span_tags:
+            vector = self._cached(text)
+            span_tags["cache"] = "hit" if vector is not None else "miss"
+            if vector is not None:
+                return vector
+            return self._remember(text, self._batcher.submit(text).result())
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # Await the batcher's future directly instead of parking a thread on it
+        with telemetry.span("query_embedding") as span_tags:
+            vector = self._cached(text)
+            span_tags["cache"] = "hit" if vector is not None else "miss"
+            if vector is not None:
+                return vector
+            return self._remember(text, await asyncio.wrap_future(self._batcher.submit(text)))
+
+    def stats(self) -> Dict[str, float]:
+        with self._cache_lock:
+            size = len(self._cache)
+        batches = self._batcher.batches
+        return {
+            "query_cache_hits": self.cache_hits,
+            "query_cache_misses": self.cache_misses,
+            "query_cache_size": size,
+            "batches": batches,
+            "batched_queries": self._batcher.batched_queries,
+            "mean_batch_size": self._batcher.batched_queries / batches if batches else 0.0,
+        }
+
+
+_services: Dict[str, EmbeddingService] = {}
+_registry_lock = threading.Lock()
+
+
+def get_embedding_service(model_name: str = DEFAULT_EMBEDDING_MODEL) -> EmbeddingService:
+    """
+    Return the process-wide EmbeddingService for `model_name`, loading it on first use.
+    """
+    service = _services.get(model_name)
+    if service is None:
+        with _registry_lock:
+            service = _services.get(model_name)
+            if service is None:
+                service = EmbeddingService(model_name)
+                _services[model_name] = service
+    return service
@@ -0,0 +1,259 @@
+# index_jobs.py
+
+import os
+import re
+import glob
+import time
+import shutil
+import sqlite3
+import uuid
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, Optional
+
+from clinical_table import trials_table_path
+from ingest_manifest import manifest_path
+from agents.mmap_vectorstore import is_mmap_index
+
+# PDFs the API may ingest must live under this directory
+INGEST_DATA_DIR = os.getenv("INGEST_DATA_DIR", "data")
+# Extraction processes for API-triggered jobs; 1 avoids forking the running server
+INGEST_API_WORKERS = int(os.getenv("INGEST_API_WORKERS", "1"))
+# Index versions kept on disk per target (the live one included), for requests still on older handles
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "2"))
+# Seconds a swapped-out index stays open for the requests already reading it before it is closed
+INDEX_RETIRE_SECONDS = float(os.getenv("INDEX_RETIRE_SECONDS", "120"))
+
+_VERSION_SUFFIX = re.compile(r"\.v\d{14}(-\d+)?$")
+
+
+class IngestJobError(Exception):
+    """Raised for ingest requests that cannot be started (bad target or path)."""
+
+
+class IngestJobBusy(IngestJobError):
+    """Raised when the target already has an ingest job running."""
+
+
+def _pointer_path(base_dir: str) -> str:
+    return base_dir.rstrip("/\\") + ".current"
+
+
+def base_index_dir(persist_directory: str) -> str:
+    """Strip a version suffix: 'un_food_index.v20250101120000' -> 'un_food_index'."""
+    return _VERSION_SUFFIX.sub("", persist_directory.rstrip("/\\"))
+
+
+def current_index_dir(base_dir: str) -> str:
+    """
+    The directory a target should serve from: the last swapped-in version recorded
+    next to the base directory, or the base directory itself.
+    """
+    try:
+        with open(_pointer_path(base_dir), "r", encoding="utf-8") as f:
+            current = f.read().strip()
+    except OSError:
+        return base_dir
+    return current if current and os.path.isdir(current) else base_dir
+
+
+def _next_index_dir(base_dir: str) -> str:
+    candidate = f"{base_dir}.v{time.strftime('%Y%m%d%H%M%S')}"
+    n = 1
+    while os.path.exists(candidate):
+        n += 1
+        candidate = f"{base_dir}.v{time.strftime('%Y%m%d%H%M%S')}-{n}"
+    return candidate
+
+
+def _sidecars(persist_directory: str):
+    # The BM25 sidecar is fingerprinted against its directory and rebuilds itself, so it is not copied
+    return [manifest_path(persist_directory), trials_table_path(persist_directory)]
+
+
+def _remove_index(persist_directory: str) -> None:
+    shutil.rmtree(persist_directory, ignore_errors=True)
+    for path in _sidecars(persist_directory) + [persist_directory.rstrip("/\\") + ".bm25.json"]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _copy_index(src_dir: str, dst_dir: str) -> None:
+    """
+    Copy a live Chroma directory. SQLite databases go through the backup API, which
+    gives a consistent snapshot while the serving process holds them open; a plain
+    file copy can catch a half-written page or miss the WAL.
+    """
+    shutil.copytree(src_dir, dst_dir, ignore=shutil.ignore_patterns("*.sqlite3", "*.sqlite3-wal",
+                                                                     "*.sqlite3-shm", "*.sqlite3-journal"))
+    for src in glob.glob(os.path.join(glob.escape(src_dir), "**", "*.sqlite3"), recursive=True):
+        dst = os.path.join(dst_dir, os.path.relpath(src, src_dir))
+        source = sqlite3.connect(f"file:{src}?mode=ro", uri=True)
+        try:
+            target = sqlite3.connect(dst)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+
+
+def _retire(handle) -> None:
+    timer = threading.Timer(INDEX_RETIRE_SECONDS, handle.close)
+    timer.daemon = True
+    timer.start()
+
+
+def ingest_food(pdf_path: str, db_dir: str, **kwargs):
+    # ingest_data (pdfplumber, process pools) is only imported once a job actually runs
+    from ingest_data import ingest_un_food_pdf
+    return ingest_un_food_pdf(pdf_path, db_dir, **kwargs)
+
+
+def ingest_clinical(pdf_path: str, db_dir: str, **kwargs):
+    from ingest_data import ingest_clinical_pdf_custom_parsing
+    return ingest_clinical_pdf_custom_parsing(pdf_path, db_dir, **kwargs)
+
+
+@dataclass
+class IngestTarget:
+    """A swappable agent, the base directory its versions live next to, and how to ingest into it."""
+    agent: object
+    base_dir: str
+    ingest_fn: Callable
+    default_pdf: str
+
+
+@dataclass
+class IngestJob:
+    id: str
+    target: str
+    pdf_path: str
+    force: bool = False
+    status: str = "queued"  # queued -> running -> succeeded | failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    index_dir: Optional[str] = None
+    index_version: Optional[str] = None
+    previous_version: Optional[str] = None
+    # new/changed/removed/unchanged item counts; None when the PDF itself was unchanged
+    changes: Optional[Dict[str, int]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+class IngestJobManager:
+    """
+    Runs ingestion in a background thread without taking the API down.
+
+    Each job copies the live index (and its manifest/trials sidecars) to a new
+    versioned directory next to it, runs the incremental ingest into the copy and,
+    once that succeeded, swaps the agent onto it. In-flight requests keep the
+    handle they started with. The new version is recorded in '<base>.current' so a
+    restart serves it too, and versions beyond INDEX_KEEP_VERSIONS are deleted.
+    """
+
+    def __init__(self, targets: Dict[str, IngestTarget], keep_versions: int = INDEX_KEEP_VERSIONS):
+        self.targets = targets
+        self.keep_versions = max(1, keep_versions)
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, IngestJob] = {}
+        self._running: Dict[str, str] = {}  # target -> job id
+
+    def submit(self, target: str, pdf_path: Optional[str] = None, force: bool = False) -> IngestJob:
+        if target not in self.targets:
+            raise IngestJobError(f"Unknown ingest target '{target}'; expected one of {sorted(self.targets)}.")
+        pdf_path = os.path.normpath(pdf_path or self.targets[target].default_pdf)
+        data_dir = os.path.abspath(INGEST_DATA_DIR)
+        if os.path.commonpath([os.path.abspath(pdf_path), data_dir]) != data_dir:
+            raise IngestJobError(f"PDF path must be inside '{INGEST_DATA_DIR}'.")
+        if not os.path.isfile(pdf_path):
+            raise IngestJobError(f"PDF not found: {pdf_path}")
+
+        with self._lock:
+            if target in self._running:
+                raise IngestJobBusy(f"An ingest job for '{target}' is already running ({self._running[target]}).")
+            job = IngestJob(id=uuid.uuid4().hex[:12], target=target, pdf_path=pdf_path, force=force)
+            self._jobs[job.id] = job
+            self._running[target] = job.id
+        threading.Thread(target=self._run, args=(job,), name=f"ingest-{target}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: IngestJob) -> None:
+        target = self.targets[job.target]
+        agent = target.agent
+        job.status = "running"
+        job.started_at = time.time()
+        job.previous_version = agent.index_version
+        new_dir = _next_index_dir(target.base_dir)
+        try:
+            live_dir = agent.persist_directory
+            if is_mmap_index(live_dir):
+                raise IngestJobError(f"'{live_dir}' is a memory-mapped export; ingest into Chroma and re-export it.")
+            if os.path.isdir(live_dir):
+                _copy_index(live_dir, new_dir)
+                for src, dst in zip(_sidecars(live_dir), _sidecars(new_dir)):
+                    if os.path.exists(src):
+                        shutil.copy2(src, dst)
+
+            plan = target.ingest_fn(job.pdf_path, new_dir, workers=INGEST_API_WORKERS, force=job.force)
+            job.changes = plan.counts() if plan is not None else None
+            if plan is None or not plan.has_changes:
+                # Nothing to swap in; the live index already matches the PDF
+                _remove_index(new_dir)
+                job.index_dir = live_dir
+                job.index_version = agent.index_version
+                job.status = "succeeded"
+                return
+            if not os.path.isdir(new_dir):
+                raise IngestJobError("Ingestion produced no index (no text found in the PDF?).")
+
+            _retire(agent.swap_index(new_dir))
+            self._record_current(target.base_dir, new_dir)
+            self._prune(target.base_dir, keep={new_dir, live_dir})
+            job.index_dir = new_dir
+            job.index_version = agent.index_version
+            job.status = "succeeded"
+        except Exception as e:
+            print(f"Ingest job {job.id} for '{job.target}' failed: {e}")
+            _remove_index(new_dir)
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._running.pop(job.target, None)
+
+    @staticmethod
+    def _record_current(base_dir: str, persist_directory: str) -> None:
+        pointer = _pointer_path(base_dir)
+        with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+            f.write(persist_directory)
+        os.replace(pointer + ".tmp", pointer)
+
+    def _prune(self, base_dir: str, keep) -> None:
+        versions = sorted(d for d in glob.glob(glob.escape(base_dir) + ".v*") if os.path.isdir(d))
+        # The base directory is never deleted; only versions older than the newest keep_versions
+        for old in versions[:-self.keep_versions]:
+            if old not in keep:
+                print(f"Removing old index version: {old}")
+                _remove_index(old)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+            running = len(self._running)
+        return {
+            "jobs": len(jobs),
+            "running": running,
+            "succeeded": sum(1 for job in jobs if job.status == "succeeded"),
+            "failed": sum(1 for job in jobs if job.status == "failed"),
+        }
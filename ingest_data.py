@@ -1,141 +1,473 @@
 import os
 import re
+import time
+import queue
+import argparse
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 import pdfplumber
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
-from langchain.embeddings import HuggingFaceEmbeddings
+from ingest_embeddings import IngestEmbedder
+from clinical_table import TrialTable, trials_table_path
+from ingest_manifest import IngestManifest, ManifestEntry, ChangePlan, manifest_path, content_hash, file_hash
 from langchain.vectorstores import Chroma
 
 # Directories to store vector databases
 UN_VECTORSTORE_DIR = "un_food_index"
 CLINICAL_VECTORSTORE_DIR = "clinical_index"
 
-def ingest_un_food_pdf(pdf_path: str, db_dir: str):
+# Pages per extraction task; each task reopens the PDF, so keep this well above 1
+PAGE_SHARD_SIZE = 8
+# Chunks embedded and upserted per Chroma call
+DEFAULT_BATCH_SIZE = 64
+# Batches allowed to wait for the embedding thread before chunking blocks
+DEFAULT_QUEUE_BATCHES = 4
+
+
+def default_workers() -> int:
+    """Extraction processes: all cores but one, which the embedding thread needs."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+class IngestStats:
+    """Page and chunk counters for one ingestion run, reported as rates."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pages = 0
+        self.chunks = 0
+        self.started = time.perf_counter()
+
+    def report(self) -> None:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        print(f"⏱️ {self.name}: {self.pages} pages ({self.pages / elapsed:.1f} pages/s), "
+              f"{self.chunks} chunks ({self.chunks / elapsed:.1f} chunks/s) in {elapsed:.1f}s")
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Worker task: text of pages [start, stop) as (page_idx, text) pairs."""
+    pages = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_idx in range(start, stop):
+            page = pdf.pages[page_idx]
+            pages.append((page_idx, page.extract_text() or ""))
+            # Drop pdfplumber's per-page object cache as we go
+            page.flush_cache()
+    return pages
+
+
+def iter_pages(pdf_path: str, workers: int = 1, shard_size: int = PAGE_SHARD_SIZE) -> Iterator[Tuple[int, str]]:
     """
-    Reads and chunks a UN Food Security PDF, embeds using Hugging Face, stores in Chroma.
+    Yield (page_idx, text) in page order, extracting shards of pages in a process pool.
+    Only two shards per worker are in flight, so extraction cannot run far ahead of
+    whoever consumes the pages.
     """
-    print(f"📄 Ingesting UN Food PDF: {pdf_path}")
-    all_docs = []
-
     with pdfplumber.open(pdf_path) as pdf:
-        for page_idx, page in enumerate(pdf.pages):
-            text = page.extract_text()
-            if text:
-                doc = Document(
-                    page_content=text,
-                    metadata={"source": "un_food_security", "page": page_idx}
-                )
-                all_docs.append(doc)
-
-    if not all_docs:
-        print("⚠️ No text found in UN PDF. Skipping ingestion.")
+        page_count = len(pdf.pages)
+    shards = iter([(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)])
+
+    if workers <= 1:
+        for start, stop in shards:
+            yield from _extract_page_range(pdf_path, start, stop)
+        return
+
+    # Spawned, not forked: by now the BatchWriter (or the server, for /ingest) has loaded
+    # torch and started threads, and a forked child inherits their locks mid-use
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = deque()
+        for _ in range(workers * 2):
+            shard = next(shards, None)
+            if shard is None:
+                break
+            pending.append(pool.submit(_extract_page_range, pdf_path, *shard))
+        while pending:
+            pages = pending.popleft().result()
+            shard = next(shards, None)
+            if shard is not None:
+                pending.append(pool.submit(_extract_page_range, pdf_path, *shard))
+            yield from pages
+
+
+class BatchWriter:
+    """
+    Embeds and upserts chunks into a Chroma store in fixed-size batches on a
+    background thread. Batches (and deletions, in order) are handed over through a
+    bounded queue, so memory stays flat and extraction/chunking overlap with embedding.
+    reset=True drops whatever the collection held before the first write.
+    Embeddings go through the deduping, length-bucketing IngestEmbedder (int8 with quantize=True).
+    """
+
+    def __init__(self, db_dir: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 queue_batches: int = DEFAULT_QUEUE_BATCHES, reset: bool = False,
+                 quantize: Optional[bool] = None):
+        self.db_dir = db_dir
+        self.batch_size = batch_size
+        self.reset = reset
+        # One per run: its dedup cache is released when the run ends
+        self.embedder = IngestEmbedder(quantize=quantize)
+        self.vectorstore: Optional[Chroma] = None
+        self.written = 0
+        self.deleted = 0
+        self.error: Optional[BaseException] = None
+        self._batch: List[Tuple[Document, str]] = []
+        self._queue: "queue.Queue[Optional[Tuple[str, list]]]" = queue.Queue(maxsize=queue_batches)
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, doc: Document, doc_id: str) -> None:
+        self._batch.append((doc, doc_id))
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def delete(self, ids: List[str]) -> None:
+        """Queue chunk deletions behind any pending adds."""
+        if ids:
+            self._flush()
+            self._put(("delete", list(ids)))
+
+    def _flush(self) -> None:
+        if self._batch:
+            self._put(("add", self._batch))
+            self._batch = []
+
+    def close(self) -> int:
+        """Flush the last partial batch, wait for the writer and persist. Returns chunks written."""
+        try:
+            self._flush()
+            self._put(None)
+            self._thread.join()
+            if self.error is not None:
+                raise RuntimeError(f"Embedding/upsert into '{self.db_dir}' failed: {self.error}") from self.error
+            if self.vectorstore is not None:
+                self.vectorstore.persist()
+            if self.written:
+                embed_stats = self.embedder.stats()
+                print(f"🧠 Embedder: {embed_stats['duplicates']} of {embed_stats['texts']} chunks deduplicated, "
+                      f"padding efficiency {embed_stats['padding_efficiency']:.0%}"
+                      f"{', int8' if embed_stats['quantized'] else ''}")
+            return self.written
+        finally:
+            self.embedder.clear_cache()
+
+    def abort(self) -> None:
+        """Stop the writer without flushing, e.g. when extraction failed."""
+        self._batch = []
+        try:
+            self._put(None)
+        except RuntimeError:
+            pass
+        self._thread.join()
+        self.embedder.clear_cache()
+
+    def _put(self, item: Optional[Tuple[str, list]]) -> None:
+        # Block while the queue is full, but give up if the writer thread died
+        while True:
+            if self.error is not None:
+                raise RuntimeError(f"Embedding/upsert into '{self.db_dir}' failed: {self.error}") from self.error
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _open(self) -> Chroma:
+        # Opened on the first operation so an empty source never leaves an empty index behind
+        vectorstore = Chroma(persist_directory=self.db_dir, embedding_function=self.embedder)
+        if self.reset:
+            print(f"♻️ Clearing existing collection in '{self.db_dir}' before a full rebuild.")
+            vectorstore.delete_collection()
+            vectorstore = Chroma(persist_directory=self.db_dir, embedding_function=self.embedder)
+        return vectorstore
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                if self.vectorstore is None:
+                    self.vectorstore = self._open()
+                op, payload = item
+                if op == "delete":
+                    self.vectorstore.delete(ids=payload)
+                    self.deleted += len(payload)
+                else:
+                    docs, ids = zip(*payload)
+                    self.vectorstore.add_documents(list(docs), ids=list(ids))
+                    self.written += len(payload)
+            except BaseException as e:
+                self.error = e
+                return
+
+def _load_previous_manifest(db_dir: str) -> Optional[IngestManifest]:
+    """The index's manifest, or None when the index must be rebuilt from scratch."""
+    previous = IngestManifest.load(manifest_path(db_dir))
+    if previous is not None and not os.path.isdir(db_dir):
+        print(f"⚠️ Manifest found but index '{db_dir}' is missing; rebuilding everything.")
+        return None
+    return previous
+
+
+def _source_unchanged(pdf_path: str, previous: Optional[IngestManifest], force: bool) -> Tuple[bool, str]:
+    source_hash = file_hash(pdf_path)
+    unchanged = previous is not None and previous.source_hash == source_hash and not force
+    if unchanged:
+        print(f"⏭️ {pdf_path} unchanged since the last ingestion; nothing to do.")
+    return unchanged, source_hash
+
+
+def _upsert_item(writer: Optional[BatchWriter], manifest: IngestManifest, previous: Optional[IngestManifest],
+                 key: str, item_hash: str, status: str, chunks: List[Document]) -> None:
+    """Replace one new or changed item's chunks (ids are "<key>:<n>") and record it in the manifest."""
+    ids = [f"{key}:{n}" for n in range(len(chunks))]
+    manifest.entries[key] = ManifestEntry(hash=item_hash, ids=ids)
+    if writer is None:
+        return
+    if status == "changed":
+        writer.delete(previous.entries[key].ids)
+    for chunk, chunk_id in zip(chunks, ids):
+        writer.add(chunk, chunk_id)
+
+
+def _finish_ingest(writer: Optional[BatchWriter], manifest: IngestManifest, previous: Optional[IngestManifest],
+                   plan: ChangePlan, db_dir: str) -> None:
+    """Delete chunks of items that disappeared, wait for the writer, then commit the manifest."""
+    removed = plan.finish()
+    if writer is None:
         return
+    for key in removed:
+        writer.delete(previous.entries[key].ids)
+    writer.close()
+    # Written last: if anything above failed, the old manifest still describes a superset to re-check
+    manifest.save(manifest_path(db_dir))
+
+
+def ingest_un_food_pdf(pdf_path: str, db_dir: str, workers: Optional[int] = None,
+                       batch_size: int = DEFAULT_BATCH_SIZE, dry_run: bool = False, force: bool = False,
+                       quantize: Optional[bool] = None):
+    """
+    Reads and chunks a UN Food Security PDF, embeds using Hugging Face, stores in Chroma.
+    Pages stream from the extraction pool through the splitter into batched upserts.
+    Only pages whose text hash differs from the index's manifest are re-embedded;
+    dry_run reports the planned changes without writing anything.
+    Returns the ChangePlan, or None when the PDF is unchanged since the last run.
+    """
+    workers = workers or default_workers()
+    print(f"📄 Ingesting UN Food PDF: {pdf_path} ({workers} extraction workers)")
+    previous = _load_previous_manifest(db_dir)
+    unchanged, source_hash = _source_unchanged(pdf_path, previous, force)
+    if unchanged:
+        return None
 
+    stats = IngestStats("UN Food PDF")
+    plan = ChangePlan(previous)
+    manifest = IngestManifest(source_hash=source_hash)
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunked_docs = text_splitter.split_documents(all_docs)
-    print(f"✅ UN Food PDF chunked into {len(chunked_docs)} segments.")
-
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
-    vectorstore = Chroma.from_documents(
-        documents=chunked_docs,
-        embedding=embeddings,
-        persist_directory=db_dir
+    # Without a manifest we cannot tell which chunks are ours, so the collection is rebuilt
+    writer = None if dry_run else BatchWriter(db_dir, batch_size, reset=previous is None, quantize=quantize)
+
+    try:
+        for page_idx, text in iter_pages(pdf_path, workers):
+            stats.pages += 1
+            if not text:
+                continue
+            key = f"page:{page_idx}"
+            page_hash = content_hash(text)
+            status = plan.classify(key, page_hash)
+            if status == "unchanged":
+                manifest.entries[key] = previous.entries[key]
+                continue
+            doc = Document(
+                page_content=text,
+                metadata={"source": "un_food_security", "page": page_idx}
+            )
+            chunks = text_splitter.split_documents([doc])
+            _upsert_item(writer, manifest, previous, key, page_hash, status, chunks)
+            stats.chunks += len(chunks)
+        _finish_ingest(writer, manifest, previous, plan, db_dir)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+    plan.report("UN Food PDF", dry_run)
+    if not manifest.entries:
+        print("⚠️ No text found in UN PDF. Skipping ingestion.")
+        return plan
+
+    print(f"✅ UN Food PDF: {stats.chunks} segments {'to embed' if dry_run else 'embedded'}.")
+    stats.report()
+    if not dry_run:
+        print(f"📦 UN Food Security vectorstore stored at: {db_dir}")
+    return plan
+
+
+INTERVENTION_KEYWORDS = [
+    "DRUG:", "DEVICE:", "OTHER:", "GENETIC:", "BEHAVIORAL:",
+    "PROCEDURE:", "COMBINATION_PRODUCT:", "BIOLOGICAL:",
+    "DIAGNOSTIC_TEST:", "DIETARY_SUPPLEMENT:"
+]
+
+
+def parse_clinical_line(line: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """
+    Parse one text-formatted trial row into its document text and table row.
+    None for lines that are not data rows.
+    """
+    if not line.startswith("NCT"):
+        return None  # likely not a data row
+
+    match_nct = re.match(r"(NCT\d+)", line)
+    nct_number = match_nct.group(1) if match_nct else "Unknown"
+
+    url_match = re.search(r"(https://clinicaltrials.gov/study/NCT\d+)", line)
+    url = url_match.group(1) if url_match else ""
+
+    title_start = line.find(nct_number) + len(nct_number)
+    title_end = line.find(url)
+    study_title = line[title_start:title_end].strip()
+
+    after_url = line[title_end + len(url):]
+    status_match = re.match(r"([A-Z_]+)", after_url)
+    status = status_match.group(1) if status_match else ""
+
+    rest = after_url[len(status):].strip()
+
+    int_start = min([rest.find(k) for k in INTERVENTION_KEYWORDS if k in rest] + [len(rest)])
+    conditions = rest[:int_start].strip()
+    interventions_and_beyond = rest[int_start:].strip()
+
+    interventions = []
+    for token in interventions_and_beyond.split():
+        if any(token.startswith(k) for k in INTERVENTION_KEYWORDS):
+            interventions.append(token)
+        else:
+            break
+    intervention_text = " ".join(interventions)
+    remaining = interventions_and_beyond[len(intervention_text):].strip()
+
+    doc_text = (
+        f"NCT Number: {nct_number}\n"
+        f"Study Title: {study_title}\n"
+        f"Study URL: {url}\n"
+        f"Study Status: {status}\n"
+        f"Conditions: {conditions}\n"
+        f"Interventions: {intervention_text}\n"
+        f"Other Info: {remaining}"
     )
-    vectorstore.persist()
-    print(f"📦 UN Food Security vectorstore stored at: {db_dir}")
+    row = {
+        "nct": nct_number,
+        "title": study_title,
+        "url": url,
+        "status": status,
+        "conditions": conditions,
+        "interventions": intervention_text,
+        "other": remaining,
+    }
+    return doc_text, row
 
 
-def ingest_clinical_pdf_custom_parsing(pdf_path: str, db_dir: str):
+def ingest_clinical_pdf_custom_parsing(pdf_path: str, db_dir: str, workers: Optional[int] = None,
+                                       batch_size: int = DEFAULT_BATCH_SIZE, dry_run: bool = False,
+                                       force: bool = False, quantize: Optional[bool] = None):
     """
     Extracts clinical trial data from text-formatted lines in a PDF, embeds with HF, stores in Chroma.
+    Pages stream from the extraction pool; each row is keyed by its NCT number and only
+    new or changed rows are chunked and upserted. dry_run only reports the plan.
+    Returns the ChangePlan, or None when the PDF is unchanged since the last run.
     """
-    print(f"📄 Ingesting Clinical Studies PDF: {pdf_path}")
-    all_docs = []
+    workers = workers or default_workers()
+    print(f"📄 Ingesting Clinical Studies PDF: {pdf_path} ({workers} extraction workers)")
+    previous = _load_previous_manifest(db_dir)
+    unchanged, source_hash = _source_unchanged(pdf_path, previous, force)
+    if unchanged:
+        return None
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
+    stats = IngestStats("Clinical Studies PDF")
+    plan = ChangePlan(previous)
+    manifest = IngestManifest(source_hash=source_hash)
+    all_rows = []  # the same fields, kept structured for the trials table (small next to the documents)
+    key_counts: Dict[str, int] = {}
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    writer = None if dry_run else BatchWriter(db_dir, batch_size, reset=previous is None, quantize=quantize)
+
+    try:
+        for _, text in iter_pages(pdf_path, workers):
+            stats.pages += 1
             if not text:
                 continue
 
-            lines = text.split("\n")
-            for line in lines:
-                if not line.startswith("NCT"):
-                    continue  # likely not a data row
-
+            for line in text.split("\n"):
                 try:
-                    match_nct = re.match(r"(NCT\d+)", line)
-                    nct_number = match_nct.group(1) if match_nct else "Unknown"
-
-                    url_match = re.search(r"(https://clinicaltrials.gov/study/NCT\d+)", line)
-                    url = url_match.group(1) if url_match else ""
-
-                    title_start = line.find(nct_number) + len(nct_number)
-                    title_end = line.find(url)
-                    study_title = line[title_start:title_end].strip()
-
-                    after_url = line[title_end + len(url):]
-                    status_match = re.match(r"([A-Z_]+)", after_url)
-                    status = status_match.group(1) if status_match else ""
-
-                    rest = after_url[len(status):].strip()
-
-                    intervention_keywords = [
-                        "DRUG:", "DEVICE:", "OTHER:", "GENETIC:", "BEHAVIORAL:",
-                        "PROCEDURE:", "COMBINATION_PRODUCT:", "BIOLOGICAL:",
-                        "DIAGNOSTIC_TEST:", "DIETARY_SUPPLEMENT:"
-                    ]
-                    int_start = min([rest.find(k) for k in intervention_keywords if k in rest] + [len(rest)])
-                    conditions = rest[:int_start].strip()
-                    interventions_and_beyond = rest[int_start:].strip()
-
-                    interventions = []
-                    for token in interventions_and_beyond.split():
-                        if any(token.startswith(k) for k in intervention_keywords):
-                            interventions.append(token)
-                        else:
-                            break
-                    intervention_text = " ".join(interventions)
-                    remaining = interventions_and_beyond[len(intervention_text):].strip()
-
-                    doc_text = (
-                        f"NCT Number: {nct_number}\n"
-                        f"Study Title: {study_title}\n"
-                        f"Study URL: {url}\n"
-                        f"Study Status: {status}\n"
-                        f"Conditions: {conditions}\n"
-                        f"Interventions: {intervention_text}\n"
-                        f"Other Info: {remaining}"
-                    )
-
-                    all_docs.append(Document(page_content=doc_text, metadata={"source": "clinical_study_pdf"}))
-
+                    parsed = parse_clinical_line(line)
                 except Exception as e:
                     print(f"⚠️ Skipped line due to error: {e}\n{line}")
+                    continue
+                if parsed is None:
+                    continue
+                doc_text, row = parsed
+                all_rows.append(row)
 
-    if not all_docs:
+                # Repeated NCT numbers get a suffix so each row keeps its own key
+                key_counts[row["nct"]] = key_counts.get(row["nct"], 0) + 1
+                key = row["nct"] if key_counts[row["nct"]] == 1 else f"{row['nct']}#{key_counts[row['nct']]}"
+                row_hash = content_hash(doc_text)
+                status = plan.classify(key, row_hash)
+                if status == "unchanged":
+                    manifest.entries[key] = previous.entries[key]
+                    continue
+                doc = Document(page_content=doc_text, metadata={"source": "clinical_study_pdf"})
+                chunks = splitter.split_documents([doc])
+                _upsert_item(writer, manifest, previous, key, row_hash, status, chunks)
+                stats.chunks += len(chunks)
+        _finish_ingest(writer, manifest, previous, plan, db_dir)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+    plan.report("Clinical Studies PDF", dry_run)
+    if not all_rows:
         print("⚠️ No valid clinical rows parsed.")
-        return
+        return plan
 
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    chunks = splitter.split_documents(all_docs)
-    print(f"✅ Clinical data chunked into {len(chunks)} segments.")
-
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
-    vectorstore = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=db_dir
-    )
-    vectorstore.persist()
-    print(f"📦 Clinical vectorstore stored at: {db_dir}")
+    if not dry_run:
+        # Cheap to rebuild in full, and always matches the current PDF
+        table_path = trials_table_path(db_dir)
+        TrialTable.from_rows(all_rows).save(table_path)
+        print(f"📋 Clinical trials table ({len(all_rows)} rows) stored at: {table_path}")
+
+    print(f"✅ Clinical data: {stats.chunks} segments {'to embed' if dry_run else 'embedded'}.")
+    stats.report()
+    if not dry_run:
+        print(f"📦 Clinical vectorstore stored at: {db_dir}")
+    return plan
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the UN food security and clinical trials indexes.")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="processes used for PDF page extraction (default: cores - 1)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="chunks embedded and upserted per batch")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report new/changed/removed items against the manifests without writing")
+    parser.add_argument("--force", action="store_true",
+                        help="re-check every item even if a PDF's file hash is unchanged")
+    parser.add_argument("--quantize", action="store_true", default=None,
+                        help="embed with an int8-quantized CPU copy of the model (faster, slight drift)")
+    args = parser.parse_args()
+
     un_pdf_path = "data/un_food_security.pdf"
     clinical_pdf_path = "data/clinical_studies.pdf"
 
-    ingest_un_food_pdf(un_pdf_path, UN_VECTORSTORE_DIR)
-    ingest_clinical_pdf_custom_parsing(clinical_pdf_path, CLINICAL_VECTORSTORE_DIR)
+    options = dict(workers=args.workers, batch_size=args.batch_size, dry_run=args.dry_run, force=args.force,
+                   quantize=args.quantize)
+    ingest_un_food_pdf(un_pdf_path, UN_VECTORSTORE_DIR, **options)
+    ingest_clinical_pdf_custom_parsing(clinical_pdf_path, CLINICAL_VECTORSTORE_DIR, **options)
 
     print("✅ Ingestion complete!")
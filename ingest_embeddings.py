@@ -0,0 +1,135 @@
+# ingest_embeddings.py
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from embedding_service import DEFAULT_EMBEDDING_MODEL, get_embedding_service
+
+# Texts per forward pass after bucketing by length
+INGEST_ENCODE_BATCH_SIZE = int(os.getenv("INGEST_EMBEDDING_BATCH_SIZE", "32"))
+# Embeddings remembered by content hash for one run (768 float32s = 3 KB each, ~60 MB when full)
+INGEST_DEDUP_CACHE_SIZE = int(os.getenv("INGEST_EMBEDDING_DEDUP_CACHE", "20000"))
+INGEST_QUANTIZE = os.getenv("INGEST_EMBEDDING_QUANTIZE", "0") == "1"
+
+
+def _estimate_tokens(text: str) -> int:
+    # Same ~4 characters per token rule as agents.context_packing; only used for ordering
+    return max(1, len(text) // 4)
+
+
+def load_quantized_model(model_name: str = DEFAULT_EMBEDDING_MODEL):
+    """
+    CPU SentenceTransformer with its Linear layers dynamically quantized to int8.
+    Needs torch and sentence-transformers, which HuggingFaceEmbeddings already uses.
+    """
+    try:
+        import torch
+        from sentence_transformers import SentenceTransformer
+    except ImportError as e:
+        raise RuntimeError(f"int8 embedding needs 'torch' and 'sentence-transformers' installed: {e}")
+    model = SentenceTransformer(model_name, device="cpu")
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class IngestEmbedder(Embeddings):
+    """
+    Embedding front end for one ingestion run; create a new one per run so the
+    dedup cache is freed with it (ingestion may run inside the API server).
+
+    Chunks whose text was already embedded in this run (repeated headers, identical
+    trial boilerplate) are served from a content-hash cache. The remaining texts are
+    sorted by length and encoded in batches of similar length, which keeps padding low.
+    With quantize=True a dynamically int8-quantized copy of the model runs on the CPU.
+    Its vectors drift slightly from the fp32 model that embeds queries at serving time;
+    benchmarks/ingest_embedding_benchmark.py measures how much.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL,
+                 quantize: Optional[bool] = None,
+                 batch_size: int = INGEST_ENCODE_BATCH_SIZE,
+                 dedup_cache_size: int = INGEST_DEDUP_CACHE_SIZE):
+        if quantize is None:
+            quantize = INGEST_QUANTIZE
+        self.model_name = model_name
+        self.quantize = quantize
+        self.batch_size = batch_size
+        if quantize:
+            print(f"Loading int8-quantized CPU embedding model: {model_name}")
+            self.model = load_quantized_model(model_name)
+        else:
+            # The SentenceTransformer behind the shared HuggingFaceEmbeddings; same vectors as serving
+            self.model = get_embedding_service(model_name).model.client
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_size = dedup_cache_size
+        self._lock = threading.Lock()
+        self.texts = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.padded_tokens = 0
+        self.real_tokens = 0
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        # Longest first, like sentence-transformers, so the first batch shows memory peaks early
+        order = sorted(range(len(texts)), key=lambda i: _estimate_tokens(texts[i]), reverse=True)
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch_idx = order[start:start + self.batch_size]
+            batch = [texts[i] for i in batch_idx]
+            lengths = [_estimate_tokens(text) for text in batch]
+            encoded = self.model.encode(batch, batch_size=len(batch), convert_to_numpy=True,
+                                        show_progress_bar=False)
+            for i, vector in zip(batch_idx, encoded):
+                vectors[i] = vector.astype(np.float32)
+            self.batches += 1
+            self.padded_tokens += max(lengths) * len(lengths)
+            self.real_tokens += sum(lengths)
+        return np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+        with self._lock:
+            self.texts += len(texts)
+            known = {key: self._cache[key] for key in keys if key in self._cache}
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in known:
+                missing.setdefault(key, text)
+        with self._lock:
+            self.duplicates += len(texts) - len(missing)
+
+        if missing:
+            encoded = self._encode(list(missing.values()))
+            with self._lock:
+                for key, vector in zip(missing.keys(), encoded):
+                    known[key] = vector
+                    self._cache[key] = vector
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return [known[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def clear_cache(self) -> None:
+        """Free the dedup cache once the run is over (up to dedup_cache_size vectors)."""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "texts": self.texts,
+            "duplicates": self.duplicates,
+            "dedup_ratio": self.duplicates / self.texts if self.texts else 0.0,
+            "batches": self.batches,
+            # Share of the padded batch that is real text; 1.0 means no padding at all
+            "padding_efficiency": self.real_tokens / self.padded_tokens if self.padded_tokens else 1.0,
+            "quantized": self.quantize,
+        }
@@ -0,0 +1,120 @@
+# ingest_manifest.py
+
+import os
+import json
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path(persist_directory: str) -> str:
+    """The manifest sits next to the index, not inside it (like the BM25 and trials sidecars)."""
+    return persist_directory.rstrip("/\\") + ".manifest.json"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    """One source item (a PDF page or a trial row): its content hash and the chunk ids it produced."""
+    hash: str
+    ids: List[str]
+
+
+@dataclass
+class IngestManifest:
+    """
+    What is currently in an index, keyed by source item. Re-ingestion compares fresh
+    content hashes against it to embed only new or changed items and delete the
+    chunks of items that disappeared.
+    """
+    source_hash: Optional[str] = None
+    entries: Dict[str, ManifestEntry] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IngestManifest"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read ingest manifest '{path}', ignoring it: {e}")
+            return None
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        entries = {key: ManifestEntry(**entry) for key, entry in data.get("entries", {}).items()}
+        return cls(source_hash=data.get("source_hash"), entries=entries)
+
+    def save(self, path: str) -> None:
+        data = {
+            "version": MANIFEST_VERSION,
+            "source_hash": self.source_hash,
+            "entries": {key: {"hash": entry.hash, "ids": entry.ids} for key, entry in self.entries.items()},
+        }
+        # Write then rename so a crash never leaves a half-written manifest
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+
+class ChangePlan:
+    """Classifies items against the previous manifest and keeps the tallies for the report."""
+
+    def __init__(self, previous: Optional[IngestManifest]):
+        self.previous = previous
+        self.added: List[str] = []
+        self.changed: List[str] = []
+        self.unchanged: List[str] = []
+        self.removed: List[str] = []
+        self._seen = set()
+
+    def classify(self, key: str, item_hash: str) -> str:
+        """"new", "changed" or "unchanged" for one item of the current source."""
+        self._seen.add(key)
+        entry = self.previous.entries.get(key) if self.previous is not None else None
+        if entry is None:
+            self.added.append(key)
+            return "new"
+        if entry.hash != item_hash:
+            self.changed.append(key)
+            return "changed"
+        self.unchanged.append(key)
+        return "unchanged"
+
+    def finish(self) -> List[str]:
+        """Keys of previously ingested items that are gone from the source."""
+        if self.previous is not None:
+            self.removed = [key for key in self.previous.entries if key not in self._seen]
+        return self.removed
+
+    def counts(self) -> Dict[str, int]:
+        return {"new": len(self.added), "changed": len(self.changed),
+                "removed": len(self.removed), "unchanged": len(self.unchanged)}
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def report(self, name: str, dry_run: bool = False) -> None:
+        suffix = " (dry run, nothing written)" if dry_run else ""
+        print(f"🧮 {name}: {len(self.added)} new, {len(self.changed)} changed, "
+              f"{len(self.removed)} removed, {len(self.unchanged)} unchanged{suffix}")
+        if dry_run:
+            for label, keys in (("new", self.added), ("changed", self.changed), ("removed", self.removed)):
+                if keys:
+                    shown = ", ".join(keys[:20]) + (f", ... (+{len(keys) - 20})" if len(keys) > 20 else "")
+                    print(f"   {label}: {shown}")
@@ -1,8 +1,24 @@
 # main.py
 
 import os
-from fastapi import FastAPI
-from pydantic import BaseModel
+import json
+import time
+from contextlib import aclosing
+from fastapi import FastAPI, HTTPException, Query, Request
+from typing import Any, Dict, List, Literal, Optional
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+
+import telemetry
+import deadline
+import query_log
+from agents.context_packing import packing_stats
+from agents.reranker import reranker_stats
+from single_flight import single_flight_stats
+from batch_chat import BATCH_MAX_QUESTIONS, BatchRunner
+from series_store import SERIES_MAX_AGE_SECONDS, SeriesNotFound, SeriesPayload, get_series_store
+from index_jobs import (IngestJobBusy, IngestJobError, IngestJobManager, IngestTarget, current_index_dir,
+                        ingest_food, ingest_clinical)
 
 from orchestrator import Orchestrator
 from fastapi import FastAPI
@@ -13,23 +29,55 @@ import requests
 from dotenv import load_dotenv
 load_dotenv()
 
-# Paths to your persisted vectorstores
-UN_VECTORSTORE_DIR = "un_food_index"
-CLINICAL_VECTORSTORE_DIR = "clinical_index"
+# Paths to your persisted vectorstores (point either at an mmap export to switch that agent's backend)
+UN_VECTORSTORE_DIR = os.getenv("UN_VECTORSTORE_DIR", "un_food_index")
+CLINICAL_VECTORSTORE_DIR = os.getenv("CLINICAL_VECTORSTORE_DIR", "clinical_index")
 
-# Initialize orchestrator
+# Initialize orchestrator (on the latest version built by /ingest, if any)
 orchestrator = Orchestrator(
-    food_vectorstore_dir=UN_VECTORSTORE_DIR,
-    clinical_vectorstore_dir=CLINICAL_VECTORSTORE_DIR
+    food_vectorstore_dir=current_index_dir(UN_VECTORSTORE_DIR),
+    clinical_vectorstore_dir=current_index_dir(CLINICAL_VECTORSTORE_DIR)
 )
 
+batch_runner = BatchRunner(orchestrator)
+
+ingest_jobs = IngestJobManager({
+    "food": IngestTarget(orchestrator.food_agent, UN_VECTORSTORE_DIR, ingest_food, "data/un_food_security.pdf"),
+    "clinical": IngestTarget(orchestrator.clinical_agent, CLINICAL_VECTORSTORE_DIR, ingest_clinical,
+                             "data/clinical_studies.pdf"),
+})
+
+# Dashboard time series, loaded and serialized once at startup
+series_store = get_series_store()
+
 app = FastAPI()
 
 class ChatRequest(BaseModel):
     question: str
+    include_timings: bool = False
+    # Time budget for the answer; CHAT_DEADLINE_SECONDS when omitted
+    deadline_seconds: Optional[float] = Field(None, gt=0)
 
 class ChatResponse(BaseModel):
     answer: str
+    # Per-stage breakdown, only when the request sets include_timings
+    timings: Optional[Dict[str, Any]] = None
+    # How far the answer was degraded to meet the deadline (deadline.DEGRADATION_LEVELS)
+    degradation: str = "none"
+    # Index version per agent the answer was retrieved from (current versions if none was searched)
+    index_versions: Optional[Dict[str, str]] = None
+
+class BatchChatRequest(BaseModel):
+    questions: List[str]
+    include_timings: bool = False
+    # Server-sent "result" events as items finish; false returns one JSON body in question order
+    stream: bool = True
+
+class IngestRequest(BaseModel):
+    target: Literal["food", "clinical"]
+    # PDF under INGEST_DATA_DIR; defaults to the target's usual source file
+    pdf_path: Optional[str] = None
+    force: bool = False
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -38,90 +86,211 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Endpoint: US GDP over 100 years (values in nominal trillions USD)
-@app.get("/api/gdp-usa-100yrs")
-def get_gdp_usa_100yrs():
-    data = [
-        {"year": 1925, "gdp": 1.0},
-        {"year": 1930, "gdp": 0.9},
-        {"year": 1935, "gdp": 1.1},
-        {"year": 1940, "gdp": 1.2},
-        {"year": 1945, "gdp": 1.4},
-        {"year": 1950, "gdp": 1.6},
-        {"year": 1955, "gdp": 1.7},
-        {"year": 1960, "gdp": 2.0},
-        {"year": 1965, "gdp": 2.2},
-        {"year": 1970, "gdp": 2.1},  # slight dip
-        {"year": 1975, "gdp": 2.3},
-        {"year": 1980, "gdp": 2.8},
-        {"year": 1985, "gdp": 2.7},  # minor drop
-        {"year": 1990, "gdp": 3.2},
-        {"year": 1995, "gdp": 3.8},
-        {"year": 2000, "gdp": 4.5},
-        {"year": 2005, "gdp": 4.3},  # slight dip
-        {"year": 2010, "gdp": 5.0},
-        {"year": 2015, "gdp": 5.8},
-        {"year": 2020, "gdp": 5.6},  # dip during downturn
-        {"year": 2025, "gdp": 6.2}
-    ]
-    return {"data": data}
-
-# Endpoint: Global CO₂ Emissions over 50 years (values in million metric tons)
-@app.get("/api/co2-world-50yrs")
-def get_co2_world_50yrs():
-    data = [
-        {"year": 1975, "co2": 15000},
-        {"year": 1980, "co2": 15700},
-        {"year": 1985, "co2": 15500},  # slight dip
-        {"year": 1990, "co2": 16000},
-        {"year": 1995, "co2": 15800},  # dip
-        {"year": 2000, "co2": 16500},
-        {"year": 2005, "co2": 16200},  # slight decline
-        {"year": 2010, "co2": 16800},
-        {"year": 2015, "co2": 16500},  # small drop
-        {"year": 2020, "co2": 17000},
-        {"year": 2025, "co2": 16800}   # slight decline
-    ]
-    return {"data": data}
-
-# Endpoint: Global Agricultural Land Area over 50 years (values in square kilometers)
-@app.get("/api/agri-land-world-50yrs")
-def get_agri_land_world_50yrs():
-    data = [
-        {"year": 1975, "agriLand": 49500000},
-        {"year": 1980, "agriLand": 49480000},  # slight dip
-        {"year": 1985, "agriLand": 49520000},  # rise
-        {"year": 1990, "agriLand": 49500000},  # dip
-        {"year": 1995, "agriLand": 49530000},  # rise
-        {"year": 2000, "agriLand": 49510000},  # dip
-        {"year": 2005, "agriLand": 49540000},  # rise
-        {"year": 2010, "agriLand": 49520000},  # slight dip
-        {"year": 2015, "agriLand": 49550000},  # rise
-        {"year": 2020, "agriLand": 49530000},  # dip
-        {"year": 2025, "agriLand": 49560000}   # rise
-    ]
-    return {"data": data}
-
-# Endpoint: Fourth Dataset remains unchanged (example data)
-@app.get("/api/fourth-dataset")
-def get_fourth_dataset():
-    data = [
-        {"year": 1975, "value": 100},
-        {"year": 1980, "value": 110},
-        {"year": 1985, "value": 120},
-        {"year": 1990, "value": 130},
-        {"year": 1995, "value": 140},
-        {"year": 2000, "value": 150},
-        {"year": 2005, "value": 160},
-        {"year": 2010, "value": 170},
-        {"year": 2015, "value": 180},
-        {"year": 2020, "value": 190},
-        {"year": 2025, "value": 200}
-    ]
-    return {"data": data}
+def _series_response(payload: SeriesPayload, request: Request) -> Response:
+    """Serve a precomputed payload: 304 on a matching ETag, the gzip body when the client accepts it."""
+    gzip_ok = payload.gzipped is not None and "gzip" in request.headers.get("accept-encoding", "")
+    # Each encoding is a different representation, so it gets its own strong ETag
+    etag = payload.etag[:-1] + '-gzip"' if gzip_ok else payload.etag
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={SERIES_MAX_AGE_SECONDS}", "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    if gzip_ok:
+        return Response(content=payload.gzipped, media_type="application/json",
+                        headers={**headers, "Content-Encoding": "gzip"})
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
+def _check_year_range(start: Optional[int], end: Optional[int]) -> None:
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail=f"start ({start}) is after end ({end}).")
+
+@app.get("/api/series")
+def series_batch_endpoint(request: Request, ids: Optional[str] = None, start: Optional[int] = None,
+                          end: Optional[int] = None, max_points: Optional[int] = Query(None, ge=2)):
+    """
+    Several series in one response (?ids=a,b,c), each sliced to [start, end] and
+    downsampled to max_points. Without ids, the catalogue of available series.
+    """
+    if not ids:
+        return _series_response(series_store.catalogue, request)
+    _check_year_range(start, end)
+    series_ids = [series_id.strip() for series_id in ids.split(",") if series_id.strip()]
+    try:
+        payload = series_store.batch_payload(series_ids, start, end, max_points)
+    except SeriesNotFound as e:
+        raise HTTPException(status_code=404, detail=f"Unknown series {e}.")
+    return _series_response(payload, request)
+
+@app.get("/api/series/{series_id}")
+def series_endpoint(series_id: str, request: Request, start: Optional[int] = None, end: Optional[int] = None,
+                    max_points: Optional[int] = Query(None, ge=2)):
+    """One series as year/value columns, optionally sliced to [start, end] and downsampled to max_points."""
+    _check_year_range(start, end)
+    try:
+        payload = series_store.payload(series_id, start, end, max_points)
+    except SeriesNotFound:
+        raise HTTPException(status_code=404, detail=f"Unknown series '{series_id}'.")
+    return _series_response(payload, request)
+
+def _legacy_series_endpoint(series_id: str):
+    # The original dashboard URLs, now served from the store in their {"data": [{"year": ..., key: ...}]} shape
+    def endpoint(request: Request, start: Optional[int] = None, end: Optional[int] = None,
+                 max_points: Optional[int] = Query(None, ge=2)):
+        _check_year_range(start, end)
+        return _series_response(series_store.payload(series_id, start, end, max_points, legacy=True), request)
+    return endpoint
+
+for _series in series_store.series.values():
+    if _series.legacy_path:
+        app.add_api_route(_series.legacy_path, _legacy_series_endpoint(_series.id), methods=["GET"],
+                          name=f"legacy_{_series.id}")
 
 @app.post("/chat", response_model=ChatResponse)
-def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest):
     user_question = request.question
-    answer = orchestrator.run(user_question)
-    return ChatResponse(answer=answer)
+    started_at, start = time.time(), time.perf_counter()
+    # Async path: the worker is released while classification, retrieval and generation are awaited
+    with telemetry.trace() as request_trace, deadline.scope(request.deadline_seconds) as request_deadline:
+        try:
+            answer = await orchestrator.arun(user_question)
+        except BaseException:
+            query_log.log_request(user_question, started_at, time.perf_counter() - start, trace=request_trace,
+                                  degradation=request_deadline.level, status="error")
+            raise
+    query_log.log_request(user_question, started_at, time.perf_counter() - start, trace=request_trace,
+                          degradation=request_deadline.level)
+    timings = request_trace.breakdown() if request.include_timings else None
+    index_versions = {key.split(":", 1)[1]: value for key, value in request_trace.annotations.items()
+                      if key.startswith("index_version:")}
+    return ChatResponse(answer=answer, timings=timings, degradation=request_deadline.level,
+                        index_versions=index_versions or orchestrator.index_versions())
+
+def _collect_stats() -> Dict[str, Any]:
+    return {
+        "router": orchestrator.router.stats(),
+        "answer_cache": orchestrator.answer_cache.stats() if orchestrator.answer_cache else None,
+        "embeddings": orchestrator.router.embedding_function.stats(),
+        "speculative_retrieval": orchestrator.speculation_stats(),
+        "context_packing": packing_stats.stats(),
+        "reranker": reranker_stats(),
+        "single_flight": single_flight_stats(),
+        "index_swaps": {"food": orchestrator.food_agent.index_swaps,
+                        "clinical": orchestrator.clinical_agent.index_swaps},
+        "ingest_jobs": ingest_jobs.stats(),
+        "query_log": query_log.query_log_stats(),
+        "series_store": series_store.stats(),
+        "batch": batch_runner.stats(),
+        "web_search_cache": orchestrator.web_agent.search.stats() if hasattr(orchestrator.web_agent.search, "stats") else None,
+    }
+
+@app.get("/stats")
+def stats_endpoint():
+    """Router path counters, semantic answer cache counters and embedding service stats."""
+    return _collect_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus text format: per-stage latency histograms plus the /stats counters as gauges."""
+    index_info = [{"agent": agent, "version": version} for agent, version in orchestrator.index_versions().items()]
+    return (telemetry.histograms.render() + telemetry.render_gauges(_collect_stats())
+            + telemetry.render_info("index", index_info))
+
+@app.post("/ingest", status_code=202)
+def ingest_endpoint(request: IngestRequest):
+    """
+    Start a background ingest: the target's index is rebuilt incrementally next to
+    the live one and swapped in when done. Poll GET /ingest/{job_id} for the outcome.
+    """
+    try:
+        job = ingest_jobs.submit(request.target, request.pdf_path, force=request.force)
+    except IngestJobError as e:
+        raise HTTPException(status_code=409 if isinstance(e, IngestJobBusy) else 400, detail=str(e))
+    return job.to_dict()
+
+@app.get("/ingest/{job_id}")
+def ingest_status_endpoint(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingest job '{job_id}'.")
+    return job.to_dict()
+
+def _sse_event(event: str, data) -> str:
+    """Format one server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    """
+    Server-sent events version of /chat: streams the route, the sources and then
+    answer tokens. The final "done" event carries the degradation level and, with
+    include_timings, the per-stage breakdown. If the client goes away the
+    orchestrator stream is closed, which cancels the in-flight Gemini call.
+    """
+    async def event_source():
+        # The whole stream is iterated by one task, so the trace and deadline are set and reset in its context
+        with telemetry.trace() as request_trace, deadline.scope(request.deadline_seconds) as request_deadline:
+            async with aclosing(orchestrator.astream(request.question)) as events:
+                async for event in events:
+                    if await http_request.is_disconnected():
+                        print("Client disconnected from /chat/stream; cancelling upstream call.")
+                        break
+                    data = event["data"]
+                    if event["event"] == "done":
+                        data = {**data, "degradation": request_deadline.level}
+                        if request.include_timings:
+                            data["timings"] = request_trace.breakdown()
+                    yield _sse_event(event["event"], data)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _batch_summary(results, started: float) -> Dict[str, Any]:
+    return {
+        "total": len(results),
+        "ok": sum(1 for result in results if result["status"] == "ok"),
+        "errors": sum(1 for result in results if result["status"] != "ok"),
+        "cached": sum(1 for result in results if result["cached"]),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 2),
+    }
+
+@app.post("/chat/batch")
+async def chat_batch_endpoint(request: BatchChatRequest, http_request: Request):
+    """
+    Answer a list of questions together (see batch_chat.BatchRunner). Streams one
+    "result" event per question as it finishes, then "done" with a summary; a
+    failed question comes back with status "error" without failing the batch.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty.")
+    blank = [i for i, question in enumerate(request.questions) if not question.strip()]
+    if blank:
+        raise HTTPException(status_code=400, detail=f"questions must not be blank (indices {blank[:20]}).")
+    if len(request.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch.")
+    started = time.perf_counter()
+
+    if not request.stream:
+        async with aclosing(batch_runner.run(request.questions, request.include_timings)) as results:
+            collected = [result async for result in results]
+        collected.sort(key=lambda result: result["index"])
+        return {"results": collected, "summary": _batch_summary(collected, started)}
+
+    async def event_source():
+        collected = []
+        async with aclosing(batch_runner.run(request.questions, request.include_timings)) as results:
+            async for result in results:
+                if await http_request.is_disconnected():
+                    print("Client disconnected from /chat/batch; cancelling the rest of the batch.")
+                    return
+                collected.append(result)
+                yield _sse_event("result", result)
+        yield _sse_event("done", _batch_summary(collected, started))
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
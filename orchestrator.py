@@ -1,19 +1,35 @@
 # orchestrator.py
 
 import os
-from typing import Literal, Dict, Any # Added Dict, Any for type hinting invoke results
+import asyncio
+import threading
+from contextlib import aclosing
+from typing import Literal, Dict, Any, AsyncIterator, List, Optional, Tuple # Added Dict, Any for type hinting invoke results
 from langchain_google_genai import ChatGoogleGenerativeAI
 # Ensure these imports point to your potentially updated agent classes
 from agents.food_security_agent import FoodSecurityAgent
 from agents.clinical_agent import ClinicalAgent
 from agents.web_agent import WebAgent # Assumes this agent was updated as per previous suggestion
+from question_router import EmbeddingRouter, RouteDecision
+from answer_cache import WEB_TTL_SECONDS, SemanticAnswerCache
+import telemetry
+import deadline
+from single_flight import get_flight, normalise_question
+from agents.rag_utils import doc_to_source, astream_tokens, passages_answer
+from agents.multi_domain import retrieve_multi, aretrieve_multi, build_multi_domain_prompt
 
 class Orchestrator:
     def __init__(self,
                  food_vectorstore_dir: str,
-                 clinical_vectorstore_dir: str):
+                 clinical_vectorstore_dir: str,
+                 speculative_retrieval: Optional[bool] = None,
+                 multi_domain_routing: Optional[bool] = None):
         """
         Initialize and store references to each agent.
+        speculative_retrieval: start food and clinical retrieval while the classifier LLM
+        decides a low-confidence route (async path only). Defaults to the SPECULATIVE_RETRIEVAL env var.
+        multi_domain_routing: let questions that span food and clinical retrieve from both
+        indexes and get one combined answer. Defaults to the MULTI_DOMAIN_ROUTING env var.
         """
         google_api_key = os.getenv("gemini_api")
         if not google_api_key:
@@ -33,12 +49,41 @@ class Orchestrator:
             google_api_key=google_api_key,
         )
 
-    def classify_question(self, question: str) -> Literal["food", "clinical", "web"]:
+        # Local nearest-centroid router over the mpnet model the agents already loaded;
+        # the classifier LLM above is only called when the router is not confident.
+        self.router = EmbeddingRouter(self.food_agent.embedding_function)
+
+        # Semantic answer cache, one scope per agent; a scope is dropped when its agent swaps to a new index.
+        # Web answers have no index version, so they get the short WEB_TTL_SECONDS instead
+        self.answer_cache = None
+        if os.getenv("SEMANTIC_CACHE_ENABLED", "1") != "0":
+            self.answer_cache = SemanticAnswerCache(version_fns={
+                "food": lambda: self.food_agent.index_version,
+                "clinical": lambda: self.clinical_agent.index_version,
+                "web": lambda: "static",
+            }, scope_ttls={"web": WEB_TTL_SECONDS})
+
+        if speculative_retrieval is None:
+            speculative_retrieval = os.getenv("SPECULATIVE_RETRIEVAL", "1") != "0"
+        self.speculative_retrieval = speculative_retrieval
+        self._speculation_lock = threading.Lock()
+        # started/used per retrieval; cancelled/discarded are the wasted speculative work
+        self._speculation_counts = {"started": 0, "used": 0, "cancelled": 0, "discarded": 0}
+
+        if multi_domain_routing is None:
+            multi_domain_routing = os.getenv("MULTI_DOMAIN_ROUTING", "1") != "0"
+        self.multi_domain_routing = multi_domain_routing
+
+        # Concurrent identical questions / classifier prompts share one in-flight call
+        self.question_flight = get_flight("question")
+        self.llm_flight = get_flight("llm")
+
+    def _classification_prompt(self, question: str) -> str:
         """
-        Use an LLM to classify the question into one of three categories.
+        Build the one-word classification prompt shared by the sync and async paths.
         """
         # Prompt asking for strictly one word response
-        prompt = f"""Classify the following user question into one of three categories:
+        return f"""Classify the following user question into one of three categories:
         1. 'food': Related to UN Food Security, agriculture, food aid, malnutrition statistics.
         2. 'clinical': Related to medical data, clinical trials, healthcare procedures, diseases.
         3. 'web': General knowledge, current events, or topics not covered by 'food' or 'clinical'.
@@ -47,44 +92,400 @@ class Orchestrator:
 
         Respond with only the single category word: food, clinical, or web."""
 
+    def _parse_category(self, response) -> Literal["food", "clinical", "web"]:
+        """
+        Map the classifier LLM response onto one of the three categories.
+        """
+        # Access the string content from the response object (e.g., AIMessage)
+        raw_response = response.content.strip().lower()
+        print(f"Classifier raw response: '{raw_response}'") # Optional: for debugging
+
+        # Prefer exact matching now that the prompt is stricter
+        if raw_response == "food":
+            return "food"
+        elif raw_response == "clinical":
+            return "clinical"
+        elif raw_response == "web":
+             return "web"
+        else:
+            # Fallback if the LLM didn't respond as expected
+            print(f"Warning: Classifier returned unexpected response: '{raw_response}'. Defaulting to 'web'.")
+            return "web"
+
+    def llm_classify_question(self, question: str) -> Literal["food", "clinical", "web"]:
+        """
+        Use an LLM to classify the question into one of three categories.
+        """
+        prompt = self._classification_prompt(question)
+
         try:
             # Use invoke() for the LLM call, as direct call is deprecated
-            response = self.classifier_llm.invoke(prompt)
-            # Access the string content from the response object (e.g., AIMessage)
-            raw_response = response.content.strip().lower()
-            print(f"Classifier raw response: '{raw_response}'") # Optional: for debugging
-
-            # Prefer exact matching now that the prompt is stricter
-            if raw_response == "food":
-                return "food"
-            elif raw_response == "clinical":
-                return "clinical"
-            elif raw_response == "web":
-                 return "web"
-            else:
-                # Fallback if the LLM didn't respond as expected
-                print(f"Warning: Classifier returned unexpected response: '{raw_response}'. Defaulting to 'web'.")
-                return "web"
+            with telemetry.span("llm_classification"):
+                response = self.llm_flight.do(("classifier", prompt), lambda: self.classifier_llm.invoke(prompt),
+                                              timeout=self._flight_timeout())
+            return self._parse_category(response)
 
         except Exception as e:
             print(f"Error during classification LLM call: {e}")
             # Default fallback in case of error
             return "web"
 
-    def run(self, question: str) -> str:
+    async def allm_classify_question(self, question: str) -> Literal["food", "clinical", "web"]:
         """
-        Classify the question and route to the correct agent's invoke method.
+        Async version of llm_classify_question using the LLM client's ainvoke.
         """
-        category = self.classify_question(question)
-        print(f"Routing question to: {category}_agent") # Optional: for debugging
+        prompt = self._classification_prompt(question)
+
+        try:
+            with telemetry.span("llm_classification"):
+                response = await self.llm_flight.ado(("classifier", prompt), lambda: self.classifier_llm.ainvoke(prompt))
+            return self._parse_category(response)
+
+        except Exception as e:
+            print(f"Error during async classification LLM call: {e}")
+            return "web"
+
+    def _embed_question(self, question: str):
+        """
+        Embed the question once for both the answer cache and the router (None on failure).
+        """
+        try:
+            return self.router.embed(question)
+        except Exception as e:
+            print(f"Error embedding question: {e}")
+            return None
+
+    def route_local(self, question: str, vector=None) -> RouteDecision:
+        """
+        Embedding-router decision, degrading to an LLM-fallback decision if embedding fails.
+        """
+        try:
+            return self.router.route(question, vector, multi_label=self.multi_domain_routing)
+        except Exception as e:
+            print(f"Error during embedding routing, falling back to LLM: {e}")
+            return RouteDecision(category="web", path="llm_fallback", confidence=0.0)
+
+    def _finish_route(self, decision: RouteDecision, span_tags: Dict[str, str]) -> RouteDecision:
+        if not decision.categories or decision.path == "llm_fallback":
+            decision.categories = [decision.category]
+        route = "+".join(decision.categories)
+        self.router.record(decision.path)
+        telemetry.set_route(route)
+        span_tags.update(route=route, path=decision.path)
+        print(f"Routed to '{route}' via {decision.path} (confidence {decision.confidence:.2f})")
+        return decision
+
+    @staticmethod
+    def _heuristic_route(decision: RouteDecision) -> None:
+        """
+        Not enough budget for the classifier LLM: keep the router's best guess.
+        """
+        decision.path = "heuristic"
+        deadline.degrade("heuristic_route")
+
+    @staticmethod
+    async def _within_deadline(awaitable, reserve: float = 0.0):
+        """
+        Await with a timeout of whatever is left of the request deadline minus `reserve`
+        (no timeout without a deadline). Raises asyncio.TimeoutError when it runs out.
+        """
+        budget = deadline.remaining()
+        if budget is None:
+            return await awaitable
+        return await asyncio.wait_for(awaitable, timeout=max(0.0, budget - reserve))
+
+    @staticmethod
+    def _docs_for_budget(docs: List[Any]) -> List[Any]:
+        """
+        Trim the context to the top REDUCED_K documents when the budget is running low,
+        so the generation call has a shorter prompt to get through.
+        """
+        if deadline.allows(deadline.FULL_CONTEXT_MIN_SECONDS) or len(docs) <= deadline.REDUCED_K:
+            return docs
+        deadline.degrade("reduced_k")
+        return docs[:deadline.REDUCED_K]
+
+    @staticmethod
+    def _passages_fallback(agent, question: str, docs: List[Any]) -> str:
+        """
+        Last resort before the deadline: the clinical trials table if it can answer,
+        otherwise the top retrieved passages with no generated answer.
+        """
+        structured = agent.answer_from_table(question) if hasattr(agent, "answer_from_table") else None
+        if structured is not None:
+            return structured
+        deadline.degrade("passages_only")
+        return passages_answer(docs)
+
+    @staticmethod
+    def _is_degraded() -> bool:
+        # A heuristic route still produces a full answer; anything further does not
+        return deadline.level() not in ("none", "heuristic_route")
+
+    def route_question(self, question: str, vector=None) -> RouteDecision:
+        """
+        Classify locally with the embedding router and only call the classifier LLM
+        when its confidence is below the threshold. The decision records the path taken.
+        """
+        with telemetry.span("classification") as span_tags:
+            decision = self.route_local(question, vector)
+            if decision.path == "llm_fallback":
+                if deadline.allows(deadline.CLASSIFIER_MIN_SECONDS):
+                    decision.category = self.llm_classify_question(question)
+                else:
+                    self._heuristic_route(decision)
+            return self._finish_route(decision, span_tags)
+
+    async def aroute_question(self, question: str, vector=None) -> RouteDecision:
+        """
+        Async version of route_question; the query embedding runs in a worker thread.
+        """
+        with telemetry.span("classification") as span_tags:
+            decision = await asyncio.to_thread(self.route_local, question, vector)
+            return await self._aresolve_route(question, decision, span_tags)
 
-        agent_to_use = None
+    async def _aresolve_route(self, question: str, decision: RouteDecision,
+                              span_tags: Dict[str, str]) -> RouteDecision:
+        """Ask the classifier LLM about a low-confidence local decision, budget permitting."""
+        if decision.path == "llm_fallback":
+            if deadline.allows(deadline.CLASSIFIER_MIN_SECONDS):
+                try:
+                    # Leave enough of the budget for generation once the classifier answers
+                    decision.category = await self._within_deadline(
+                        self.allm_classify_question(question), reserve=deadline.GENERATION_MIN_SECONDS)
+                except asyncio.TimeoutError:
+                    self._heuristic_route(decision)
+            else:
+                self._heuristic_route(decision)
+        return self._finish_route(decision, span_tags)
+
+    def classify_question(self, question: str) -> Literal["food", "clinical", "web"]:
+        """
+        Classify the question into one of three categories (router first, LLM fallback).
+        """
+        return self.route_question(question).category
+
+    async def aclassify_question(self, question: str) -> Literal["food", "clinical", "web"]:
+        """
+        Async version of classify_question.
+        """
+        return (await self.aroute_question(question)).category
+
+    def index_versions(self) -> Dict[str, str]:
+        """Version of the index each retrieval agent is currently serving from."""
+        return {"food": self.food_agent.index_version, "clinical": self.clinical_agent.index_version}
+
+    def agent_for(self, category: str):
+        """
+        Return the agent that handles the given category (web agent by default).
+        """
         if category == "food":
-            agent_to_use = self.food_agent
+            return self.food_agent
         elif category == "clinical":
-            agent_to_use = self.clinical_agent
+            return self.clinical_agent
         else: # Default to web agent
-            agent_to_use = self.web_agent
+            return self.web_agent
+
+    def _count_speculation(self, key: str, n: int = 1) -> None:
+        with self._speculation_lock:
+            self._speculation_counts[key] += n
+
+    def speculation_stats(self) -> Dict[str, Any]:
+        """Speculative retrieval counters; wasted = cancelled + discarded."""
+        with self._speculation_lock:
+            stats: Dict[str, Any] = dict(self._speculation_counts)
+        stats["enabled"] = self.speculative_retrieval
+        stats["wasted"] = stats["cancelled"] + stats["discarded"]
+        return stats
+
+    async def _aroute_with_speculation(self, question: str, vector) -> Tuple[RouteDecision, Optional[List[Any]]]:
+        """
+        Route the question, and while the classifier LLM is consulted about a
+        low-confidence one, retrieve from both stores in parallel. Confident local
+        routes take microseconds, so they are not worth a search of the other store.
+        Returns the decision and the chosen agent's documents (None for the web
+        route, when nothing was speculated, or if the speculative search failed).
+        """
+        if not self.speculative_retrieval:
+            return await self.aroute_question(question, vector), None
+
+        with telemetry.span("classification") as span_tags:
+            decision = await asyncio.to_thread(self.route_local, question, vector)
+            if decision.path != "llm_fallback" or not deadline.allows(deadline.CLASSIFIER_MIN_SECONDS):
+                return await self._aresolve_route(question, decision, span_tags), None
+
+            tasks = {
+                "food": asyncio.create_task(self.food_agent.aretrieve(question)),
+                "clinical": asyncio.create_task(self.clinical_agent.aretrieve(question)),
+            }
+            self._count_speculation("started", len(tasks))
+            try:
+                decision = await self._aresolve_route(question, decision, span_tags)
+            except BaseException:
+                for task in tasks.values():
+                    task.cancel()
+                raise
+
+        # Fan-out routes re-query both stores with scores, so neither speculative result is used
+        chosen = None if decision.is_multi else tasks.pop(decision.category, None)
+        for task in tasks.values():
+            if task.done():
+                self._count_speculation("discarded")
+            else:
+                # The Chroma search may already be running in a thread; cancelling only drops the result
+                task.cancel()
+                self._count_speculation("cancelled")
+            # Retrieve the outcome so failed/cancelled tasks are not reported as never retrieved
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        if chosen is None:
+            return decision, None
+        try:
+            docs = await chosen
+        except Exception as e:
+            print(f"Speculative retrieval for '{decision.category}' failed, retrieving normally: {e}")
+            return decision, None
+        self._count_speculation("used")
+        return decision, docs
+
+    def _cache_lookup(self, vector):
+        if self.answer_cache is None or vector is None:
+            return None
+        with telemetry.span("cache_lookup") as span_tags:
+            hit = self.answer_cache.lookup(vector)
+            span_tags["outcome"] = "hit" if hit is not None else "miss"
+        if hit is not None:
+            telemetry.set_route(hit.scope)
+            print(f"Answer cache hit ({hit.scope}, similarity {hit.similarity:.3f}) for: '{hit.question[:50]}'")
+        return hit
+
+    def store_answer(self, category: str, question: str, vector, answer: str) -> None:
+        """
+        Cache an answer under its route's scope. Failed answers and live web searches are skipped.
+        """
+        # Agents report failures as answer text; never cache those
+        if self.answer_cache is None or vector is None or self.answer_outcome(answer) != "ok":
+            return
+        # Questions the web agent sends to live search ("latest", "today", ...) go stale within minutes
+        if category == "web" and self.web_agent.needs_tools(question):
+            return
+        self.answer_cache.store(category, question, vector, answer)
+
+    @staticmethod
+    def _question_key(question: str) -> Tuple[str, Any]:
+        # A caller with a longer deadline must not inherit a leader's degraded or timed-out answer
+        return normalise_question(question), deadline.budget_bucket()
+
+    def run(self, question: str) -> str:
+        """
+        Answer from the semantic cache when possible; otherwise classify the question,
+        route it to the correct agent's invoke method and cache the answer.
+        Concurrent calls with the same normalised question and a similar remaining
+        deadline share one execution.
+        Under a request deadline (see deadline.scope) the answer may be degraded.
+        """
+        try:
+            answer, level, leader_trace = self.question_flight.do(
+                self._question_key(question), lambda: self._run_once(question), timeout=self._flight_timeout())
+        except TimeoutError:
+            print(f"Deadline exceeded waiting for a coalesced answer to: '{question[:50]}'")
+            deadline.degrade("timed_out")
+            return passages_answer([])
+        # Coalesced callers got the leader's answer, so they report its degradation and stages too
+        deadline.degrade(level)
+        telemetry.adopt_trace(leader_trace)
+        return answer
+
+    @staticmethod
+    def _flight_timeout() -> float:
+        """How long a thread may wait on a coalesced call: its deadline plus the grace period."""
+        left = deadline.remaining()
+        return (deadline.DEFAULT_DEADLINE_SECONDS if left is None else left) + deadline.GRACE_SECONDS
+
+    def _run_once(self, question: str) -> Tuple[str, str, telemetry.RequestTrace]:
+        with telemetry.trace() as request_trace, telemetry.span("request") as span_tags:
+            vector = self._embed_question(question)
+            hit = self._cache_lookup(vector)
+            if hit is not None:
+                span_tags["outcome"] = "cache_hit"
+                return hit.answer, deadline.level(), request_trace
+
+            decision = self.route_question(question, vector)
+            category = decision.category
+            with telemetry.span("agent"):
+                if decision.is_multi:
+                    answer = self._run_multi(question, decision.categories)
+                else:
+                    answer = self._run_agent(category, question)
+            if self._is_degraded():
+                span_tags["outcome"] = "degraded"
+            else:
+                span_tags["outcome"] = self.answer_outcome(answer)
+                self.store_answer(category, question, vector, answer)
+            return answer, deadline.level(), request_trace
+
+    @staticmethod
+    def answer_outcome(answer: str) -> str:
+        # Agents report failures as answer text rather than raising
+        if not answer or answer.startswith("An error occurred") or answer.startswith("Error:"):
+            return "error"
+        return "ok"
+
+    def _run_multi(self, question: str, categories: List[str]) -> str:
+        """
+        Fan-out route: query the chosen retrievers concurrently, merge and dedupe the
+        hits, then make a single generation call over the combined context.
+        """
+        print(f"Fanning question out to: {', '.join(categories)}")
+        agents = {category: self.agent_for(category) for category in categories}
+        try:
+            docs = self._docs_for_budget(retrieve_multi(agents, question))
+            if not deadline.allows(deadline.GENERATION_MIN_SECONDS):
+                deadline.degrade("passages_only")
+                return passages_answer(docs)
+            with telemetry.span("generation"):
+                prompt = build_multi_domain_prompt(question, docs)
+                response = self.llm_flight.do(("multi_domain", prompt), lambda: self.food_agent.llm.invoke(prompt),
+                                              timeout=self._flight_timeout())
+            return response.content
+        except Exception as e:
+            print(f"Error running multi-domain route {categories}: {e}")
+            return f"An error occurred while processing your request with the {'+'.join(categories)} agents."
+
+    async def _arun_multi(self, question: str, categories: List[str]) -> str:
+        """
+        Async version of _run_multi.
+        """
+        print(f"Fanning question out to: {', '.join(categories)} (async)")
+        agents = {category: self.agent_for(category) for category in categories}
+        try:
+            docs = self._docs_for_budget(await self._within_deadline(aretrieve_multi(agents, question)))
+            if not deadline.allows(deadline.GENERATION_MIN_SECONDS):
+                deadline.degrade("passages_only")
+                return passages_answer(docs)
+            with telemetry.span("generation"):
+                prompt = build_multi_domain_prompt(question, docs)
+                try:
+                    response = await self._within_deadline(
+                        self.llm_flight.ado(("multi_domain", prompt), lambda: self.food_agent.llm.ainvoke(prompt)))
+                except asyncio.TimeoutError:
+                    deadline.degrade("passages_only")
+                    return passages_answer(docs)
+            return response.content
+        except asyncio.TimeoutError:
+            deadline.degrade("timed_out")
+            return passages_answer([])
+        except Exception as e:
+            print(f"Error running multi-domain route {categories}: {e}")
+            return f"An error occurred while processing your request with the {'+'.join(categories)} agents."
+
+    def _run_agent(self, category: str, question: str) -> str:
+        """
+        Run the agent for an already-classified question through its invoke method.
+        """
+        print(f"Routing question to: {category}_agent") # Optional: for debugging
+
+        agent_to_use = self.agent_for(category)
 
         if agent_to_use is None:
              return "Error: Could not determine appropriate agent."
@@ -96,6 +497,9 @@ class Orchestrator:
             # and return a dictionary, typically {"output": answer}
             # Adjust the keys "input" and "output" if your agents use different ones.
             agent_input = {"input": question}
+            if deadline.current_deadline() is not None and hasattr(agent_to_use, "generate"):
+                # Under a deadline, retrieve first so generation can be trimmed or skipped
+                return self._generate_within_deadline(agent_to_use, question, agent_to_use.retrieve(question))
             result: Dict[str, Any] = agent_to_use.invoke(agent_input) # Use invoke
 
             # Extract the answer from the result dictionary
@@ -113,4 +517,201 @@ class Orchestrator:
                  return f"An error occurred while processing your request with the {category} agent (fallback)."
         except Exception as e:
             print(f"Error running agent '{category}' with invoke: {e}")
-            return f"An error occurred while processing your request with the {category} agent."
\ No newline at end of file
+            return f"An error occurred while processing your request with the {category} agent."
+
+    def _generate_within_deadline(self, agent, question: str, docs: List[Any]) -> str:
+        """
+        Generation step for a retrieval agent, degraded to fit what is left of the deadline.
+        A blocking call cannot be interrupted, so the budget is only checked before it starts.
+        """
+        docs = self._docs_for_budget(docs)
+        if not deadline.allows(deadline.GENERATION_MIN_SECONDS):
+            return self._passages_fallback(agent, question, docs)
+        return agent.generate(question, docs).get("output", "Agent did not return a standard output.")
+
+    async def _agenerate_within_deadline(self, agent, question: str, docs: List[Any]) -> str:
+        """
+        Async version of _generate_within_deadline; a generation call still running when
+        the deadline arrives is cancelled and the passages are returned instead.
+        """
+        docs = self._docs_for_budget(docs)
+        if not deadline.allows(deadline.GENERATION_MIN_SECONDS):
+            return self._passages_fallback(agent, question, docs)
+        try:
+            result = await self._within_deadline(agent.agenerate(question, docs))
+        except asyncio.TimeoutError:
+            print(f"Generation did not finish before the deadline for: '{question[:50]}'")
+            return self._passages_fallback(agent, question, docs)
+        return result.get("output", "Agent did not return a standard output.")
+
+    async def arun(self, question: str) -> str:
+        """
+        Async version of run: classifies with the async LLM client and awaits the
+        agent's ainvoke so a single worker can keep many questions in flight.
+        Concurrent calls with the same normalised question and a similar remaining
+        deadline share one execution.
+        Under a request deadline (see deadline.scope) the answer may be degraded,
+        and the call never outlives the deadline by more than GRACE_SECONDS.
+        """
+        try:
+            answer, level, leader_trace = await self._within_deadline(
+                self.question_flight.ado(self._question_key(question), lambda: self._arun_once(question)),
+                reserve=-deadline.GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            print(f"Deadline exceeded answering: '{question[:50]}'")
+            deadline.degrade("timed_out")
+            return passages_answer([])
+        deadline.degrade(level)
+        telemetry.adopt_trace(leader_trace)
+        return answer
+
+    async def _arun_once(self, question: str) -> Tuple[str, str, telemetry.RequestTrace]:
+        with telemetry.trace() as request_trace, telemetry.span("request") as span_tags:
+            vector = await asyncio.to_thread(self._embed_question, question)
+            hit = self._cache_lookup(vector)
+            if hit is not None:
+                span_tags["outcome"] = "cache_hit"
+                return hit.answer, deadline.level(), request_trace
+
+            decision, docs = await self._aroute_with_speculation(question, vector)
+            category = decision.category
+            with telemetry.span("agent"):
+                answer = await self.aanswer(decision, question, docs)
+            if self._is_degraded():
+                span_tags["outcome"] = "degraded"
+            else:
+                span_tags["outcome"] = self.answer_outcome(answer)
+                self.store_answer(category, question, vector, answer)
+            return answer, deadline.level(), request_trace
+
+    async def aanswer(self, decision: RouteDecision, question: str, docs: Optional[List[Any]] = None) -> str:
+        """
+        Answer an already-routed question: fan out for a multi-domain decision,
+        otherwise run its agent, generating over `docs` when they were retrieved already.
+        Does not consult or fill the answer cache.
+        """
+        if decision.is_multi:
+            return await self._arun_multi(question, decision.categories)
+        return await self._arun_agent(decision.category, question, docs)
+
+    async def _arun_agent(self, category: str, question: str, docs: Optional[List[Any]] = None) -> str:
+        """
+        Await the agent for an already-classified question. When `docs` were already
+        retrieved, only the generation step runs.
+        """
+        print(f"Routing question to: {category}_agent (async)")
+
+        agent_to_use = self.agent_for(category)
+        if agent_to_use is None:
+             return "Error: Could not determine appropriate agent."
+
+        agent_input = {"input": question}
+        try:
+            if docs is None and deadline.current_deadline() is not None and hasattr(agent_to_use, "aretrieve"):
+                # Under a deadline, retrieve first so generation can be trimmed or skipped
+                docs = await self._within_deadline(agent_to_use.aretrieve(question))
+            if docs is not None and hasattr(agent_to_use, "agenerate"):
+                return await self._agenerate_within_deadline(agent_to_use, question, docs)
+            elif hasattr(agent_to_use, "ainvoke"):
+                result: Dict[str, Any] = await self._within_deadline(agent_to_use.ainvoke(agent_input))
+            else:
+                # Agents without an async path run in a worker thread so the event loop stays free
+                print(f"Warning: Agent '{category}' does not have an 'ainvoke' method. Running 'invoke' in a thread.")
+                result = await asyncio.to_thread(agent_to_use.invoke, agent_input)
+            return result.get("output", "Agent did not return a standard output.")
+
+        except asyncio.TimeoutError:
+            print(f"Agent '{category}' did not finish before the deadline.")
+            deadline.degrade("timed_out")
+            return passages_answer([])
+        except Exception as e:
+            print(f"Error running agent '{category}' with ainvoke: {e}")
+            return f"An error occurred while processing your request with the {category} agent."
+
+    async def astream(self, question: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming version of arun. Yields event dicts in order: the routing
+        decision, the retrieved sources (retrieval agents only), answer tokens,
+        and finally "done". Closing this generator closes the agent's stream,
+        which cancels the upstream LLM call.
+        The caller owns the trace and deadline (see main.chat_stream_endpoint); under
+        a deadline too short for generation the top passages are sent instead.
+        """
+        with telemetry.span("request") as span_tags:
+            vector = await asyncio.to_thread(self._embed_question, question)
+            hit = self._cache_lookup(vector)
+            if hit is not None:
+                span_tags["outcome"] = "cache_hit"
+                yield {"event": "route", "data": {"category": hit.scope, "cached": True}}
+                yield {"event": "token", "data": hit.answer}
+                yield {"event": "done", "data": {"category": hit.scope, "cached": True}}
+                return
+
+            decision, docs = await self._aroute_with_speculation(question, vector)
+            category = decision.category
+            yield {"event": "route", "data": {"category": category, "categories": decision.categories}}
+
+            agent_to_use = self.agent_for(category)
+            agent_input = {"input": question}
+            tokens = []
+            try:
+                with telemetry.span("agent"):
+                    if decision.is_multi:
+                        agents = {name: self.agent_for(name) for name in decision.categories}
+                        docs = self._docs_for_budget(await aretrieve_multi(agents, question))
+                        yield {"event": "sources", "data": [doc_to_source(doc) for doc in docs]}
+                        if not deadline.allows(deadline.GENERATION_MIN_SECONDS):
+                            deadline.degrade("passages_only")
+                            tokens.append(passages_answer(docs))
+                            yield {"event": "token", "data": tokens[-1]}
+                        else:
+                            prompt_text = build_multi_domain_prompt(question, docs)
+                            async with aclosing(astream_tokens(self.food_agent.llm, prompt_text)) as events:
+                                async for event in events:
+                                    tokens.append(event["data"])
+                                    yield event
+                    elif hasattr(agent_to_use, "astream"):
+                        if deadline.current_deadline() is not None and hasattr(agent_to_use, "aretrieve"):
+                            # Retrieve first so the context can be trimmed or generation skipped
+                            if docs is None:
+                                docs = await agent_to_use.aretrieve(question)
+                            docs = self._docs_for_budget(docs)
+                        if docs is not None and not deadline.allows(deadline.GENERATION_MIN_SECONDS):
+                            yield {"event": "sources", "data": [doc_to_source(doc) for doc in docs]}
+                            tokens.append(self._passages_fallback(agent_to_use, question, docs))
+                            yield {"event": "token", "data": tokens[-1]}
+                        else:
+                            stream = (agent_to_use.astream(agent_input, docs) if docs is not None
+                                      else agent_to_use.astream(agent_input))
+                            async with aclosing(stream) as events:
+                                async for event in events:
+                                    if event["event"] == "token":
+                                        tokens.append(event["data"])
+                                    yield event
+                    else:
+                        # No token stream available (e.g. web agent): send the full answer as one chunk
+                        result = await self._within_deadline(agent_to_use.ainvoke(agent_input))
+                        answer = result.get("output", "Agent did not return a standard output.")
+                        tokens.append(answer)
+                        yield {"event": "token", "data": answer}
+            except asyncio.TimeoutError:
+                print(f"Agent '{category}' did not finish before the deadline (stream).")
+                deadline.degrade("timed_out")
+                span_tags["outcome"] = "degraded"
+                yield {"event": "token", "data": passages_answer([])}
+                yield {"event": "done", "data": {"category": category}}
+                return
+            except Exception as e:
+                print(f"Error streaming agent '{category}': {e}")
+                span_tags["outcome"] = "error"
+                yield {"event": "error", "data": f"An error occurred while processing your request with the {category} agent."}
+                return
+
+            answer = "".join(tokens)
+            if self._is_degraded():
+                span_tags["outcome"] = "degraded"
+            else:
+                span_tags["outcome"] = self.answer_outcome(answer)
+                # Only completed, undegraded streams reach this point, so the joined answer is safe to cache
+                self.store_answer(category, question, vector, answer)
+            yield {"event": "done", "data": {"category": category}}
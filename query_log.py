@@ -0,0 +1,115 @@
+# query_log.py
+
+import os
+import json
+import queue
+import hashlib
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+# JSON-lines file each /chat request is appended to; logging is off when unset
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "")
+# "text" keeps the question (needed for replay), "hash" keeps only its sha256
+QUERY_LOG_MODE = os.getenv("QUERY_LOG_MODE", "text")
+# Records buffered for the writer thread; beyond this they are dropped rather than slowing requests
+QUERY_LOG_QUEUE_SIZE = int(os.getenv("QUERY_LOG_QUEUE_SIZE", "10000"))
+
+
+def question_hash(question: str) -> str:
+    return hashlib.sha256(question.encode("utf-8")).hexdigest()[:16]
+
+
+class QueryLog:
+    """
+    Appends one compact JSON line per request: arrival time, the question (or its
+    hash), route, degradation, total latency and per-stage timings. Writes happen
+    on a background thread so a slow disk never adds to request latency.
+    """
+
+    def __init__(self, path: str, mode: str = "text", queue_size: int = QUERY_LOG_QUEUE_SIZE):
+        if mode not in ("text", "hash"):
+            raise ValueError(f"Unknown query log mode '{mode}' (use text or hash).")
+        self.path = path
+        self.mode = mode
+        self.written = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._write_loop, name="query-log", daemon=True)
+        self._thread.start()
+
+    def record(self, question: str, started_at: float, latency_s: float, trace=None,
+               degradation: str = "none", status: str = "ok", endpoint: str = "/chat") -> None:
+        entry: Dict[str, Any] = {"ts": round(started_at, 6), "endpoint": endpoint}
+        if self.mode == "text":
+            entry["question"] = question
+        entry["question_hash"] = question_hash(question)
+        entry.update({"status": status, "degradation": degradation, "latency_ms": round(latency_s * 1000.0, 2)})
+        if trace is not None:
+            breakdown = trace.breakdown()
+            entry["route"] = breakdown["route"]
+            entry["stages_ms"] = breakdown["stages_ms"]
+        try:
+            self._queue.put_nowait(json.dumps(entry, separators=(",", ":")))
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    return
+                f.write(line + "\n")
+                self.written += 1
+                # Flush whenever the queue drains so the file is readable while the server runs
+                if self._queue.empty():
+                    f.flush()
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"written": self.written, "dropped": self.dropped, "pending": self._queue.qsize()}
+
+
+def read_query_log(path: str) -> Iterator[Dict[str, Any]]:
+    """Entries of a query log in file order, skipping lines that do not parse."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+_query_log: Optional[QueryLog] = None
+_query_log_lock = threading.Lock()
+
+
+def get_query_log() -> Optional[QueryLog]:
+    """The process-wide query log, or None when QUERY_LOG_PATH is not set."""
+    global _query_log
+    if not QUERY_LOG_PATH:
+        return None
+    with _query_log_lock:
+        if _query_log is None:
+            _query_log = QueryLog(QUERY_LOG_PATH, QUERY_LOG_MODE)
+        return _query_log
+
+
+def log_request(question: str, started_at: float, latency_s: float, **kwargs) -> None:
+    """Record a request if query logging is enabled (see QueryLog.record)."""
+    query_log = get_query_log()
+    if query_log is not None:
+        query_log.record(question, started_at, latency_s, **kwargs)
+
+
+def query_log_stats() -> Optional[Dict[str, Any]]:
+    return _query_log.stats() if _query_log is not None else None
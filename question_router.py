@@ -0,0 +1,167 @@
+# question_router.py
+
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Literal, Optional
+
+import numpy as np
+
+from vector_math import unit_rows
+
+Category = Literal["food", "clinical", "web"]
+
+# Labelled example questions used to build one centroid per category.
+# Add phrasings here when the router keeps falling back to the LLM for a topic.
+ROUTER_EXAMPLES: Dict[str, List[str]] = {
+    "food": [
+        "What is the prevalence of undernourishment worldwide?",
+        "How many people faced acute food insecurity last year?",
+        "Which regions have the highest rates of child stunting?",
+        "How has the cost of a healthy diet changed in Africa?",
+        "What does the UN report say about food aid funding?",
+        "How did conflict affect food security in the Sahel?",
+        "What are the trends in global agricultural production?",
+        "How many children under five suffer from wasting?",
+        "What is the moderate or severe food insecurity rate in Latin America?",
+        "Which countries rely most on food imports?",
+        "How did food prices affect hunger during the pandemic?",
+        "What progress has been made towards zero hunger?",
+    ],
+    "clinical": [
+        "Which clinical trials are recruiting for type 2 diabetes?",
+        "What is the status of study NCT01234567?",
+        "List drug interventions tested for breast cancer.",
+        "Are there any completed trials on hypertension?",
+        "What devices are being studied for heart failure?",
+        "Show behavioral interventions for smoking cessation studies.",
+        "How many trials study Alzheimer's disease?",
+        "What are the conditions covered by the dietary supplement trials?",
+        "Which studies test a vaccine or biological intervention?",
+        "Find trials on depression that use a procedure intervention.",
+        "What is the study URL for the asthma trial?",
+        "Which trials were terminated or withdrawn?",
+    ],
+    "web": [
+        "Who won the football world cup?",
+        "What is the weather like in Paris today?",
+        "What is the capital of Australia?",
+        "Tell me the latest technology news.",
+        "How do I bake sourdough bread?",
+        "Who is the current CEO of Google?",
+        "What time zone is San Francisco in?",
+        "Explain how a blockchain works.",
+        "What movies are playing this weekend?",
+        "How tall is Mount Everest?",
+        "What is the stock price of Apple?",
+        "Translate hello into Spanish.",
+    ],
+}
+
+# Softmax temperature over cosine similarities; lower is sharper.
+ROUTER_TEMPERATURE = 0.05
+DEFAULT_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.6"))
+# In multi-label mode every retrieval domain with at least this share is queried
+MULTI_LABEL_MIN_SHARE = float(os.getenv("ROUTER_MULTI_LABEL_MIN_SHARE", "0.25"))
+RETRIEVAL_CATEGORIES = ("food", "clinical")
+
+
+@dataclass
+class RouteDecision:
+    """
+    The chosen category and how it was reached ("embedding" or "llm_fallback").
+    `categories` lists every domain to retrieve from; more than one means fan-out.
+    """
+    category: Category
+    path: str
+    confidence: float
+    scores: Dict[str, float] = field(default_factory=dict)
+    categories: List[str] = field(default_factory=list)
+
+    @property
+    def is_multi(self) -> bool:
+        return len(self.categories) > 1
+
+
+class EmbeddingRouter:
+    """
+    Nearest-centroid question classifier over the agents' mpnet embeddings.
+
+    Each category's example questions are embedded once at startup and averaged
+    into a unit-length centroid. A question is routed to the most similar
+    centroid; the softmax of the similarities is used as the confidence, and
+    callers fall back to the classifier LLM below `threshold`.
+    """
+
+    def __init__(self,
+                 embedding_function,
+                 examples: Optional[Dict[str, List[str]]] = None,
+                 threshold: float = DEFAULT_CONFIDENCE_THRESHOLD,
+                 temperature: float = ROUTER_TEMPERATURE):
+        self.embedding_function = embedding_function
+        self.threshold = threshold
+        self.temperature = temperature
+        examples = examples or ROUTER_EXAMPLES
+
+        self.labels: List[str] = list(examples.keys())
+        centroids = []
+        for label in self.labels:
+            vectors = unit_rows(np.asarray(embedding_function.embed_documents(examples[label]), dtype=np.float32))
+            centroids.append(unit_rows(vectors.mean(axis=0)))
+        self.centroids = np.stack(centroids)
+
+        self._lock = threading.Lock()
+        self._counts = {"embedding": 0, "llm_fallback": 0}
+
+    def embed(self, question: str) -> np.ndarray:
+        """Embed a question with the shared model (lets callers reuse the vector)."""
+        return np.asarray(self.embedding_function.embed_query(question), dtype=np.float32)
+
+    def score(self, question: str, vector: Optional[np.ndarray] = None) -> Dict[str, float]:
+        """Softmax-normalised similarity of the question to each category centroid."""
+        if vector is None:
+            vector = self.embed(question)
+        # A zero vector (failed or empty embedding) scores every centroid 0: uniform, so LLM fallback
+        vector = unit_rows(np.asarray(vector, dtype=np.float32))
+        logits = self.centroids @ vector / self.temperature
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        return {label: float(p) for label, p in zip(self.labels, probs)}
+
+    def route(self, question: str, vector: Optional[np.ndarray] = None,
+              multi_label: bool = False) -> RouteDecision:
+        """
+        Route locally. The returned decision's path is "embedding" when confident,
+        otherwise "llm_fallback" and the caller is expected to ask the LLM.
+        With multi_label, a question split between the retrieval domains (each with
+        at least MULTI_LABEL_MIN_SHARE, together above the threshold) is routed to all of them.
+        """
+        scores = self.score(question, vector)
+        category = max(scores, key=scores.get)
+        confidence = scores[category]
+
+        if multi_label:
+            shared = [label for label in RETRIEVAL_CATEGORIES if scores.get(label, 0.0) >= MULTI_LABEL_MIN_SHARE]
+            combined = sum(scores[label] for label in shared)
+            if len(shared) > 1 and combined >= self.threshold:
+                shared.sort(key=scores.get, reverse=True)
+                return RouteDecision(category=shared[0], path="embedding", confidence=combined,
+                                     scores=scores, categories=shared)
+
+        path = "embedding" if confidence >= self.threshold else "llm_fallback"
+        return RouteDecision(category=category, path=path, confidence=confidence,
+                             scores=scores, categories=[category])
+
+    def record(self, path: str) -> None:
+        """Count which path a request finally took."""
+        with self._lock:
+            self._counts[path] = self._counts.get(path, 0) + 1
+
+    def stats(self) -> Dict[str, float]:
+        """Path counters plus the LLM-fallback rate."""
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        counts["total"] = total
+        counts["llm_fallback_rate"] = counts["llm_fallback"] / total if total else 0.0
+        return counts
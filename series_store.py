@@ -0,0 +1,252 @@
+# series_store.py
+
+import os
+import csv
+import gzip
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Directory holding series.json (the catalogue) and one CSV per series
+SERIES_DATA_DIR = os.getenv("SERIES_DATA_DIR", os.path.join("data", "series"))
+# Cache-Control max-age for series responses
+SERIES_MAX_AGE_SECONDS = int(os.getenv("SERIES_MAX_AGE_SECONDS", "300"))
+# Responses at least this large also get a precompressed gzip body
+SERIES_GZIP_MIN_BYTES = int(os.getenv("SERIES_GZIP_MIN_BYTES", "1024"))
+# Serialized slices/downsamples kept; the full series are always kept
+SERIES_PAYLOAD_CACHE_SIZE = int(os.getenv("SERIES_PAYLOAD_CACHE_SIZE", "256"))
+
+
+class SeriesNotFound(KeyError):
+    """Raised for a series id that is not in the catalogue."""
+
+
+@dataclass(frozen=True)
+class SeriesPayload:
+    """A serialized response body with its ETag and, for large bodies, a gzip version."""
+    body: bytes
+    etag: str
+    gzipped: Optional[bytes] = None
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "SeriesPayload":
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        gzipped = gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= SERIES_GZIP_MIN_BYTES else None
+        return cls(body=body, etag=etag, gzipped=gzipped)
+
+
+def _dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: pick max_points indices that keep the visual
+    shape (peaks and dips) of the line, always including the first and last point.
+    """
+    n = len(x)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points <= 2:
+        return np.array([0, n - 1])[:max(max_points, 1)]
+    every = (n - 2) / (max_points - 2)
+    selected = [0]
+    a = 0
+    for i in range(max_points - 2):
+        start, stop = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_stop = stop, min(int((i + 2) * every) + 1, n)
+        if next_start >= next_stop:  # last bucket: the triangle closes on the final point
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x, avg_y = x[next_start:next_stop].mean(), y[next_start:next_stop].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected.append(a)
+    selected.append(n - 1)
+    return np.asarray(selected)
+
+
+class Series:
+    """One yearly series held as two aligned NumPy columns, sorted by year."""
+
+    def __init__(self, series_id: str, value_key: str, years: np.ndarray, values: np.ndarray,
+                 integer: bool = False, title: str = "", unit: str = "", legacy_path: Optional[str] = None):
+        order = np.argsort(years, kind="stable")
+        self.id = series_id
+        self.value_key = value_key
+        self.years = np.ascontiguousarray(years[order], dtype=np.int32)
+        self.values = np.ascontiguousarray(values[order], dtype=np.float64)
+        self.integer = integer
+        self.title = title
+        self.unit = unit
+        self.legacy_path = legacy_path
+
+    @classmethod
+    def from_csv(cls, series_id: str, path: str, **meta) -> "Series":
+        """A two-column CSV: 'year,<value_key>'. Values stay integers if the file has no decimals."""
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            rows = [row for row in reader if row]
+        raw_values = [row[1].strip() for row in rows]
+        return cls(
+            series_id,
+            value_key=header[1].strip(),
+            years=np.array([int(row[0]) for row in rows]),
+            values=np.array([float(v) for v in raw_values]),
+            integer=not any(ch in v for v in raw_values for ch in ".eE"),
+            **meta,
+        )
+
+    def index_range(self, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+        """[lo, hi) positions of the years within [start, end] (both inclusive, either open)."""
+        lo = 0 if start is None else int(np.searchsorted(self.years, start, side="left"))
+        hi = len(self.years) if end is None else int(np.searchsorted(self.years, end, side="right"))
+        return lo, max(lo, hi)
+
+    def select(self, lo: int, hi: int, max_points: Optional[int]) -> Tuple[List[int], List[Any]]:
+        years, values = self.years[lo:hi], self.values[lo:hi]
+        if max_points is not None and len(years) > max_points:
+            keep = lttb_indices(years.astype(np.float64), values, max_points)
+            years, values = years[keep], values[keep]
+        return years.tolist(), (values.astype(np.int64) if self.integer else values).tolist()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "unit": self.unit,
+            "value_key": self.value_key,
+            "points": len(self.years),
+            "start": int(self.years[0]) if len(self.years) else None,
+            "end": int(self.years[-1]) if len(self.years) else None,
+        }
+
+
+class SeriesStore:
+    """
+    Series loaded once from SERIES_DATA_DIR, with responses serialized (and gzipped)
+    ahead of time. Full series are serialized at load; year slices and downsampled
+    variants are serialized on first request and kept in a small LRU.
+    """
+
+    def __init__(self, series: Dict[str, Series], cache_size: int = SERIES_PAYLOAD_CACHE_SIZE):
+        self.series = series
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[tuple, SeriesPayload]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Precomputed responses that never leave the cache
+        self._pinned: Dict[tuple, SeriesPayload] = {}
+        for series_id, s in series.items():
+            self._pinned[("series", series_id, 0, len(s.years), None)] = self._serialize_series(s, 0, len(s.years), None)
+            self._pinned[("legacy", series_id, 0, len(s.years), None)] = self._serialize_legacy(s, 0, len(s.years), None)
+        self.catalogue = SeriesPayload.from_body(_dumps({"series": [s.describe() for s in series.values()]}))
+
+    @classmethod
+    def load(cls, directory: str = SERIES_DATA_DIR) -> "SeriesStore":
+        catalogue_path = os.path.join(directory, "series.json")
+        if not os.path.exists(catalogue_path):
+            print(f"⚠️ No series catalogue at '{catalogue_path}'; the series API will be empty.")
+            return cls({})
+        with open(catalogue_path, "r", encoding="utf-8") as f:
+            catalogue = json.load(f)
+        series = {}
+        for series_id, meta in catalogue.items():
+            meta = dict(meta)
+            path = os.path.join(directory, meta.pop("file", f"{series_id}.csv"))
+            series[series_id] = Series.from_csv(series_id, path, **meta)
+        print(f"📈 Loaded {len(series)} series from {directory}")
+        return cls(series)
+
+    def get(self, series_id: str) -> Series:
+        try:
+            return self.series[series_id]
+        except KeyError:
+            raise SeriesNotFound(series_id) from None
+
+    @staticmethod
+    def _serialize_series(s: Series, lo: int, hi: int, max_points: Optional[int]) -> SeriesPayload:
+        return SeriesPayload.from_body(_dumps(SeriesStore._series_dict(s, lo, hi, max_points)))
+
+    @staticmethod
+    def _series_dict(s: Series, lo: int, hi: int, max_points: Optional[int]) -> Dict[str, Any]:
+        years, values = s.select(lo, hi, max_points)
+        return {
+            "id": s.id,
+            "title": s.title,
+            "unit": s.unit,
+            "value_key": s.value_key,
+            "downsampled": len(years) < hi - lo,
+            "years": years,
+            "values": values,
+        }
+
+    @staticmethod
+    def _serialize_legacy(s: Series, lo: int, hi: int, max_points: Optional[int]) -> SeriesPayload:
+        # The row-per-year shape the dashboard widgets were built against
+        years, values = s.select(lo, hi, max_points)
+        rows = [{"year": year, s.value_key: value} for year, value in zip(years, values)]
+        return SeriesPayload.from_body(_dumps({"data": rows}))
+
+    def _cached(self, key: tuple, build) -> SeriesPayload:
+        payload = self._pinned.get(key)
+        if payload is not None:
+            with self._lock:
+                self.hits += 1
+            return payload
+        with self._lock:
+            payload = self._cache.get(key)
+            if payload is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return payload
+            self.misses += 1
+        payload = build()
+        with self._lock:
+            self._cache[key] = payload
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return payload
+
+    def payload(self, series_id: str, start: Optional[int] = None, end: Optional[int] = None,
+                max_points: Optional[int] = None, legacy: bool = False) -> SeriesPayload:
+        s = self.get(series_id)
+        lo, hi = s.index_range(start, end)
+        if max_points is not None and max_points >= hi - lo:
+            max_points = None  # nothing to drop; share the payload with the undownsampled request
+        kind = "legacy" if legacy else "series"
+        serialize = self._serialize_legacy if legacy else self._serialize_series
+        return self._cached((kind, series_id, lo, hi, max_points), lambda: serialize(s, lo, hi, max_points))
+
+    def batch_payload(self, series_ids: List[str], start: Optional[int] = None, end: Optional[int] = None,
+                      max_points: Optional[int] = None) -> SeriesPayload:
+        """Several series in one body, stitched together from their individual payloads."""
+        parts = [self.payload(series_id, start, end, max_points) for series_id in series_ids]
+        key = ("batch",) + tuple(part.etag for part in parts)
+        return self._cached(key, lambda: SeriesPayload.from_body(
+            b'{"series":[' + b",".join(part.body for part in parts) + b"]}"))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"series": len(self.series), "cached_payloads": len(self._cache),
+                    "hits": self.hits, "misses": self.misses}
+
+
+_store: Optional[SeriesStore] = None
+_store_lock = threading.Lock()
+
+
+def get_series_store() -> SeriesStore:
+    """The process-wide series store, loaded from SERIES_DATA_DIR on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SeriesStore.load()
+        return _store
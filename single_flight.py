@@ -0,0 +1,147 @@
+# single_flight.py
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class _Call:
+    """One in-flight synchronous call that followers wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution whose result
+    (or exception) is handed to every caller. `do` is for threads, `ado` for
+    coroutines; the two never share an in-flight call.
+
+    The call runs in the leader's context (contextvars), so its telemetry spans
+    land in the leader's trace only; callers that need them in their own trace
+    pass the trace back in the result (see telemetry.adopt_trace).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._sync_calls: Dict[Hashable, _Call] = {}
+        # key -> [task, number of callers still awaiting it]
+        self._async_calls: Dict[Hashable, List[Any]] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run fn, or wait for the identical call already running. A follower waits at
+        most `timeout` seconds (e.g. what is left of its deadline) and then raises
+        TimeoutError, so a hung leader cannot hold every coalesced thread with it.
+        """
+        with self._lock:
+            call = self._sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._sync_calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not call.event.wait(timeout):
+                raise TimeoutError(f"Coalesced '{self.name}' call still running after {timeout:.2f}s")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._sync_calls.pop(key, None)
+            call.event.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        with self._lock:
+            entry = self._async_calls.get(key)
+            if entry is not None and self._dying(entry[0]):
+                # Its last caller went away and it is being cancelled; don't join it
+                entry = None
+            if entry is None:
+                task = asyncio.ensure_future(fn())
+                entry = [task, 0]
+                self._async_calls[key] = entry
+                task.add_done_callback(lambda t, key=key, entry=entry: self._finish_async(key, entry, t))
+                self.executed += 1
+            else:
+                self.coalesced += 1
+            task = entry[0]
+            entry[1] += 1
+        try:
+            # shield: one caller going away must not cancel the call for the others
+            return await asyncio.shield(task)
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0 and not task.done():
+                    # Every caller was cancelled; nobody needs the result any more. Drop the
+                    # entry now so a caller arriving before the task winds down starts afresh.
+                    if self._async_calls.get(key) is entry:
+                        del self._async_calls[key]
+                    task.cancel()
+
+    @staticmethod
+    def _dying(task: "asyncio.Future") -> bool:
+        cancelling = getattr(task, "cancelling", None)  # Task.cancelling() is Python 3.11+
+        return task.cancelled() or bool(cancelling and cancelling())
+
+    def _finish_async(self, key: Hashable, entry: List[Any], task: "asyncio.Future") -> None:
+        with self._lock:
+            if self._async_calls.get(key) is entry:
+                del self._async_calls[key]
+            if not task.cancelled() and task.exception() is not None:
+                self.errors += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.executed + self.coalesced
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "in_flight": len(self._sync_calls) + len(self._async_calls),
+                "saved_ratio": self.coalesced / total if total else 0.0,
+            }
+
+
+_flights: Dict[str, SingleFlight] = {}
+_registry_lock = threading.Lock()
+
+
+def get_flight(name: str) -> SingleFlight:
+    """Process-wide SingleFlight group by name (e.g. "question", "llm", "retrieval")."""
+    with _registry_lock:
+        flight = _flights.get(name)
+        if flight is None:
+            flight = _flights[name] = SingleFlight(name)
+        return flight
+
+
+def single_flight_stats() -> Dict[str, Dict[str, float]]:
+    with _registry_lock:
+        flights = dict(_flights)
+    return {name: flight.stats() for name, flight in flights.items()}
+
+
+def normalise_question(question: str) -> str:
+    return " ".join(question.lower().split())
@@ -0,0 +1,240 @@
+# telemetry.py
+
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_PREFIX = "webui_copilot"
+
+
+@dataclass
+class Span:
+    """One timed stage of a request."""
+    name: str
+    duration_s: float
+    tags: Dict[str, str] = field(default_factory=dict)
+
+
+class RequestTrace:
+    """Spans recorded for one request, plus request-level tags such as the route."""
+
+    def __init__(self):
+        self.tags: Dict[str, str] = {}
+        # Non-label facts about the request (e.g. prompt token counts) for the breakdown
+        self.annotations: Dict[str, Any] = {}
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Per-stage wall time in milliseconds (summed when a stage repeats)."""
+        stages: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                stages[span.name] = stages.get(span.name, 0.0) + span.duration_s * 1000.0
+        breakdown = {"route": self.tags.get("route", "unknown"),
+                     "stages_ms": {name: round(ms, 2) for name, ms in stages.items()}}
+        if self.annotations:
+            breakdown.update(self.annotations)
+        return breakdown
+
+
+class HistogramSink:
+    """Prometheus-style latency histograms keyed by (stage, route, outcome)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # key -> [bucket counts..., sum, count]
+        self._series: Dict[Tuple[str, str, str], List[float]] = {}
+
+    def record(self, span: Span) -> None:
+        key = (span.name, span.tags.get("route", "unknown"), span.tags.get("outcome", "ok"))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0.0] * (len(self.buckets) + 2)
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if span.duration_s <= bound:
+                    series[i] += 1
+            series[-2] += span.duration_s
+            series[-1] += 1
+
+    def render(self) -> str:
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines = [f"# HELP {name} Latency of each request stage.", f"# TYPE {name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for (stage, route, outcome), series in items:
+            labels = f'stage="{stage}",route="{route}",outcome="{outcome}"'
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {int(count)}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {int(series[-1])}')
+            lines.append(f"{name}_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {int(series[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+class ListSink:
+    """Keeps every span in memory; handy for tests and ad-hoc debugging."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+histograms = HistogramSink()
+_sinks: List[Any] = [histograms]
+_sinks_lock = threading.Lock()
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+def add_sink(sink) -> None:
+    """Register an object with a record(span) method to receive every finished span."""
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink) -> None:
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace():
+    """
+    Collect spans for one request. Reuses the active trace if there is one, so
+    main.py and the orchestrator can both open it.
+    """
+    existing = _current_trace.get()
+    if existing is not None:
+        yield existing
+        return
+    request_trace = RequestTrace()
+    token = _current_trace.set(request_trace)
+    try:
+        yield request_trace
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # A streaming response the client abandoned is closed from another context,
+            # which never had this value set; there is nothing to restore there
+            pass
+
+
+def adopt_trace(source: Optional[RequestTrace]) -> None:
+    """
+    Copy the spans, route and annotations of a coalesced call's trace (see single_flight)
+    into the active one, so a follower's breakdown and index versions describe the work
+    that produced its answer. The copies are not re-emitted to the sinks, which already
+    counted them once; the follower's trace is annotated "coalesced".
+    """
+    target = _current_trace.get()
+    if target is None or source is None or target is source:
+        return
+    with source._lock:
+        spans = list(source.spans)
+    with target._lock:
+        target.spans.extend(spans)
+    if "route" in source.tags:
+        target.tags["route"] = source.tags["route"]
+    target.annotations.update(source.annotations)
+    target.annotations["coalesced"] = True
+
+
+def set_route(route: str) -> None:
+    """Tag the active request with its route; spans finishing afterwards carry it."""
+    request_trace = _current_trace.get()
+    if request_trace is not None:
+        request_trace.tags["route"] = route
+
+
+def annotate(key: str, value: Any) -> None:
+    """Attach a value to the active request's breakdown (no-op outside a trace)."""
+    request_trace = _current_trace.get()
+    if request_trace is not None:
+        request_trace.annotations[key] = value
+
+
+def emit(name: str, duration_s: float, **tags: str) -> None:
+    request_trace = _current_trace.get()
+    if request_trace is not None:
+        tags = {**request_trace.tags, **tags}
+    tags.setdefault("route", "unknown")
+    tags.setdefault("outcome", "ok")
+    record = Span(name=name, duration_s=duration_s, tags=tags)
+    if request_trace is not None:
+        request_trace.add(record)
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink.record(record)
+        except Exception as e:
+            print(f"Telemetry sink {sink!r} failed: {e}")
+
+
+@contextmanager
+def span(name: str, **tags: str):
+    """
+    Time a stage. Yields a mutable tags dict; set tags["outcome"] or other tags
+    inside the block. Exceptions mark the outcome "error" (or "cancelled").
+    """
+    span_tags: Dict[str, str] = dict(tags)
+    start = time.perf_counter()
+    try:
+        yield span_tags
+    except (asyncio.CancelledError, GeneratorExit):
+        span_tags["outcome"] = "cancelled"
+        raise
+    except BaseException:
+        span_tags["outcome"] = "error"
+        raise
+    finally:
+        emit(name, time.perf_counter() - start, **span_tags)
+
+
+def render_gauges(groups: Dict[str, Dict[str, Any]]) -> str:
+    """Render numeric values of stats() dicts as Prometheus gauges."""
+    lines = []
+    for group, values in groups.items():
+        if not values:
+            continue
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append(f"{METRIC_PREFIX}_{group}_{key} {value}")
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def render_info(name: str, series: List[Dict[str, str]]) -> str:
+    """Render string facts (e.g. index versions) as Prometheus info-style gauges with value 1."""
+    lines = []
+    for labels in series:
+        rendered = ",".join(f'{key}="{value}"' for key, value in labels.items())
+        lines.append(f"{METRIC_PREFIX}_{name}_info{{{rendered}}} 1")
+    return "\n".join(lines) + ("\n" if lines else "")
@@ -0,0 +1,74 @@
+# tests/test_answer_cache.py
+
+import pytest
+
+import answer_cache
+from answer_cache import SemanticAnswerCache
+
+FOOD = [1.0, 0.0, 0.0]
+WEB = [0.0, 1.0, 0.0]
+
+
+@pytest.fixture
+def versions():
+    return {"food": "v1", "web": "static"}
+
+
+@pytest.fixture
+def cache(versions):
+    return SemanticAnswerCache(version_fns={scope: (lambda scope=scope: versions[scope]) for scope in versions},
+                               threshold=0.95, ttl_seconds=100, scope_ttls={"web": 10})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_similar_question_hits_its_scope(cache, clock):
+    cache.store("food", "Where is stunting highest?", FOOD, "South Asia.")
+    hit = cache.lookup([0.99, 0.05, 0.0])
+    assert hit.scope == "food"
+    assert hit.answer == "South Asia."
+    assert cache.lookup(WEB) is None
+
+
+def test_index_version_bump_invalidates_the_scope(cache, versions, clock):
+    cache.store("food", "Where is stunting highest?", FOOD, "South Asia.")
+    cache.store("web", "Capital of France?", WEB, "Paris.")
+    versions["food"] = "v2"
+
+    assert cache.lookup(FOOD) is None
+    assert cache.lookup(WEB).answer == "Paris."
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_entries_expire_after_their_scope_ttl(cache, clock):
+    cache.store("food", "Where is stunting highest?", FOOD, "South Asia.")
+    cache.store("web", "Capital of France?", WEB, "Paris.")
+
+    clock[0] += 11  # past the web TTL, well inside the default one
+    assert cache.lookup(WEB) is None
+    assert cache.lookup(FOOD).answer == "South Asia."
+
+    clock[0] += 100
+    assert cache.lookup(FOOD) is None
+    assert cache.stats()["expirations"] == 2
+
+
+def test_lru_keeps_at_most_max_entries(versions, clock):
+    cache = SemanticAnswerCache(version_fns={"food": lambda: "v1"}, max_entries=2)
+    for i, vector in enumerate(([1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0])):
+        cache.store("food", f"question {i}", vector, f"answer {i}")
+    assert cache.lookup([1.0, 0.0, 0.0]) is None
+    assert cache.lookup([0.0, 0.0, 1.0]).answer == "answer 2"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_zero_vector_never_hits(cache, clock):
+    cache.store("food", "Where is stunting highest?", FOOD, "South Asia.")
+    cache.store("web", "", [0.0, 0.0, 0.0], "Nothing.")
+    assert cache.lookup([0.0, 0.0, 0.0]) is None
+    assert cache.lookup(FOOD).answer == "South Asia."
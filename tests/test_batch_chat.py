@@ -0,0 +1,93 @@
+# tests/test_batch_chat.py
+
+import asyncio
+
+from batch_chat import BatchItem, BatchRunner
+from question_router import RouteDecision
+
+
+class _RetrievalAgent:
+    def __init__(self, table_answers=None):
+        self.table_answers = table_answers or {}
+        self.searched = []
+
+    def retrieve_batch(self, questions, vectors):
+        self.searched.extend(questions)
+        return [[f"doc for {question}"] for question in questions]
+
+    def answer_from_table(self, question):
+        return self.table_answers.get(question)
+
+
+class _Orchestrator:
+    def __init__(self, agents):
+        self.agents = agents
+
+    def agent_for(self, category):
+        return self.agents[category]
+
+
+def _item(index, question, category):
+    decision = RouteDecision(category=category, path="embedding", confidence=0.9, categories=[category])
+    return BatchItem(index=index, question=question, vector=[0.0], decision=decision)
+
+
+def test_questions_the_trials_table_answers_are_not_searched():
+    clinical = _RetrievalAgent(table_answers={"How many trials are recruiting?": "12 trials are recruiting."})
+    food = _RetrievalAgent()
+    runner = BatchRunner(_Orchestrator({"clinical": clinical, "food": food}))
+    items = [_item(0, "How many trials are recruiting?", "clinical"),
+             _item(1, "Which drugs were tested for asthma?", "clinical"),
+             _item(2, "Where is stunting highest?", "food")]
+
+    asyncio.run(runner._retrieve(items))
+
+    assert clinical.searched == ["Which drugs were tested for asthma?"]
+    assert food.searched == ["Where is stunting highest?"]
+    assert items[0].docs is None
+    assert items[1].docs == ["doc for Which drugs were tested for asthma?"]
+    assert runner.stats()["batched_retrievals"] == 2
+
+
+def test_fan_out_questions_are_left_to_retrieve_on_their_own():
+    clinical = _RetrievalAgent()
+    runner = BatchRunner(_Orchestrator({"clinical": clinical, "food": _RetrievalAgent()}))
+    item = _item(0, "Nutrition trials for stunting", "clinical")
+    item.decision.categories = ["clinical", "food"]
+
+    asyncio.run(runner._retrieve([item]))
+
+    assert clinical.searched == []
+    assert item.docs is None
+
+
+class _AnsweringOrchestrator:
+    """Only the public surface BatchRunner is meant to use."""
+
+    def __init__(self):
+        self.stored = []
+
+    async def aanswer(self, decision, question, docs=None):
+        return f"{decision.category}: {question} ({len(docs or [])} docs)"
+
+    @staticmethod
+    def answer_outcome(answer):
+        return "error" if answer.startswith("Error:") else "ok"
+
+    def store_answer(self, category, question, vector, answer):
+        self.stored.append((category, question, answer))
+
+
+def test_answers_go_through_the_orchestrator_public_api():
+    orchestrator = _AnsweringOrchestrator()
+    runner = BatchRunner(orchestrator)
+    item = _item(0, "Where is stunting highest?", "food")
+    item.docs = ["doc"]
+    results = asyncio.Queue()
+
+    asyncio.run(runner._answer(item, asyncio.Semaphore(1), results, 0.0, include_timings=False))
+
+    result = results.get_nowait()
+    assert result["status"] == "ok"
+    assert result["answer"] == "food: Where is stunting highest? (1 docs)"
+    assert orchestrator.stored == [("food", "Where is stunting highest?", result["answer"])]
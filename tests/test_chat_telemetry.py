@@ -0,0 +1,118 @@
+# tests/test_chat_telemetry.py
+#
+# /chat end to end on the offline fakes (benchmarks/fakes.py): fake Gemini, hash
+# embedder and synthetic mmap indexes, so no network or model download is needed.
+
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")  # fastapi.testclient
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_community")
+
+from fastapi.testclient import TestClient
+
+import deadline
+import telemetry
+
+FOOD_QUESTION = "What is the prevalence of undernourishment and child stunting in Southern Asia?"
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    from benchmarks.fakes import install_fakes, build_offline_indexes
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("SEMANTIC_CACHE_ENABLED", "0")
+        install_fakes(llm_latency_s=0.0)
+        food_dir, clinical_dir = build_offline_indexes(str(tmp_path_factory.mktemp("indexes")), backend="mmap",
+                                                       food_docs=60, trial_rows=80)
+        patch.setenv("UN_VECTORSTORE_DIR", food_dir)
+        patch.setenv("CLINICAL_VECTORSTORE_DIR", clinical_dir)
+        import main  # builds the orchestrator on the synthetic indexes
+        with TestClient(main.app) as test_client:
+            yield test_client
+
+
+@pytest.fixture
+def spans():
+    sink = telemetry.ListSink()
+    telemetry.add_sink(sink)
+    yield sink.spans
+    telemetry.remove_sink(sink)
+
+
+def _request_span(spans):
+    requests = [span for span in spans if span.name == "request"]
+    assert len(requests) == 1
+    return requests[0]
+
+
+def test_chat_records_stage_spans_route_and_outcome(client, spans):
+    response = client.post("/chat", json={"question": FOOD_QUESTION, "include_timings": True})
+    assert response.status_code == 200
+    body = response.json()
+
+    request = _request_span(spans)
+    assert request.tags["route"] == "food"
+    assert request.tags["outcome"] == "ok"
+    names = {span.name for span in spans}
+    assert {"classification", "retrieval", "generation", "agent"} <= names
+    # Spans finishing after routing carry the request's route
+    assert all(span.tags["route"] == "food" for span in spans if span.name == "generation")
+
+    assert body["timings"]["route"] == "food"
+    assert {"request", "retrieval", "generation"} <= set(body["timings"]["stages_ms"])
+    assert body["degradation"] == "none"
+
+
+def test_timings_are_only_returned_when_asked_for(client, spans):
+    body = client.post("/chat", json={"question": FOOD_QUESTION}).json()
+    assert body["timings"] is None
+    assert _request_span(spans).tags["outcome"] == "ok"
+
+
+def test_tight_deadline_degrades_the_answer(client, spans):
+    body = client.post("/chat", json={"question": FOOD_QUESTION, "deadline_seconds": 0.001,
+                                      "include_timings": True}).json()
+    assert body["answer"]
+    assert body["degradation"] in deadline.DEGRADATION_LEVELS
+    assert body["degradation"] != "none"
+    assert body["timings"]["degradation"] == body["degradation"]
+
+
+@pytest.mark.parametrize("deadline_seconds", [0, -1])
+def test_non_positive_deadline_is_rejected(client, deadline_seconds):
+    response = client.post("/chat", json={"question": FOOD_QUESTION, "deadline_seconds": deadline_seconds})
+    assert response.status_code == 422
+
+
+def _sse_events(text):
+    events = []
+    for frame in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_reports_timings_and_degradation_in_the_done_event(client, spans):
+    response = client.post("/chat/stream", json={"question": FOOD_QUESTION, "include_timings": True})
+    events = _sse_events(response.text)
+
+    assert events[0][0] == "route"
+    name, done = events[-1]
+    assert name == "done"
+    assert done["degradation"] == "none"
+    assert done["timings"]["route"] == "food"
+    assert "generation" in done["timings"]["stages_ms"]
+    assert _request_span(spans).tags["outcome"] == "ok"
+
+
+def test_stream_honours_the_deadline(client):
+    response = client.post("/chat/stream", json={"question": FOOD_QUESTION, "deadline_seconds": 0.001})
+    name, done = _sse_events(response.text)[-1]
+    assert name == "done"
+    assert done["degradation"] != "none"
+    assert "timings" not in done
@@ -0,0 +1,82 @@
+# tests/test_clinical_table.py
+
+import pytest
+
+from clinical_table import TrialTable
+
+
+def _row(nct, title, status, conditions, interventions):
+    return {"nct": nct, "title": title, "url": f"https://clinicaltrials.gov/study/{nct}", "status": status,
+            "conditions": conditions, "interventions": interventions, "other": ""}
+
+
+@pytest.fixture
+def table():
+    return TrialTable.from_rows([
+        _row("NCT00000001", "Metformin in Type 2 Diabetes", "RECRUITING", "Type 2 Diabetes", "DRUG:Metformin"),
+        _row("NCT00000002", "Diet Counselling in Type 2 Diabetes", "COMPLETED", "Type 2 Diabetes",
+             "BEHAVIORAL:Diet Counselling"),
+        _row("NCT00000003", "Inhaled Steroids in Asthma", "COMPLETED", "Asthma", "DRUG:Budesonide"),
+        _row("NCT00000004", "Screening in Breast Cancer", "NOT_YET_RECRUITING", "Breast Cancer",
+             "DEVICE:Mammography"),
+    ])
+
+
+def test_nct_lookup_returns_the_row(table):
+    answer = table.answer("What is the status of study NCT00000003?")
+    assert answer.startswith("NCT00000003: Inhaled Steroids in Asthma")
+
+
+@pytest.mark.parametrize("question", [
+    "NCT00000003",
+    "Show me NCT00000003",
+    "What's the status of NCT00000003?",
+    "Tell me about trial nct00000003.",
+])
+def test_plain_nct_lookups_answer_from_the_table(table, question):
+    assert table.answer(question).startswith("NCT00000003: Inhaled Steroids in Asthma")
+
+
+def test_several_ids_are_listed_once_each(table):
+    answer = table.answer("Show NCT00000001 and NCT00000004 and NCT00000001")
+    assert [line[:11] for line in answer.splitlines()] == ["NCT00000001", "NCT00000004"]
+
+
+@pytest.mark.parametrize("question", [
+    "What is the status of study NCT99999999?",
+    "Show NCT00000001 and NCT99999999",
+    "Why was NCT00000003 terminated and what were the adverse events?",
+    "How many participants did NCT00000003 enrol?",
+])
+def test_nct_questions_beyond_a_lookup_fall_back(table, question):
+    assert table.answer(question) is None
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("How many trials are there?", "4 trials in the clinical studies table."),
+    ("How many trials are recruiting for Type 2 Diabetes?",
+     "1 trial with status RECRUITING, matching 'type 2 diabetes' in the clinical studies table."),
+    ("How many trials for diabetes?", "2 trials with matching 'diabetes' in the clinical studies table."),
+    ("How many not yet recruiting trials are there?",
+     "1 trial with status NOT_YET_RECRUITING in the clinical studies table."),
+])
+def test_counts(table, question, expected):
+    assert table.answer(question) == expected
+
+
+def test_filtered_listing(table):
+    answer = table.answer("Which trials study Asthma with a drug intervention?")
+    assert answer.splitlines()[0] == "1 trial with DRUG interventions, matching 'asthma':"
+    assert "NCT00000003" in answer
+
+
+@pytest.mark.parametrize("question", [
+    "Which trials for diabetes showed the best outcomes?",
+    "How many participants were in the diabetes trial?",
+    "How many patients enrolled in cancer studies?",
+    "Which trials study Asthma with a drug intervention (case 4)?",
+    "Which trials study unicornitis?",
+    "What causes asthma?",
+])
+def test_questions_beyond_the_table_fall_back(table, question):
+    assert table.answer(question) is None
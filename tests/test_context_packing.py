@@ -0,0 +1,62 @@
+# tests/test_context_packing.py
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain.docstore.document import Document
+
+from agents.context_packing import estimate_tokens, merge_overlapping, pack_context
+
+OVERLAP = "the prevalence of undernourishment rose in several regions during the year "
+
+
+def _doc(text, page=1, source="report.pdf"):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+def test_overlapping_chunks_of_one_page_are_merged():
+    first = _doc("Hunger statistics for Southern Asia show that " + OVERLAP)
+    second = _doc(OVERLAP + "while child stunting fell slightly.")
+    other_page = _doc(OVERLAP + "while child stunting fell slightly.", page=2)
+
+    merged = merge_overlapping([first, second, other_page])
+
+    assert len(merged) == 2
+    assert merged[0].page_content == ("Hunger statistics for Southern Asia show that " + OVERLAP
+                                      + "while child stunting fell slightly.")
+    assert merged[0].metadata["merged_chunks"] == 2
+
+
+def test_duplicates_are_dropped_and_the_budget_is_respected():
+    docs = [_doc(f"passage {i} about food prices " + "x" * 400, page=i) for i in range(6)]
+    docs.append(_doc(docs[0].page_content, page=0))
+
+    packed, counts = pack_context("food prices", docs, token_budget=250, enabled=True)
+
+    assert counts["tokens_before"] == sum(estimate_tokens(doc.page_content) for doc in docs)
+    assert counts["tokens_after"] == sum(estimate_tokens(doc.page_content) for doc in packed)
+    assert counts["tokens_after"] <= 250
+    assert len({doc.page_content for doc in packed}) == len(packed)
+
+
+def test_one_passage_is_kept_even_if_it_exceeds_the_budget():
+    packed, _ = pack_context("food", [_doc("food " * 500)], token_budget=10, enabled=True)
+    assert len(packed) == 1
+
+
+def test_disabled_packing_returns_the_documents_unchanged():
+    docs = [_doc("a passage"), _doc("a passage")]
+    packed, counts = pack_context("passage", docs, enabled=False)
+    assert packed is docs
+    assert counts["tokens_before"] == counts["tokens_after"]
+
+
+def test_default_budget_keeps_a_full_retrieval_of_distinct_chunks():
+    docs = [_doc(f"chunk {i} " + f"word{i} " * 160, page=i) for i in range(8)]
+    assert all(len(doc.page_content) <= 1000 for doc in docs)
+
+    packed, counts = pack_context("word3", docs, enabled=True)
+
+    assert len(packed) == len(docs)
+    assert counts["tokens_after"] == counts["tokens_before"]
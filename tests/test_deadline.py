@@ -0,0 +1,58 @@
+# tests/test_deadline.py
+
+import deadline
+import telemetry
+
+
+def test_budget_bucket_is_none_without_a_deadline():
+    assert deadline.budget_bucket() is None
+
+
+def test_similar_budgets_share_a_bucket_and_different_ones_do_not():
+    with deadline.scope(30):
+        long_budget = deadline.budget_bucket()
+    with deadline.scope(30):
+        same_budget = deadline.budget_bucket()
+    with deadline.scope(3):
+        short_budget = deadline.budget_bucket()
+    assert long_budget == same_budget
+    assert long_budget != short_budget
+
+
+def test_budget_bucket_changes_across_a_degradation_threshold():
+    just_below = deadline.GENERATION_MIN_SECONDS - 0.01
+    with deadline.scope(just_below):
+        below = deadline.budget_bucket()
+    with deadline.scope(deadline.GENERATION_MIN_SECONDS + 0.5):
+        above = deadline.budget_bucket()
+    assert below != above
+
+
+def test_level_is_none_without_a_deadline_and_degrade_is_a_no_op():
+    deadline.degrade("passages_only")
+    assert deadline.level() == "none"
+    assert deadline.allows(1e9)
+
+
+def test_degradation_only_moves_forward():
+    with deadline.scope(10) as request_deadline:
+        deadline.degrade("reduced_k")
+        deadline.degrade("heuristic_route")
+        assert deadline.level() == "reduced_k"
+        deadline.degrade("timed_out")
+        assert request_deadline.level == "timed_out"
+    assert deadline.level() == "none"
+
+
+def test_allows_compares_against_the_remaining_budget():
+    with deadline.scope(5):
+        assert deadline.allows(4)
+        assert not deadline.allows(6)
+    with deadline.scope():
+        assert deadline.current_deadline().seconds == deadline.DEFAULT_DEADLINE_SECONDS
+
+
+def test_degradation_is_recorded_on_the_request_trace():
+    with telemetry.trace() as request_trace, deadline.scope(1):
+        deadline.degrade("passages_only")
+    assert request_trace.breakdown()["degradation"] == "passages_only"
@@ -0,0 +1,74 @@
+# tests/test_embedding_batcher.py
+
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from embedding_service import _QueryBatcher
+
+
+def _fake_model(calls):
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+    return embed
+
+
+def test_identical_queries_share_one_slot():
+    calls = []
+    release = threading.Event()
+
+    def embed(texts):
+        release.wait(2)
+        return _fake_model(calls)(texts)
+
+    batcher = _QueryBatcher(embed, max_batch_size=16, wait_ms=0)
+    first = batcher.submit("warm")
+    futures = [batcher.submit(text) for text in ["a", "bb", "a"]]
+    release.set()
+    assert first.result(2) == [4.0]
+    assert [f.result(2) for f in futures] == [[1.0], [2.0], [1.0]]
+    # However the queries were grouped, the duplicate "a" was embedded once
+    assert sum(call.count("a") for call in calls) == 1
+
+
+def test_model_errors_reach_every_caller_and_the_thread_survives():
+    state = {"fail": True}
+
+    def embed(texts):
+        if state["fail"]:
+            raise RuntimeError("model down")
+        return [[1.0] for _ in texts]
+
+    batcher = _QueryBatcher(embed, max_batch_size=4, wait_ms=0)
+    with pytest.raises(RuntimeError):
+        batcher.submit("q").result(2)
+    state["fail"] = False
+    assert batcher.submit("q").result(2) == [1.0]
+
+
+def test_cancelled_async_caller_does_not_kill_the_batcher():
+    release = threading.Event()
+
+    def embed(texts):
+        release.wait(2)
+        return [[1.0] for _ in texts]
+
+    batcher = _QueryBatcher(embed, max_batch_size=4, wait_ms=0)
+
+    async def scenario():
+        blocker = batcher.submit("blocker")
+        waiting = asyncio.ensure_future(asyncio.wrap_future(batcher.submit("cancelled")))
+        await asyncio.sleep(0.01)
+        waiting.cancel()  # cancels the queued concurrent Future too
+        await asyncio.sleep(0.01)
+        release.set()
+        return blocker
+
+    blocker = asyncio.run(scenario())
+    assert blocker.result(2) == [1.0]
+    assert batcher.submit("after").result(2) == [1.0]
+    assert batcher._thread.is_alive()
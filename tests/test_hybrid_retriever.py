@@ -0,0 +1,90 @@
+# tests/test_hybrid_retriever.py
+
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_core")
+
+from langchain.docstore.document import Document
+
+from agents.hybrid_retriever import BM25Index, HybridRetriever, RRF_K, tokenize
+
+TEXTS = [
+    "NCT01234567 tests DRUG:Metformin in adults with type 2 diabetes.",
+    "Diet counselling for type 2 diabetes in primary care.",
+    "Inhaled steroids for children with asthma.",
+    "Metformin and exercise for prediabetes.",
+]
+
+
+@pytest.fixture
+def bm25():
+    return BM25Index([f"id{i}" for i in range(len(TEXTS))], TEXTS, [{"row": i} for i in range(len(TEXTS))])
+
+
+class _VectorStore:
+    def __init__(self, texts):
+        self.texts = texts
+
+    def similarity_search(self, query, k):
+        return [Document(page_content=text) for text in self.texts[:k]]
+
+
+def test_tokenize_keeps_identifiers_and_intervention_prefixes():
+    assert tokenize("NCT01234567 DRUG:Metformin") == ["nct01234567", "drug:", "metformin"]
+
+
+def test_bm25_ranks_the_document_with_the_identifier_first(bm25):
+    hits = bm25.search("status of NCT01234567", k=3)
+    assert [doc_idx for doc_idx, _ in hits] == [0]
+    assert bm25.document(0).metadata == {"row": 0}
+
+
+def test_bm25_prefers_rarer_terms(bm25):
+    ranked = [doc_idx for doc_idx, _ in bm25.search("metformin asthma", k=4)]
+    # "asthma" appears in one document, "metformin" in two
+    assert ranked[0] == 2
+
+
+def test_sidecar_round_trips_and_rejects_another_fingerprint(bm25, tmp_path):
+    path = str(tmp_path / "index.bm25.json")
+    bm25.save(path, "fp1")
+
+    loaded = BM25Index.load(path, "fp1")
+    assert loaded.search("metformin", 4) == bm25.search("metformin", 4)
+    assert BM25Index.load(path, "fp2") is None
+    assert BM25Index.load(str(tmp_path / "missing.json"), "fp1") is None
+
+
+def test_rrf_sums_reciprocal_ranks_across_both_rankers(bm25):
+    # The vector ranker puts the asthma chunk first; BM25 only matches the NCT chunk
+    vector_order = [TEXTS[2], TEXTS[0], TEXTS[1]]
+    retriever = HybridRetriever(vectorstore=_VectorStore(vector_order), bm25=bm25, k=3, fetch_k=3)
+
+    results = retriever.search_with_scores("NCT01234567")
+
+    assert [doc.page_content for doc, _ in results] == [TEXTS[0], TEXTS[2], TEXTS[1]]
+    scores = dict((doc.page_content, score) for doc, score in results)
+    assert scores[TEXTS[0]] == pytest.approx(1 / (RRF_K + 2) + 1 / (RRF_K + 1))
+    assert scores[TEXTS[2]] == pytest.approx(1 / (RRF_K + 1))
+
+
+def test_keyword_only_hits_are_added_and_duplicates_merged(bm25):
+    # Whitespace differences do not make the same chunk count twice
+    retriever = HybridRetriever(vectorstore=_VectorStore(["Diet  counselling for type 2 diabetes in primary care."]),
+                                bm25=bm25, k=5, fetch_k=5)
+
+    results = retriever.search_with_scores("counselling asthma")
+
+    contents = [" ".join(doc.page_content.split()) for doc, _ in results]
+    assert sorted(contents) == sorted([TEXTS[1], TEXTS[2]])
+
+
+def test_precomputed_vector_docs_skip_the_vector_search(bm25):
+    class _NoSearch:
+        def similarity_search(self, query, k):
+            raise AssertionError("vector search should be skipped")
+
+    retriever = HybridRetriever(vectorstore=_NoSearch(), bm25=bm25, k=2, fetch_k=2)
+    results = retriever.search_with_scores("asthma", vector_docs=[Document(page_content=TEXTS[3])])
+    assert {doc.page_content for doc, _ in results} == {TEXTS[2], TEXTS[3]}
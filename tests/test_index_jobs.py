@@ -0,0 +1,123 @@
+# tests/test_index_jobs.py
+
+import os
+import time
+import sqlite3
+
+import pytest
+
+pytest.importorskip("langchain")  # index_jobs -> agents.mmap_vectorstore
+
+import index_jobs
+from agents.index_swap import HotSwapIndexMixin, IndexHandle
+from index_jobs import IngestJobManager, IngestTarget, current_index_dir
+
+
+class _Plan:
+    def __init__(self, has_changes):
+        self.has_changes = has_changes
+
+    def counts(self):
+        return {"new": int(self.has_changes)}
+
+
+class _Store:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class _Agent(HotSwapIndexMixin):
+    def __init__(self, persist_directory):
+        self._init_index(persist_directory)
+
+    def _open_index(self, persist_directory):
+        return IndexHandle(persist_directory=persist_directory, vectorstore=_Store(), retriever=None,
+                           version=os.path.basename(persist_directory))
+
+
+def _make_chroma_dir(path, rows):
+    os.makedirs(os.path.join(path, "segment"))
+    with open(os.path.join(path, "segment", "data_level0.bin"), "wb") as f:
+        f.write(b"hnsw")
+    db = sqlite3.connect(os.path.join(path, "chroma.sqlite3"))
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("CREATE TABLE items (text TEXT)")
+    db.executemany("INSERT INTO items VALUES (?)", [(row,) for row in rows])
+    db.commit()
+    return db  # left open, like the serving process's handle
+
+
+def _rows(path):
+    db = sqlite3.connect(os.path.join(path, "chroma.sqlite3"))
+    try:
+        return [row for (row,) in db.execute("SELECT text FROM items ORDER BY text")]
+    finally:
+        db.close()
+
+
+def test_copy_index_snapshots_an_open_database(tmp_path):
+    live = str(tmp_path / "live")
+    db = _make_chroma_dir(live, ["a", "b"])
+    try:
+        copy = str(tmp_path / "copy")
+        index_jobs._copy_index(live, copy)
+    finally:
+        db.close()
+
+    # Committed rows still sitting in the WAL are part of the copy
+    assert _rows(copy) == ["a", "b"]
+    assert os.path.exists(os.path.join(copy, "segment", "data_level0.bin"))
+    assert not os.path.exists(os.path.join(copy, "chroma.sqlite3-wal"))
+
+
+def _run_job(tmp_path, monkeypatch, has_changes):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    pdf = data_dir / "report.pdf"
+    pdf.write_bytes(b"%PDF")
+    monkeypatch.setattr(index_jobs, "INGEST_DATA_DIR", str(data_dir))
+    monkeypatch.setattr(index_jobs, "INDEX_RETIRE_SECONDS", 0.0)
+
+    base = str(tmp_path / "index")
+    _make_chroma_dir(base, ["a"]).close()
+    agent = _Agent(base)
+    seen = {"store": agent.vectorstore}
+
+    def ingest(pdf_path, db_dir, **kwargs):
+        seen["rows"] = _rows(db_dir)
+        return _Plan(has_changes)
+
+    manager = IngestJobManager({"food": IngestTarget(agent, base, ingest, str(pdf))})
+    job = manager.submit("food")
+    deadline = time.monotonic() + 5
+    while job.finished_at is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return agent, job, base, seen
+
+
+def test_job_ingests_into_a_copy_swaps_and_closes_the_old_store(tmp_path, monkeypatch):
+    agent, job, base, seen = _run_job(tmp_path, monkeypatch, has_changes=True)
+    old_store = seen["store"]
+
+    assert job.status == "succeeded", job.error
+    assert seen["rows"] == ["a"]
+    assert agent.persist_directory == job.index_dir != base
+    assert current_index_dir(base) == job.index_dir
+    assert agent.index_swaps == 1
+    deadline = time.monotonic() + 5
+    while not old_store.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert old_store.closed
+    assert not agent.vectorstore.closed
+
+
+def test_unchanged_pdf_keeps_the_live_index(tmp_path, monkeypatch):
+    agent, job, base, seen = _run_job(tmp_path, monkeypatch, has_changes=False)
+
+    assert job.status == "succeeded", job.error
+    assert job.index_dir == base
+    assert agent.index_swaps == 0
+    assert not seen["store"].closed
+    assert [d for d in os.listdir(tmp_path) if d.startswith("index.v")] == []
@@ -0,0 +1,80 @@
+# tests/test_index_swap.py
+
+from agents.index_swap import HotSwapIndexMixin, IndexHandle
+
+
+class _Store:
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+
+
+class _Chain:
+    retriever = None
+
+
+class _Agent(HotSwapIndexMixin):
+    def __init__(self, persist_directory):
+        self.qa_chain = _Chain()
+        self._init_index(persist_directory)
+        self.qa_chain.retriever = self.retriever
+
+    def _open_index(self, persist_directory):
+        return IndexHandle(persist_directory=persist_directory, vectorstore=_Store(),
+                           retriever=f"retriever:{persist_directory}", version=persist_directory)
+
+
+def test_swap_replaces_the_handle_and_returns_the_previous_one():
+    agent = _Agent("index.v1")
+    before = agent.index
+
+    previous = agent.swap_index("index.v2")
+
+    assert previous is before
+    assert agent.persist_directory == "index.v2"
+    assert agent.index_version == "index.v2"
+    assert agent.qa_chain.retriever == "retriever:index.v2"
+    assert agent.index_swaps == 1
+    # The old handle stays usable until the caller closes it
+    assert previous.vectorstore.closed == 0
+
+
+def test_each_agent_has_its_own_swap_lock_and_counter():
+    first, second = _Agent("a"), _Agent("b")
+    first.swap_index("a2")
+    assert first._swap_lock is not second._swap_lock
+    assert (first.index_swaps, second.index_swaps) == (1, 0)
+
+
+def test_close_calls_the_store_close():
+    handle = _Agent("a").index
+    handle.close()
+    assert handle.vectorstore.closed == 1
+
+
+def test_close_stops_a_chroma_client_system():
+    class _System:
+        stopped = False
+
+        def stop(self):
+            self.stopped = True
+
+    class _Client:
+        _system = _System()
+
+    class _Chroma:
+        _client = _Client()
+
+    handle = IndexHandle(persist_directory="c", vectorstore=_Chroma(), retriever=None, version="c")
+    handle.close()
+    assert _Client._system.stopped
+
+
+def test_close_failures_are_swallowed():
+    class _Broken:
+        def close(self):
+            raise OSError("already closed")
+
+    IndexHandle(persist_directory="x", vectorstore=_Broken(), retriever=None, version="x").close()
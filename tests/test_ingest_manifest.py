@@ -0,0 +1,75 @@
+# tests/test_ingest_manifest.py
+
+import json
+
+import pytest
+
+from ingest_manifest import (ChangePlan, IngestManifest, ManifestEntry, content_hash, file_hash,
+                             manifest_path)
+
+
+@pytest.fixture
+def previous():
+    return IngestManifest(source_hash="pdf-v1", entries={
+        "page-1": ManifestEntry(hash=content_hash("Hunger rose."), ids=["p1-0", "p1-1"]),
+        "page-2": ManifestEntry(hash=content_hash("Stunting fell."), ids=["p2-0"]),
+        "page-3": ManifestEntry(hash=content_hash("Annex."), ids=["p3-0"]),
+    })
+
+
+def test_items_are_classified_against_the_previous_manifest(previous):
+    plan = ChangePlan(previous)
+
+    assert plan.classify("page-1", content_hash("Hunger rose.")) == "unchanged"
+    assert plan.classify("page-2", content_hash("Stunting fell sharply.")) == "changed"
+    assert plan.classify("page-4", content_hash("New chapter.")) == "new"
+    assert plan.finish() == ["page-3"]
+
+    assert plan.counts() == {"new": 1, "changed": 1, "removed": 1, "unchanged": 1}
+    assert plan.has_changes
+
+
+def test_identical_source_has_no_changes(previous):
+    plan = ChangePlan(previous)
+    for key, text in (("page-1", "Hunger rose."), ("page-2", "Stunting fell."), ("page-3", "Annex.")):
+        plan.classify(key, content_hash(text))
+    plan.finish()
+
+    assert not plan.has_changes
+    assert plan.counts()["unchanged"] == 3
+
+
+def test_first_ingest_treats_everything_as_new():
+    plan = ChangePlan(None)
+    assert plan.classify("row-1", "h1") == "new"
+    assert plan.finish() == []
+    assert plan.counts() == {"new": 1, "changed": 0, "removed": 0, "unchanged": 0}
+
+
+def test_manifest_round_trips_next_to_the_index(previous, tmp_path):
+    path = manifest_path(str(tmp_path / "un_food_index") + "/")
+    assert path == str(tmp_path / "un_food_index.manifest.json")
+
+    previous.save(path)
+    loaded = IngestManifest.load(path)
+
+    assert loaded == previous
+    assert not (tmp_path / "un_food_index.manifest.json.tmp").exists()
+
+
+def test_unreadable_or_other_version_manifests_are_ignored(tmp_path):
+    assert IngestManifest.load(str(tmp_path / "missing.json")) is None
+
+    corrupt = tmp_path / "corrupt.json"
+    corrupt.write_text("{not json")
+    assert IngestManifest.load(str(corrupt)) is None
+
+    old = tmp_path / "old.json"
+    old.write_text(json.dumps({"version": 0, "entries": {}}))
+    assert IngestManifest.load(str(old)) is None
+
+
+def test_file_hash_matches_content_hash_of_the_same_bytes(tmp_path):
+    path = tmp_path / "report.txt"
+    path.write_text("Hunger rose.", encoding="utf-8")
+    assert file_hash(str(path), block_size=4) == content_hash("Hunger rose.")
@@ -0,0 +1,47 @@
+# tests/test_mmap_vectorstore.py
+
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_core")
+
+from agents.mmap_vectorstore import MmapVectorStore, write_mmap_index
+
+VECTORS = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.6, 0.8, 0.0]], dtype=np.float32)
+
+
+@pytest.fixture(params=["float16", "int8"])
+def store(tmp_path, request):
+    write_mmap_index(str(tmp_path), ["a", "b", "c"], ["alpha", "beta", "gamma"], [{}, {}, {}],
+                     VECTORS, dtype=request.param)
+    return MmapVectorStore(str(tmp_path), embedding_function=None)
+
+
+def test_search_does_not_modify_the_callers_vectors(store):
+    query = np.array([2.0, 0.0, 0.0], dtype=np.float32)
+    queries = np.array([[2.0, 0.0, 0.0], [0.0, 3.0, 0.0]], dtype=np.float32)
+
+    [(doc, score)] = store.similarity_search_by_vector_with_score(query, k=1)
+    batch = store.similarity_search_by_vectors(queries, k=1)
+
+    assert doc.page_content == "alpha"
+    assert score == pytest.approx(1.0, abs=1e-2)
+    assert [docs[0].page_content for docs in batch] == ["alpha", "beta"]
+    assert query.tolist() == [2.0, 0.0, 0.0]
+    assert queries.tolist() == [[2.0, 0.0, 0.0], [0.0, 3.0, 0.0]]
+
+
+def test_zero_query_vector_scores_zero_instead_of_nan(store):
+    results = store.similarity_search_by_vector_with_score([0.0, 0.0, 0.0], k=3)
+    assert len(results) == 3
+    assert all(not math.isnan(score) and score == 0.0 for _, score in results)
+    assert len(store.similarity_search_by_vectors([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]], k=2)[0]) == 2
+
+
+def test_write_leaves_the_input_embeddings_untouched(tmp_path):
+    embeddings = VECTORS * 2
+    write_mmap_index(str(tmp_path), ["a", "b", "c"], ["alpha", "beta", "gamma"], [{}, {}, {}], embeddings)
+    assert np.array_equal(embeddings, VECTORS * 2)
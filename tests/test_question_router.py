@@ -0,0 +1,41 @@
+# tests/test_question_router.py
+
+import numpy as np
+
+from question_router import EmbeddingRouter
+
+EXAMPLES = {"food": ["hunger", "stunting"], "clinical": ["trial", "dosage"], "web": ["weather", "zero"]}
+AXES = {"hunger": 0, "stunting": 0, "trial": 1, "dosage": 1, "weather": 2}
+
+
+class _Embedder:
+    """Words on one axis per category; anything else (including "zero") embeds to all zeros."""
+
+    def embed_query(self, text):
+        vector = np.zeros(3, dtype=np.float32)
+        if text in AXES:
+            vector[AXES[text]] = 2.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def test_confident_question_routes_by_embedding():
+    decision = EmbeddingRouter(_Embedder(), examples=EXAMPLES).route("stunting")
+    assert (decision.category, decision.path) == ("food", "embedding")
+
+
+def test_zero_vector_scores_evenly_and_falls_back_to_the_llm():
+    router = EmbeddingRouter(_Embedder(), examples=EXAMPLES)
+    scores = router.score("something unseen")
+
+    assert all(np.isfinite(list(scores.values())))
+    assert np.allclose(list(scores.values()), 1 / 3)
+    assert router.route("something unseen").path == "llm_fallback"
+
+
+def test_all_zero_examples_give_a_zero_centroid_not_nan():
+    router = EmbeddingRouter(_Embedder(), examples={"food": ["hunger"], "web": ["zero"]})
+    assert np.isfinite(router.centroids).all()
+    assert router.score("hunger")["food"] > 0.99
@@ -0,0 +1,122 @@
+# tests/test_series_store.py
+
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import series_store
+from series_store import Series, SeriesNotFound, SeriesPayload, SeriesStore, lttb_indices
+
+
+def _series(series_id="undernourishment", n=50, integer=False):
+    years = np.arange(1970, 1970 + n)
+    values = np.sin(np.arange(n) / 3.0) * 10 + 20
+    if integer:
+        values = np.round(values)
+    return Series(series_id, "value", years[::-1], values[::-1], integer=integer, title="Undernourishment", unit="%")
+
+
+@pytest.fixture
+def store():
+    return SeriesStore({"undernourishment": _series(), "stunting": _series("stunting", n=10, integer=True)},
+                       cache_size=2)
+
+
+def test_lttb_keeps_the_end_points_and_the_peak():
+    x = np.arange(100, dtype=np.float64)
+    y = np.zeros(100)
+    y[37] = 50.0
+
+    keep = lttb_indices(x, y, 10)
+
+    assert len(keep) == 10
+    assert keep[0] == 0 and keep[-1] == 99
+    assert 37 in keep
+    assert list(keep) == sorted(keep)
+
+
+@pytest.mark.parametrize("max_points, expected", [(200, list(range(5))), (2, [0, 4]), (1, [0])])
+def test_lttb_small_limits(max_points, expected):
+    x = np.arange(5, dtype=np.float64)
+    assert list(lttb_indices(x, x, max_points)) == expected
+
+
+def test_series_is_sorted_and_sliced_by_inclusive_years():
+    s = _series()
+    assert s.years[0] == 1970 and list(s.years) == sorted(s.years)
+    lo, hi = s.index_range(1980, 1984)
+    assert s.years[lo:hi].tolist() == [1980, 1981, 1982, 1983, 1984]
+    assert s.index_range(2100, None) == (50, 50)
+
+
+def test_integer_series_serialize_as_integers(store):
+    body = json.loads(store.payload("stunting").body)
+    assert all(isinstance(value, int) for value in body["values"])
+    assert body["downsampled"] is False
+
+
+def test_etag_follows_the_body():
+    first = SeriesPayload.from_body(b'{"a":1}')
+    assert first.etag == SeriesPayload.from_body(b'{"a":1}').etag
+    assert first.etag != SeriesPayload.from_body(b'{"a":2}').etag
+    assert first.etag.startswith('"') and first.etag.endswith('"')
+
+
+def test_only_large_bodies_are_gzipped(monkeypatch):
+    monkeypatch.setattr(series_store, "SERIES_GZIP_MIN_BYTES", 100)
+    assert SeriesPayload.from_body(b"x" * 99).gzipped is None
+    large = SeriesPayload.from_body(b"x" * 100)
+    assert gzip.decompress(large.gzipped) == b"x" * 100
+    # mtime=0 keeps the compressed bytes (and so any cache in front) stable
+    assert SeriesPayload.from_body(b"x" * 100).gzipped == large.gzipped
+
+
+def test_downsampled_slice_is_cached(store):
+    first = store.payload("undernourishment", start=1975, max_points=10)
+    again = store.payload("undernourishment", start=1975, max_points=10)
+
+    assert again is first
+    body = json.loads(first.body)
+    assert body["downsampled"] is True
+    assert len(body["years"]) == 10
+    assert body["years"][0] == 1975 and body["years"][-1] == 2019
+    assert store.stats()["hits"] == 1 and store.stats()["misses"] == 1
+
+
+def test_a_limit_above_the_point_count_shares_the_full_payload(store):
+    assert store.payload("stunting", max_points=500) is store.payload("stunting")
+    assert store.stats()["misses"] == 0
+
+
+def test_payload_cache_is_bounded(store):
+    for start in (1971, 1972, 1973):
+        store.payload("undernourishment", start=start)
+    assert store.stats()["cached_payloads"] == 2
+
+
+def test_legacy_and_batch_shapes(store):
+    rows = json.loads(store.payload("stunting", legacy=True).body)["data"]
+    assert rows[0] == {"year": 1970, "value": 20}
+
+    batch = json.loads(store.batch_payload(["stunting", "undernourishment"], end=1972).body)
+    assert [item["id"] for item in batch["series"]] == ["stunting", "undernourishment"]
+    assert all(item["years"] == [1970, 1971, 1972] for item in batch["series"])
+
+
+def test_unknown_series_raises(store):
+    with pytest.raises(SeriesNotFound):
+        store.payload("missing")
+
+
+def test_load_reads_the_catalogue_and_csvs(tmp_path):
+    (tmp_path / "series.json").write_text(json.dumps({"hunger": {"file": "hunger.csv", "title": "Hunger"}}))
+    (tmp_path / "hunger.csv").write_text("year,people\n2001,5\n2000,4\n")
+
+    store = SeriesStore.load(str(tmp_path))
+
+    body = json.loads(store.payload("hunger").body)
+    assert (body["value_key"], body["years"], body["values"]) == ("people", [2000, 2001], [4, 5])
+    assert json.loads(store.catalogue.body)["series"][0]["title"] == "Hunger"
+    assert SeriesStore.load(str(tmp_path / "empty")).series == {}
@@ -0,0 +1,157 @@
+# tests/test_single_flight.py
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import telemetry
+from single_flight import SingleFlight, normalise_question
+
+
+def test_do_coalesces_concurrent_calls():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+    leader.start()
+    started.wait(2)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(2)
+
+    assert results == ["answer"] * 4
+    assert len(calls) == 1
+    assert flight.stats()["coalesced"] == 3
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_do_shares_the_exception():
+    flight = SingleFlight("test")
+
+    def boom():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("k", boom)
+    assert flight.stats()["errors"] == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_ado_coalesces_and_survives_one_caller_cancelling():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        first = asyncio.ensure_future(flight.ado("k", slow))
+        second = asyncio.ensure_future(flight.ado("k", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "answer"
+        return calls, flight.stats()
+
+    calls, stats = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert stats["coalesced"] == 1
+
+
+def test_ado_after_last_caller_cancelled_starts_a_fresh_call():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                # Winds down for a moment after cancel(), like a real client closing a connection
+                await asyncio.sleep(0.01)
+                raise
+            return "answer"
+
+        leader = asyncio.ensure_future(flight.ado("k", slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        await asyncio.sleep(0)
+        # Arrives while the cancelled call is still winding down
+        result = await flight.ado("k", slow)
+        return result, calls
+
+    result, calls = asyncio.run(scenario())
+    assert result == "answer"
+    assert len(calls) == 2
+
+
+def test_do_follower_gives_up_after_its_timeout():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+
+    def hung():
+        started.set()
+        release.wait(2)
+        return "late"
+
+    leader = threading.Thread(target=lambda: flight.do("k", hung))
+    leader.start()
+    started.wait(2)
+    began = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        flight.do("k", hung, timeout=0.05)
+    assert time.perf_counter() - began < 1.0
+    release.set()
+    leader.join(2)
+
+
+def test_ado_follower_adopts_the_leaders_trace():
+    flight = SingleFlight("test")
+
+    async def answer():
+        with telemetry.trace() as leader_trace:
+            telemetry.set_route("food")
+            telemetry.annotate("index_version:food", "v7")
+            with telemetry.span("retrieval"):
+                await asyncio.sleep(0.02)
+            return "answer", leader_trace
+
+    async def caller():
+        with telemetry.trace() as own_trace:
+            result, leader_trace = await flight.ado("k", answer)
+            telemetry.adopt_trace(leader_trace)
+        return own_trace, leader_trace
+
+    async def scenario():
+        return await asyncio.gather(caller(), caller())
+
+    (first, first_leader), (second, second_leader) = asyncio.run(scenario())
+    assert first_leader is second_leader is first  # the first caller led, in its own context
+    assert "coalesced" not in first.annotations
+    breakdown = second.breakdown()
+    assert breakdown["route"] == "food"
+    assert breakdown["index_version:food"] == "v7"
+    assert breakdown["coalesced"] is True
+    assert "retrieval" in breakdown["stages_ms"]
+
+
+def test_normalise_question():
+    assert normalise_question("  What IS   hunger? ") == "what is hunger?"
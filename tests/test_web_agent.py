@@ -0,0 +1,49 @@
+# tests/test_web_agent.py
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_google_genai")
+
+from agents.web_agent import INCOMPLETE_ANSWER, WebAgent, _react_output
+from orchestrator import Orchestrator
+
+
+def test_iteration_limit_is_reported_as_a_failure_and_never_cached():
+    span_tags = {}
+    output = _react_output({"output": "Agent stopped due to iteration limit or time limit."}, span_tags)
+    assert output == INCOMPLETE_ANSWER
+    assert span_tags["outcome"] == "incomplete"
+    assert Orchestrator.answer_outcome(output) == "error"
+
+
+def test_finished_answers_pass_through():
+    span_tags = {}
+    assert _react_output({"output": "Paris."}, span_tags) == "Paris."
+    assert "outcome" not in span_tags
+
+
+class _HangingExecutor:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def invoke(self, _input):
+        self.release.wait(5)
+        return {"output": "too late"}
+
+
+def test_sync_react_path_is_capped_at_max_seconds():
+    agent = WebAgent.__new__(WebAgent)
+    agent.mode, agent.max_seconds = "react", 0.1
+    agent.agent_executor = _HangingExecutor()
+
+    started = time.perf_counter()
+    output = agent.invoke({"input": "latest news"})["output"]
+    agent.agent_executor.release.set()
+
+    assert time.perf_counter() - started < 2.0
+    assert output.endswith("the web agent timed out.")
+    assert Orchestrator.answer_outcome(output) == "error"